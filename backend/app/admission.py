@@ -0,0 +1,176 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, WebSocket
+from starlette.requests import HTTPConnection
+
+from .deps import DEFAULT_USER_ID
+from .metrics import registry
+from .state import get_state
+
+load_dotenv()
+
+# Per-client rates as "<burst>/<seconds>"; an empty value disables the bucket
+SUGGEST_RATE = os.getenv("ADMISSION_SUGGEST_RATE", "5/60")
+VOICE_TOKEN_RATE = os.getenv("ADMISSION_VOICE_TOKEN_RATE", "10/60")
+VIDEO_RATE = os.getenv("ADMISSION_VIDEO_RATE", "6/60")
+# Per-worker concurrency caps and how long a request may wait for a slot
+POSE_SESSIONS = int(os.getenv("ADMISSION_POSE_SESSIONS", "4"))
+LLM_CONCURRENCY = int(os.getenv("ADMISSION_LLM_CONCURRENCY", "8"))
+QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "16"))
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+
+# WebSocket close code 1013: "Try Again Later"
+WS_TRY_AGAIN_LATER = 1013
+
+rejected_total = registry.counter("coach_admission_rejected_total", "Requests shed by admission control")
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def parse_rate(spec: str) -> Optional[Tuple[float, float]]:
+    """"5/60" -> (5 tokens, 60 s to refill them all)."""
+    if not spec:
+        return None
+    burst, seconds = spec.split("/", 1)
+    return float(burst), float(seconds)
+
+
+class TokenBucket:
+    """
+    Per-key token bucket kept in the shared state backend, so the limit holds
+    across workers. Two concurrent workers can race on the same key and both
+    spend the last token; that overshoot is bounded by the worker count.
+    """
+
+    def __init__(self, name: str, capacity: float, period: float):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.period = period
+
+    @classmethod
+    def from_spec(cls, name: str, spec: str) -> Optional["TokenBucket"]:
+        rate = parse_rate(spec)
+        return cls(name, *rate) if rate else None
+
+    async def take(self, key: str, cost: float = 1.0) -> None:
+        state = get_state()
+        state_key = f"bucket:{self.name}:{key}"
+        now = time.time()
+        bucket = await state.get(state_key)
+        tokens = self.capacity
+        if bucket:
+            tokens = min(self.capacity, bucket["tokens"] + (now - bucket["ts"]) * self.rate)
+        if tokens < cost:
+            rejected_total.inc(name=self.name, reason="rate")
+            raise Rejected(f"{self.name} rate limit exceeded", (cost - tokens) / self.rate)
+        # the key expires once the bucket would be full again
+        await state.set(state_key, {"tokens": tokens - cost, "ts": now}, ttl=self.period)
+
+
+class ConcurrencyLimiter:
+    """
+    Caps in-flight work in this worker. Callers wait in a bounded queue for at
+    most `timeout` seconds; a full queue or an expired deadline is rejected at once.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int = QUEUE_SIZE, timeout: float = QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+        registry.gauge(f"coach_admission_{name}_active", f"In-flight {name} work in this worker", lambda: self.active)
+        registry.gauge(f"coach_admission_{name}_waiting", f"Queued {name} work in this worker", lambda: self.waiting)
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            rejected_total.inc(name=self.name, reason="queue_full")
+            raise Rejected(f"{self.name} is saturated", self.timeout)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            rejected_total.inc(name=self.name, reason="deadline")
+            raise Rejected(f"{self.name} is saturated", self.timeout) from None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        await self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+suggest_bucket = TokenBucket.from_spec("suggest", SUGGEST_RATE)
+voice_token_bucket = TokenBucket.from_spec("voice_token", VOICE_TOKEN_RATE)
+video_bucket = TokenBucket.from_spec("video", VIDEO_RATE)
+pose_sessions = ConcurrencyLimiter("pose", POSE_SESSIONS)
+llm_calls = ConcurrencyLimiter("llm", LLM_CONCURRENCY)
+
+
+def too_many_requests(e: Rejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def admit(bucket: Optional[TokenBucket] = None, limiter: Optional[ConcurrencyLimiter] = None):
+    """
+    Route dependency: spend a token from the client's bucket, then hold a slot of
+    `limiter` for the rest of the request. Rejections become 429 + Retry-After.
+    """
+    async def dependency(request: Request):
+        try:
+            if bucket is not None:
+                await bucket.take(client_key(request))
+            if limiter is not None:
+                await limiter.acquire()
+        except Rejected as e:
+            raise too_many_requests(e)
+        try:
+            yield
+        finally:
+            if limiter is not None:
+                limiter.release()
+    return dependency
+
+
+def client_key(conn: HTTPConnection) -> str:
+    """
+    Rate-limit key: the client address. X-User-Id is not authenticated, so it
+    can't key a limit (a client could pick a fresh id per request). Behind a
+    proxy, run uvicorn with --proxy-headers --forwarded-allow-ips=<proxy> so this
+    is the real client and not the proxy.
+    """
+    return conn.client.host if conn.client else "unknown"
+
+
+def websocket_user(websocket: WebSocket) -> str:
+    # browsers can't set headers on WebSockets, so ?user= is accepted too
+    return websocket.headers.get("x-user-id") or websocket.query_params.get("user") or DEFAULT_USER_ID
+
+
+async def reject_websocket(websocket: WebSocket, e: Rejected) -> None:
+    """Accept and close at once with 1013 so the client sees why and when to retry."""
+    await websocket.accept()
+    await websocket.close(code=WS_TRY_AGAIN_LATER, reason=f"{e}; retry after {e.retry_after}s")
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# Incremental training-load and readiness aggregates.
+#
+# Acute (7 day) and chronic (28 day) load are exponentially weighted daily sums.
+# An EWMA is linear in its inputs, so a load L on day d contributes
+# lambda * (1 - lambda) ** (D - d) * L to the value on day D: every sample is
+# folded in O(1) regardless of arrival order and history is never re-read.
+# Wellness signals (fatigue, sleep, resting HR) use the same idea: day-decayed
+# weighted means, so backfilled or offline entries land where their date says.
+
+import math
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple, Union
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..apple_health.dedup import parse_timestamp
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+LAMBDA_ACUTE = 2 / (ACUTE_DAYS + 1)
+LAMBDA_CHRONIC = 2 / (CHRONIC_DAYS + 1)
+
+# per-day smoothing for wellness signals (recent vs baseline)
+SHORT_ALPHA = 0.3
+LONG_ALPHA = 0.05
+HORIZONS = (("short", SHORT_ALPHA), ("long", LONG_ALPHA))
+WELLNESS = ("fatigue", "sleep", "resting_hr")
+
+DEFAULT_INTENSITY = 5.0  # RPE-like 1-10 when a workout has no energy data
+
+
+def to_day(value: Union[str, date, datetime, None]) -> int:
+    """Ordinal day from a datetime or an Apple Health date string ('2024-01-15 07:30:00 -0500')."""
+    if value is None or value == "":
+        return date.today().toordinal()
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(value[:10]).toordinal()
+
+
+def new_state(user_id: str) -> models.TrainingLoad:
+    return models.TrainingLoad(user_id=user_id, day=None, acute_load=0.0, chronic_load=0.0, samples=0)
+
+
+async def get_state(db: AsyncSession, user_id: str) -> models.TrainingLoad:
+    state = await db.get(models.TrainingLoad, user_id, with_for_update=True)
+    if state is None:
+        # INSERT ... ON CONFLICT DO NOTHING: two first writes for a new user both
+        # end up with the one row instead of one of them failing on the primary key
+        if db.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        await db.execute(
+            insert(models.TrainingLoad).values(user_id=user_id, acute_load=0.0, chronic_load=0.0, samples=0)
+            .on_conflict_do_nothing()
+        )
+        state = await db.get(models.TrainingLoad, user_id, with_for_update=True)
+    return state
+
+
+def _decayed(state: models.TrainingLoad, day: int) -> tuple[float, float]:
+    """Acute/chronic values as of `day` (>= state.day) without mutating the state."""
+    if state.day is None or day <= state.day:
+        return state.acute_load or 0.0, state.chronic_load or 0.0
+    gap = day - state.day
+    return (
+        (state.acute_load or 0.0) * (1 - LAMBDA_ACUTE) ** gap,
+        (state.chronic_load or 0.0) * (1 - LAMBDA_CHRONIC) ** gap,
+    )
+
+
+def _smooth(state: models.TrainingLoad, name: str, day: int, x: float) -> None:
+    """
+    Folds `x` observed on `day` into `<name>_short`/`<name>_long`: means weighted
+    by (1 - alpha) ** age in days, so the result doesn't depend on arrival order.
+    Weights are kept as of state.wellness_day and decayed when a later day arrives.
+    """
+    if state.wellness_day is None or day > state.wellness_day:
+        if state.wellness_day is not None:
+            gap = day - state.wellness_day
+            for signal in WELLNESS:
+                for horizon, alpha in HORIZONS:
+                    weight = getattr(state, f"{signal}_{horizon}_w")
+                    if weight:
+                        setattr(state, f"{signal}_{horizon}_w", weight * (1 - alpha) ** gap)
+        state.wellness_day = day
+    age = state.wellness_day - day
+    for horizon, alpha in HORIZONS:
+        value = getattr(state, f"{name}_{horizon}")
+        weight = getattr(state, f"{name}_{horizon}_w")
+        if value is None:
+            weight = 0.0
+        elif weight is None:
+            weight = 1.0  # rows from before the weights were stored
+        w = (1 - alpha) ** age
+        setattr(state, f"{name}_{horizon}", ((value or 0.0) * weight + x * w) / (weight + w))
+        setattr(state, f"{name}_{horizon}_w", weight + w)
+
+
+def add_load(state: models.TrainingLoad, day: int, load: float) -> None:
+    """Adds a day's training load to the acute/chronic EWMAs."""
+    if state.day is None or day > state.day:
+        state.acute_load, state.chronic_load = _decayed(state, day)
+        state.day = day
+    # samples older than state.day contribute with their decay already applied
+    age = state.day - day
+    state.acute_load += LAMBDA_ACUTE * (1 - LAMBDA_ACUTE) ** age * load
+    state.chronic_load += LAMBDA_CHRONIC * (1 - LAMBDA_CHRONIC) ** age * load
+    state.samples = (state.samples or 0) + 1
+
+
+def add_diary_entry(
+    state: models.TrainingLoad, fatigue: Optional[int], sleep_hours: Optional[float],
+    created_at: Union[str, date, datetime, None] = None,
+) -> None:
+    day = to_day(created_at)
+    if fatigue is not None:
+        _smooth(state, "fatigue", day, float(fatigue))
+    if sleep_hours is not None:
+        _smooth(state, "sleep", day, float(sleep_hours))
+    state.samples = (state.samples or 0) + 1
+
+
+def _number(value: Any) -> float:
+    """float(value), or 0.0 for anything missing, non-numeric, NaN or infinite."""
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+
+def workout_minutes(workout: Dict[str, Any]) -> float:
+    minutes = _number(workout.get("duration"))
+    if workout.get("duration_unit") == "s":
+        minutes /= 60
+    elif workout.get("duration_unit") == "h":
+        minutes *= 60
+    return minutes
+
+
+def workout_load(workout: Dict[str, Any]) -> float:
+    """Duration (min) x intensity, intensity estimated from kcal/min when available."""
+    minutes = workout_minutes(workout)
+    if not minutes:
+        return 0.0
+    intensity = DEFAULT_INTENSITY
+    kcal = _number(workout.get("total_energy_burned"))
+    if kcal:
+        intensity = min(10.0, max(1.0, kcal / minutes))
+    return max(0.0, minutes * intensity)
+
+
+def add_workout(state: models.TrainingLoad, workout: Dict[str, Any]) -> None:
+    add_load(state, to_day(workout.get("start_date")), workout_load(workout))
+    start = workout.get("start_date") or ""
+    if start and (state.last_workout_at is None or start > state.last_workout_at):
+        state.last_workout_type = str(workout.get("workout_activity_type") or "").replace("HKWorkoutActivityType", "")
+        state.last_workout_at = start
+        state.last_workout_minutes = round(workout_minutes(workout), 1)
+
+
+def add_health_record(state: models.TrainingLoad, record: Dict[str, Any]) -> None:
+    """Folds in the record types readiness uses; everything else is ignored."""
+    record_type = record.get("type")
+    if record_type not in ("resting_heart_rate", "vo2_max"):
+        return
+    try:
+        value = float(record.get("value"))
+    except (TypeError, ValueError):
+        return
+    if not math.isfinite(value):
+        return
+    if record_type == "resting_heart_rate":
+        _smooth(state, "resting_hr", to_day(record.get("start_date")), value)
+    else:
+        state.vo2_max = value
+    state.samples = (state.samples or 0) + 1
+
+
+def _timestamp(item: Any) -> Optional[float]:
+    """Epoch s of the item's end (or start); None when a date is missing or malformed."""
+    try:
+        start = parse_timestamp(item["start_date"])
+        return parse_timestamp(item["end_date"]) if item.get("end_date") else start
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+def apply_health_data(state: models.TrainingLoad, health_data: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Applies records/workouts in AppleHealthXMLProcessor.health_data format; returns
+    (applied, malformed). Items without a readable start_date are skipped and
+    counted as malformed. Exports are cumulative, so anything that ended at or
+    before the newest item of a previous ingest (state.health_through) is skipped:
+    posting the same export twice changes nothing.
+    """
+    through = state.health_through
+    newest = through
+    count = malformed = 0
+    for kind, items in (("record", health_data.get("records") or []), ("workout", health_data.get("workouts") or [])):
+        for item in items:
+            ts = _timestamp(item)
+            if ts is None:
+                malformed += 1
+                continue
+            if through is not None and ts <= through:
+                continue
+            newest = ts if newest is None else max(newest, ts)
+            if kind == "record":
+                add_health_record(state, item)
+            else:
+                add_workout(state, item)
+            count += 1
+    state.health_through = newest
+    return count, malformed
+
+
+def _trend(short: Optional[float], long: Optional[float], tolerance: float) -> Optional[str]:
+    if short is None or long is None:
+        return None
+    if short - long > tolerance:
+        return "up"
+    if long - short > tolerance:
+        return "down"
+    return "flat"
+
+
+def _round(value: Optional[float], digits: int = 2) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def summary(state: Optional[models.TrainingLoad], today: Optional[int] = None) -> Dict[str, Any]:
+    """Readiness snapshot as of `today` (ordinal day, defaults to the current date)."""
+    if state is None:
+        return {"readiness": None, "acute_load": 0.0, "chronic_load": 0.0, "acwr": None, "trends": {}, "samples": 0}
+    acute, chronic = _decayed(state, today or date.today().toordinal())
+    acwr = acute / chronic if chronic > 1e-6 else None
+
+    score = 100.0
+    if acwr is not None:
+        # 0.8-1.3 is the usual "sweet spot" for acute:chronic ratio
+        score -= max(0.0, acwr - 1.3) * 60 + max(0.0, 0.8 - acwr) * 20
+    if state.fatigue_short is not None:
+        score -= max(0.0, state.fatigue_short - 5) * 6
+    if state.sleep_short is not None:
+        score -= max(0.0, 8 - state.sleep_short) * 6
+    if state.resting_hr_short is not None and state.resting_hr_long:
+        score -= max(0.0, (state.resting_hr_short - state.resting_hr_long) / state.resting_hr_long) * 200
+
+    return {
+        "readiness": round(min(100.0, max(0.0, score))),
+        "acute_load": round(acute, 1),
+        "chronic_load": round(chronic, 1),
+        "acwr": _round(acwr),
+        "fatigue": _round(state.fatigue_short, 1),
+        "sleep_hours": _round(state.sleep_short, 1),
+        "resting_hr": _round(state.resting_hr_short, 1),
+        "vo2_max": state.vo2_max,
+        "trends": {
+            "fatigue": _trend(state.fatigue_short, state.fatigue_long, 0.5),
+            "sleep": _trend(state.sleep_short, state.sleep_long, 0.3),
+            "resting_hr": _trend(state.resting_hr_short, state.resting_hr_long, 2.0),
+        },
+        "samples": state.samples or 0,
+    }
+
+
+def prompt_snippet(data: Dict[str, Any]) -> str:
+    """One-line summary for LLM prompts."""
+    if data.get("readiness") is None:
+        return "No training history yet."
+    return (
+        f"Readiness {data['readiness']}/100, acute:chronic load {data['acwr']}, "
+        f"fatigue {data['fatigue']} ({data['trends'].get('fatigue')}), "
+        f"sleep {data['sleep_hours']}h ({data['trends'].get('sleep')}), "
+        f"resting HR {data['resting_hr']} ({data['trends'].get('resting_hr')})"
+    )
@@ -0,0 +1,204 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# El iPhone y el Apple Watch registran pasos, distancia, energia... sobre los mismos
+# intervalos; el export los trae todos y sumarlos cuenta dos veces la misma actividad.
+# Como Salud.app, se conserva por metrica la fuente de mayor prioridad y las demas
+# solo aportan la parte del intervalo que nadie mas cubre.
+
+# metrica -> fuentes en orden de prioridad. Cada entrada es una clase de dispositivo
+# ("watch", "iphone", sacada del atributo device) o un texto a buscar en sourceName;
+# las fuentes que no encajan con ninguna van al final, todas al mismo nivel.
+DEFAULT_PRIORITIES: Dict[str, Tuple[str, ...]] = {
+    "step_count": ("watch", "iphone"),
+    "distance_walking_running": ("watch", "iphone"),
+    "active_energy_burned": ("watch", "iphone"),
+    "basal_energy_burned": ("watch", "iphone"),
+    "flights_climbed": ("watch", "iphone"),
+    "sleep_analysis": ("watch", "iphone"),
+}
+
+# Metricas acumulativas: una muestra parcialmente cubierta se conserva con el valor
+# prorrateado a la parte libre. El resto (p. ej. sueño) se descarta si se solapa.
+ADDITIVE = {
+    "step_count", "distance_walking_running", "active_energy_burned",
+    "basal_energy_burned", "flights_climbed",
+}
+
+
+def device_class(record: Dict[str, Any]) -> str:
+    """'watch', 'iphone' u 'other' a partir del modelo en `device` (o del nombre de la fuente)."""
+    texto = (record.get('device') or record.get('source_name') or '').lower()
+    if 'model:watch' in texto or 'apple watch' in texto:
+        return 'watch'
+    if 'model:iphone' in texto or 'iphone' in texto:
+        return 'iphone'
+    return 'other'
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def parse_timestamp(value: str) -> float:
+    """'2022-01-01 07:30:00 -0500' (formato del export) -> segundos epoch."""
+    base = datetime.fromisoformat(value[:19])
+    offset = 0
+    if len(value) >= 25:
+        signo = -1 if value[20] == '-' else 1
+        offset = signo * (int(value[21:23]) * 3600 + int(value[23:25]) * 60)
+    return (base - _EPOCH).total_seconds() - offset
+
+
+def _fusionar(a: List[Tuple[float, float]], b: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """Une dos listas de intervalos ordenados en una lista ordenada de intervalos disjuntos."""
+    resultado: List[Tuple[float, float]] = []
+    i = j = 0
+    while i < len(a) or j < len(b):
+        if j >= len(b) or (i < len(a) and a[i][0] <= b[j][0]):
+            inicio, fin = a[i]
+            i += 1
+        else:
+            inicio, fin = b[j]
+            j += 1
+        if resultado and inicio <= resultado[-1][1]:
+            if fin > resultado[-1][1]:
+                resultado[-1] = (resultado[-1][0], fin)
+        else:
+            resultado.append((inicio, fin))
+    return resultado
+
+
+def resolve_overlaps(
+    samples: Sequence[Tuple[float, float, int]], additive: bool
+) -> List[Tuple[int, float]]:
+    """
+    Barrido de intervalos ordenados. `samples` son (inicio, fin, rango) con rango 0
+    para la fuente preferida; devuelve (posicion, fraccion conservada) de cada muestra
+    que sobrevive. Ordenar cuesta O(n log n); cada nivel de prioridad se cruza con la
+    cobertura de los niveles anteriores en un solo recorrido lineal.
+    """
+    por_rango: Dict[int, List[int]] = defaultdict(list)
+    for pos in sorted(range(len(samples)), key=lambda k: (samples[k][0], samples[k][1])):
+        por_rango[samples[pos][2]].append(pos)
+
+    conservadas: List[Tuple[int, float]] = []
+    cobertura: List[Tuple[float, float]] = []
+    for rango in sorted(por_rango):
+        nivel = por_rango[rango]
+        j = 0
+        for pos in nivel:
+            inicio, fin = samples[pos][0], samples[pos][1]
+            # los intervalos de cobertura que terminan antes de esta muestra ya no sirven
+            while j < len(cobertura) and cobertura[j][1] < inicio:
+                j += 1
+            cubierto = 0.0
+            k = j
+            while k < len(cobertura) and cobertura[k][0] <= fin:
+                cubierto += max(0.0, min(fin, cobertura[k][1]) - max(inicio, cobertura[k][0]))
+                if fin == inicio and cobertura[k][0] <= inicio <= cobertura[k][1]:
+                    cubierto = 1.0  # muestra puntual dentro de un intervalo ya cubierto
+                k += 1
+            duracion = fin - inicio
+            libre = 1.0 - (cubierto / duracion if duracion > 0 else min(cubierto, 1.0))
+            if libre >= 1.0 - 1e-9:
+                conservadas.append((pos, 1.0))
+            elif additive and libre > 1e-9:
+                conservadas.append((pos, libre))
+        cobertura = _fusionar(cobertura, [(samples[p][0], samples[p][1]) for p in nivel])
+    conservadas.sort()
+    return conservadas
+
+
+class SourceDeduplicator:
+    """
+    Etapa de deduplicacion en streaming para los Record del parser.
+
+    Los tipos sin prioridad pasan directo desde `feed`. Los que tienen prioridad se
+    acumulan en un grupo por tipo (el export no garantiza que un tipo llegue seguido)
+    y se resuelven todos en `flush`, al terminar: cada tipo sale en el orden en que
+    llego, y los tipos en el orden en que aparecio su primer registro.
+    """
+
+    def __init__(self, priorities: Optional[Dict[str, Sequence[str]]] = None):
+        self.priorities = {k: tuple(p.lower() for p in v) for k, v in (priorities or DEFAULT_PRIORITIES).items()}
+        self._pendientes: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {'kept': 0, 'dropped': 0, 'trimmed': 0})
+
+    def _rango(self, record: Dict[str, Any], prioridad: Tuple[str, ...]) -> int:
+        clase = device_class(record)
+        nombre = record.get('source_name', '').lower()
+        for i, patron in enumerate(prioridad):
+            if patron == clase or patron in nombre:
+                return i
+        return len(prioridad)
+
+    def feed(self, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        tipo = record['type']
+        if tipo not in self.priorities:
+            return [record]
+        self._pendientes.setdefault(tipo, []).append(record)
+        return []
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Resuelve los grupos pendientes de todos los tipos y los devuelve."""
+        pendientes, self._pendientes = self._pendientes, {}
+        salida: List[Dict[str, Any]] = []
+        for tipo, grupo in pendientes.items():
+            salida.extend(self._resolver(tipo, grupo))
+        return salida
+
+    def _resolver(self, tipo: str, grupo: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        prioridad = self.priorities[tipo]
+        muestras, posiciones = [], []
+        for k, record in enumerate(grupo):
+            try:
+                inicio = parse_timestamp(record['start_date'])
+                fin = parse_timestamp(record['end_date']) if record['end_date'] else inicio
+            except ValueError:
+                continue  # fechas ilegibles: la muestra se conserva tal cual
+            muestras.append((inicio, max(fin, inicio), self._rango(record, prioridad)))
+            posiciones.append(k)
+        fracciones = {posiciones[pos]: f for pos, f in resolve_overlaps(muestras, tipo in ADDITIVE)}
+        legibles = set(posiciones)
+
+        stats = self.stats[tipo]
+        salida = []
+        for k, record in enumerate(grupo):
+            fraccion = fracciones.get(k) if k in legibles else 1.0
+            if fraccion is None:
+                stats['dropped'] += 1
+                continue
+            if fraccion < 1.0:
+                record = self._recortar(record, fraccion)
+                stats['trimmed'] += 1
+            stats['kept'] += 1
+            salida.append(record)
+        return salida
+
+    @staticmethod
+    def _recortar(record: Dict[str, Any], fraccion: float) -> Dict[str, Any]:
+        try:
+            valor = float(record['value']) * fraccion
+        except ValueError:
+            return record
+        record = dict(record)
+        record['value'] = str(round(valor, 3)) if record.get('unit') != 'count' else str(round(valor, 1))
+        return record
+
+    def summary(self) -> Dict[str, int]:
+        total = {'kept': 0, 'dropped': 0, 'trimmed': 0}
+        for stats in self.stats.values():
+            for clave, valor in stats.items():
+                total[clave] += valor
+        return total
+
+
+def deduplicate(records: Iterable[Dict[str, Any]], priorities: Optional[Dict[str, Sequence[str]]] = None) -> List[Dict[str, Any]]:
+    """Deduplica una lista ya cargada (p. ej. health_data de un JSON antiguo)."""
+    dedup = SourceDeduplicator(priorities)
+    salida: List[Dict[str, Any]] = []
+    for record in records:
+        salida.extend(dedup.feed(record))
+    salida.extend(dedup.flush())
+    return salida
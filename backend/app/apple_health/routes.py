@@ -0,0 +1,397 @@
+import argparse
+import io
+import json
+import math
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Set, Tuple, Union
+
+import numpy as np
+
+# Rutas GPX de entrenamientos (workout-routes/*.gpx del export de Apple Health).
+#
+# Cada ruta se guarda como arrays numpy (lat, lon, ele, t) en vez de listas de
+# dicts; las metricas (distancia, ritmos por km, desnivel) se calculan vectorizadas
+# y las rutas se simplifican con Douglas-Peucker para guardarlas y dibujarlas.
+# RouteIndex responde "rutas cerca de este punto" sin recorrer todas las rutas.
+
+RADIO_TIERRA_M = 6371008.8
+METROS_POR_GRADO = 111_320.0
+
+GPX_NS = '{http://www.topografix.com/GPX/1/1}'
+
+# El GPX de Apple tiene un formato fijo: <trkpt lon=".." lat=".."><ele>..</ele><time>..</time>...
+_TRKPT = re.compile(rb'<trkpt\s+(?:lon="([^"]+)"\s+lat="([^"]+)"|lat="([^"]+)"\s+lon="([^"]+)")')
+_ELE = re.compile(rb'<ele>([^<]*)</ele>')
+_TIME = re.compile(rb'<time>([^<]*)</time>')
+
+
+@dataclass
+class Route:
+    """Una ruta: grados WGS84, elevacion en m y tiempo en segundos epoch (NaN si falta)."""
+    path: str
+    lat: np.ndarray
+    lon: np.ndarray
+    ele: np.ndarray
+    t: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def subset(self, indices: np.ndarray) -> "Route":
+        return Route(self.path, self.lat[indices], self.lon[indices], self.ele[indices], self.t[indices])
+
+
+# ==== PARSEO ====
+def _tiempos(valores: List[bytes]) -> np.ndarray:
+    """ISO 8601 en UTC ("...Z") -> segundos epoch, vectorizado."""
+    limpios = np.array([v[:-1] if v.endswith(b'Z') else v for v in valores]).astype('U')
+    return limpios.astype('datetime64[ms]').astype(np.int64) / 1000.0
+
+
+def _parse_gpx_iterparse(source: BinaryIO, path: str) -> Route:
+    """Parser general (cualquier orden de atributos o puntos sin ele/time), en streaming."""
+    lat, lon, ele, tiempos = [], [], [], []
+    abiertos = []
+    for evento, elem in ET.iterparse(source, events=('start', 'end')):
+        if evento == 'start':
+            abiertos.append(elem)
+            continue
+        abiertos.pop()
+        if elem.tag.rsplit('}', 1)[-1] != 'trkpt':
+            continue
+        lat.append(float(elem.attrib['lat']))
+        lon.append(float(elem.attrib['lon']))
+        e = elem.find(GPX_NS + 'ele') if elem.tag.startswith(GPX_NS) else elem.find('ele')
+        ts = elem.find(GPX_NS + 'time') if elem.tag.startswith(GPX_NS) else elem.find('time')
+        ele.append(float(e.text) if e is not None and e.text else np.nan)
+        tiempos.append(ts.text.encode() if ts is not None and ts.text else None)
+        # sacarlo del trkseg: con clear() solo, el arbol seguiria acumulando un nodo por punto
+        abiertos[-1].remove(elem)
+    t = np.full(len(lat), np.nan)
+    validos = [i for i, v in enumerate(tiempos) if v is not None]
+    if validos:
+        t[validos] = _tiempos([tiempos[i] for i in validos])
+    return Route(path, np.array(lat), np.array(lon), np.array(ele, dtype=np.float32), t)
+
+
+def parse_gpx(source: Union[bytes, BinaryIO], path: str = '') -> Route:
+    """
+    Lee un GPX a arrays. Con el formato de Apple (un ele y un time por punto) se
+    usa un barrido con expresiones regulares sobre los bytes, ~10x mas rapido que
+    armar el arbol XML; para eso el archivo se lee entero (las rutas de Apple son
+    de pocos MB). Si no encaja, se vuelve a leer el archivo con iterparse en streaming.
+    """
+    data = source if isinstance(source, bytes) else source.read()
+    inicio = data.find(b'<trkpt')
+    if inicio < 0:
+        return Route(path, np.empty(0), np.empty(0), np.empty(0, np.float32), np.empty(0))
+    puntos = _TRKPT.findall(data, inicio)
+    elevaciones = _ELE.findall(data, inicio)
+    tiempos = _TIME.findall(data, inicio)
+    if not puntos or len(elevaciones) != len(puntos) or len(tiempos) != len(puntos):
+        if isinstance(source, bytes) or not source.seekable():
+            return _parse_gpx_iterparse(io.BytesIO(data), path)
+        del data, puntos, elevaciones, tiempos
+        source.seek(0)
+        return _parse_gpx_iterparse(source, path)
+    coords = np.array([(a or d, b or c) for a, b, c, d in puntos], dtype=np.float64)  # (lon, lat)
+    return Route(
+        path,
+        lat=coords[:, 1].copy(),
+        lon=coords[:, 0].copy(),
+        ele=np.array(elevaciones, dtype=np.float32),
+        t=_tiempos(tiempos),
+    )
+
+
+# ==== GEOMETRIA ====
+def distancias(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Haversine entre puntos consecutivos, en metros (n-1 valores)."""
+    phi = np.radians(lat)
+    dphi = np.diff(phi)
+    dlmb = np.radians(np.diff(lon))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi[:-1]) * np.cos(phi[1:]) * np.sin(dlmb / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distancia_a_punto(lat: np.ndarray, lon: np.ndarray, lat0: float, lon0: float) -> np.ndarray:
+    """Haversine de cada punto a (lat0, lon0), en metros."""
+    phi, phi0 = np.radians(lat), math.radians(lat0)
+    a = np.sin((phi - phi0) / 2) ** 2 + np.cos(phi) * math.cos(phi0) * np.sin(np.radians(lon - lon0) / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distancia_a_ruta(lat: np.ndarray, lon: np.ndarray, lat0: float, lon0: float) -> float:
+    """
+    Distancia minima (m) de (lat0, lon0) a la polilinea, contra los segmentos y no
+    solo los vertices: una ruta simplificada a pocos puntos sigue pasando por el medio.
+    """
+    if len(lat) == 1:
+        return float(distancia_a_punto(lat, lon, lat0, lon0)[0])
+    # proyeccion equirectangular centrada en la consulta
+    x = np.radians(lon - lon0) * RADIO_TIERRA_M * math.cos(math.radians(lat0))
+    y = np.radians(lat - lat0) * RADIO_TIERRA_M
+    ax, ay, dx, dy = x[:-1], y[:-1], np.diff(x), np.diff(y)
+    largo2 = dx * dx + dy * dy
+    t = np.clip(-(ax * dx + ay * dy) / np.where(largo2 > 0, largo2, 1.0), 0.0, 1.0)
+    return float(np.hypot(ax + t * dx, ay + t * dy).min())
+
+
+def _proyectar(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Proyeccion equirectangular local en metros (suficiente a escala de una ruta)."""
+    lat0 = float(np.mean(lat))
+    x = np.radians(lon - lon[0]) * RADIO_TIERRA_M * math.cos(math.radians(lat0))
+    y = np.radians(lat - lat[0]) * RADIO_TIERRA_M
+    return x, y
+
+
+def simplificar(lat: np.ndarray, lon: np.ndarray, tolerancia_m: float = 5.0) -> np.ndarray:
+    """
+    Douglas-Peucker iterativo: indices de los puntos que se conservan para que
+    ningun punto descartado quede a mas de `tolerancia_m` de la linea simplificada.
+    """
+    n = len(lat)
+    if n < 3:
+        return np.arange(n)
+    x, y = _proyectar(lat, lon)
+    conservar = np.zeros(n, dtype=bool)
+    conservar[[0, n - 1]] = True
+    pila = [(0, n - 1)]
+    while pila:
+        i, j = pila.pop()
+        if j - i < 2:
+            continue
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        px, py = x[i + 1:j] - x[i], y[i + 1:j] - y[i]
+        norma = math.hypot(dx, dy)
+        d = np.hypot(px, py) if norma == 0 else np.abs(dx * py - dy * px) / norma
+        k = int(np.argmax(d))
+        if d[k] > tolerancia_m:
+            m = i + 1 + k
+            conservar[m] = True
+            pila.append((i, m))
+            pila.append((m, j))
+    return np.flatnonzero(conservar)
+
+
+def desnivel(ele: np.ndarray, ventana: int = 5) -> Tuple[float, float]:
+    """(subida, bajada) en m; la elevacion del GPS se suaviza con media movil para no sumar ruido."""
+    validos = ele[~np.isnan(ele)].astype(np.float64)
+    if len(validos) < 2:
+        return 0.0, 0.0
+    if len(validos) > ventana:
+        validos = np.convolve(validos, np.ones(ventana) / ventana, mode='valid')
+    delta = np.diff(validos)
+    return float(delta[delta > 0].sum()), float(-delta[delta < 0].sum())
+
+
+def splits(route: Route, cada_m: float = 1000.0) -> List[Dict[str, float]]:
+    """Ritmo y desnivel por tramo de `cada_m` metros (el ultimo tramo puede ser parcial)."""
+    if len(route) < 2 or np.isnan(route.t).all():
+        return []
+    acumulada = np.concatenate([[0.0], np.cumsum(distancias(route.lat, route.lon))])
+    total = acumulada[-1]
+    if total <= 0:
+        return []
+    marcas = np.append(np.arange(0.0, total, cada_m), total)
+    validos = ~np.isnan(route.t)
+    t = np.interp(marcas, acumulada[validos], route.t[validos])
+    cortes = np.searchsorted(acumulada, marcas)
+    resultado = []
+    for k in range(len(marcas) - 1):
+        tramo = slice(cortes[k], cortes[k + 1] + 1)
+        metros = marcas[k + 1] - marcas[k]
+        segundos = t[k + 1] - t[k]
+        subida, _ = desnivel(route.ele[tramo])
+        resultado.append({
+            'tramo': k + 1,
+            'distancia_m': round(float(metros), 1),
+            'segundos': round(float(segundos), 1),
+            'ritmo_s_km': round(float(segundos / metros * 1000), 1) if metros > 0 else None,
+            'subida_m': round(subida, 1),
+        })
+    return resultado
+
+
+def resumen(route: Route, cada_m: float = 1000.0) -> Dict[str, object]:
+    """Distancia, duracion, ritmo medio, desnivel y splits de una ruta completa (sin simplificar)."""
+    distancia = float(distancias(route.lat, route.lon).sum()) if len(route) > 1 else 0.0
+    tiempos = route.t[~np.isnan(route.t)]
+    duracion = float(tiempos[-1] - tiempos[0]) if len(tiempos) > 1 else 0.0
+    subida, bajada = desnivel(route.ele)
+    return {
+        'path': route.path,
+        'puntos': len(route),
+        'distancia_m': round(distancia, 1),
+        'duracion_s': round(duracion, 1),
+        'ritmo_medio_s_km': round(duracion / distancia * 1000, 1) if distancia > 0 else None,
+        'subida_m': round(subida, 1),
+        'bajada_m': round(bajada, 1),
+        'splits': splits(route, cada_m),
+    }
+
+
+# ==== INDICE ESPACIAL ====
+class RouteIndex:
+    """
+    Grilla de celdas de `celda_grados` (0.01 ~ 1.1 km): cada celda guarda las rutas
+    que pasan por ella, contando los segmentos que la cruzan y no solo los vertices
+    (una ruta simplificada puede tener puntos a kilometros). Una consulta solo mira
+    las rutas de las celdas que cubren el radio y confirma la distancia exacta
+    contra sus segmentos.
+    """
+
+    def __init__(self, celda_grados: float = 0.01):
+        self.celda = celda_grados
+        self._celdas: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self._rutas: List[Route] = []
+
+    def __len__(self) -> int:
+        return len(self._rutas)
+
+    def add(self, route: Route) -> None:
+        if not len(route):
+            return
+        idx = len(self._rutas)
+        self._rutas.append(route)
+        for ci, cj in self._celdas_de(route.lat, route.lon):
+            self._celdas[(int(ci), int(cj))].add(idx)
+
+    def _celdas_de(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Celdas (i, j) que toca la polilinea."""
+        if len(lat) == 1:
+            return np.floor(np.column_stack([lat, lon]) / self.celda).astype(np.int64)
+        # cada segmento se muestrea a pasos de media celda como mucho: entre dos
+        # muestras seguidas el tramo cruza a lo sumo dos celdas por eje, y las
+        # cuatro combinaciones de sus celdas extremas lo cubren
+        dlat, dlon = np.diff(lat), np.diff(lon)
+        pasos = np.maximum(1, np.ceil(np.maximum(np.abs(dlat), np.abs(dlon)) / (self.celda / 2))).astype(np.int64)
+        seg = np.repeat(np.arange(len(dlat)), pasos)
+        t = (np.arange(len(seg)) - np.repeat(np.cumsum(pasos) - pasos, pasos)) / pasos[seg]
+        muestras_lat = np.append(lat[:-1][seg] + t * dlat[seg], lat[-1])
+        muestras_lon = np.append(lon[:-1][seg] + t * dlon[seg], lon[-1])
+        ci = np.floor(muestras_lat / self.celda).astype(np.int64)
+        cj = np.floor(muestras_lon / self.celda).astype(np.int64)
+        celdas = np.concatenate([
+            np.column_stack([ci[:-1], cj[:-1]]), np.column_stack([ci[1:], cj[1:]]),
+            np.column_stack([ci[:-1], cj[1:]]), np.column_stack([ci[1:], cj[:-1]]),
+        ])
+        return np.unique(celdas, axis=0)
+
+    def near(self, lat: float, lon: float, radio_m: float) -> List[Tuple[str, float]]:
+        """Rutas que pasan a menos de `radio_m` de (lat, lon): [(path, distancia_m)] ordenadas."""
+        dlat = radio_m / METROS_POR_GRADO
+        dlon = radio_m / (METROS_POR_GRADO * max(math.cos(math.radians(lat)), 1e-6))
+        candidatas: Set[int] = set()
+        for ci in range(math.floor((lat - dlat) / self.celda), math.floor((lat + dlat) / self.celda) + 1):
+            for cj in range(math.floor((lon - dlon) / self.celda), math.floor((lon + dlon) / self.celda) + 1):
+                candidatas |= self._celdas.get((ci, cj), set())
+        resultado = []
+        for idx in candidatas:
+            route = self._rutas[idx]
+            d = distancia_a_ruta(route.lat, route.lon, lat, lon)
+            if d <= radio_m:
+                resultado.append((route.path, round(d, 1)))
+        return sorted(resultado, key=lambda r: r[1])
+
+
+# ==== ALMACENAMIENTO ====
+def guardar_rutas(routes: List[Route], path: str) -> None:
+    """
+    Guarda rutas (normalmente simplificadas) en un solo .npz compacto: coordenadas en
+    microgrados int32 (~0.1 m), elevacion float32 y tiempo relativo al inicio en float32.
+    """
+    offsets = np.cumsum([0] + [len(r) for r in routes]).astype(np.int64)
+    concat = (lambda arrays, dtype: np.concatenate(arrays).astype(dtype) if arrays else np.empty(0, dtype))
+    t0 = np.array([r.t[0] if len(r) else np.nan for r in routes], dtype=np.float64)
+    np.savez_compressed(
+        path,
+        paths=np.array([r.path for r in routes]),
+        offsets=offsets,
+        lat=concat([np.round(r.lat * 1e6) for r in routes], np.int32),
+        lon=concat([np.round(r.lon * 1e6) for r in routes], np.int32),
+        ele=concat([r.ele for r in routes], np.float32),
+        t=concat([r.t - t0[i] for i, r in enumerate(routes)], np.float32),
+        t0=t0,
+    )
+
+
+def cargar_rutas(path: str) -> List[Route]:
+    with np.load(path) as data:
+        offsets, t0 = data['offsets'], data['t0']
+        lat, lon = data['lat'] / 1e6, data['lon'] / 1e6
+        ele, t = data['ele'], data['t'].astype(np.float64)
+        return [
+            Route(str(p), lat[a:b], lon[a:b], ele[a:b], t[a:b] + t0[i])
+            for i, (p, a, b) in enumerate(zip(data['paths'], offsets[:-1], offsets[1:]))
+        ]
+
+
+def load_routes(processor, tolerancia_m: float = 5.0, cada_m: float = 1000.0) -> Tuple[List[Route], RouteIndex]:
+    """
+    Carga las rutas GPX referenciadas por los entrenamientos de un AppleHealthXMLProcessor
+    ya parseado (zip o carpeta extraida). Agrega `summary` a cada ruta del entrenamiento
+    y devuelve las rutas simplificadas junto con su indice espacial.
+    """
+    rutas, indice = [], RouteIndex()
+    for workout in processor.health_data['workouts']:
+        for route_data in workout['workout_routes']:
+            file_path = route_data.get('file_path')
+            if not file_path:
+                continue
+            try:
+                with processor.open_resource(file_path) as f:
+                    route = parse_gpx(f, file_path)
+            except (KeyError, FileNotFoundError):
+                continue
+            route_data['summary'] = resumen(route, cada_m)
+            simple = route.subset(simplificar(route.lat, route.lon, tolerancia_m))
+            rutas.append(simple)
+            indice.add(simple)
+    return rutas, indice
+
+
+def main():
+    """Carga las rutas de un export, las resume y opcionalmente busca rutas cerca de un punto."""
+    from .xml_preprocess import AppleHealthXMLProcessor
+
+    parser = argparse.ArgumentParser(description='Rutas GPX de entrenamientos de Apple Health')
+    parser.add_argument('input_file', help='export.zip o export.xml extraido (con workout-routes/ al lado)')
+    parser.add_argument('-o', '--output', help='Guardar las rutas simplificadas en este .npz')
+    parser.add_argument('--tolerance', type=float, default=5.0, help='Tolerancia de Douglas-Peucker en metros')
+    parser.add_argument('--near', help='Buscar rutas cerca de LAT,LON')
+    parser.add_argument('--radius', type=float, default=500.0, help='Radio de --near en metros')
+    args = parser.parse_args()
+
+    processor = AppleHealthXMLProcessor()
+    try:
+        processor.parse_export(args.input_file)
+        inicio = time.time()
+        rutas, indice = load_routes(processor, args.tolerance)
+        segundos = time.time() - inicio
+    finally:
+        processor.close()
+
+    resumenes = [r['summary'] for w in processor.health_data['workouts'] for r in w['workout_routes'] if 'summary' in r]
+    puntos = sum(s['puntos'] for s in resumenes)
+    print(f"✅ {len(rutas)} rutas, {puntos} puntos -> {sum(len(r) for r in rutas)} simplificados en {segundos:.2f}s")
+    if args.output:
+        guardar_rutas(rutas, args.output)
+        print(f"Rutas guardadas en: {args.output}")
+    if args.near:
+        lat, lon = (float(v) for v in args.near.split(','))
+        inicio = time.time()
+        cercanas = indice.near(lat, lon, args.radius)
+        print(f"{len(cercanas)} rutas a menos de {args.radius:.0f} m ({(time.time() - inicio) * 1000:.1f} ms):")
+        for path, d in cercanas[:20]:
+            print(f"  {path}: {d} m")
+    else:
+        print(json.dumps(resumenes[:3], indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
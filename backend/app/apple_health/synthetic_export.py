@@ -0,0 +1,339 @@
+import argparse
+import math
+import os
+import random
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Fuentes tipicas de un export: el iPhone y el Apple Watch miden pasos y
+# distancia a la vez, con intervalos solapados.
+IPHONE = (
+    "iPhone de Usuario", "17.2",
+    "&lt;&lt;HKDevice: 0x2801a4f50&gt;, name:iPhone, manufacturer:Apple Inc., model:iPhone, hardware:iPhone14,5, software:17.2&gt;",
+)
+WATCH = (
+    "Apple Watch de Usuario", "10.2",
+    "&lt;&lt;HKDevice: 0x2801a5220&gt;, name:Apple Watch, manufacturer:Apple Inc., model:Watch, hardware:Watch6,2, software:10.2&gt;",
+)
+
+# tipo -> (unidad, muestras por dia, duracion de cada muestra en s, rango de valores, fuentes)
+QUANTITY_TYPES: Dict[str, Tuple[str, float, int, Tuple[float, float], tuple]] = {
+    "HKQuantityTypeIdentifierHeartRate": ("count/min", 288, 0, (52, 165), (WATCH,)),
+    "HKQuantityTypeIdentifierStepCount": ("count", 96, 600, (0, 1400), (IPHONE, WATCH)),
+    "HKQuantityTypeIdentifierDistanceWalkingRunning": ("km", 96, 600, (0.0, 1.1), (IPHONE, WATCH)),
+    "HKQuantityTypeIdentifierActiveEnergyBurned": ("Cal", 240, 300, (0.05, 25), (WATCH,)),
+    "HKQuantityTypeIdentifierBasalEnergyBurned": ("Cal", 240, 300, (4, 6), (WATCH,)),
+    "HKQuantityTypeIdentifierFlightsClimbed": ("count", 8, 300, (1, 4), (IPHONE,)),
+    "HKQuantityTypeIdentifierRestingHeartRate": ("count/min", 1, 0, (48, 66), (WATCH,)),
+    "HKQuantityTypeIdentifierVO2Max": ("mL/min·kg", 0.2, 0, (38, 52), (WATCH,)),
+    "HKQuantityTypeIdentifierBodyMass": ("kg", 0.1, 0, (68, 74), (IPHONE,)),
+    "HKQuantityTypeIdentifierHeight": ("cm", 0.003, 0, (175, 175), (IPHONE,)),
+}
+SLEEP_TYPE = "HKCategoryTypeIdentifierSleepAnalysis"
+SLEEP_STAGES = [
+    "HKCategoryValueSleepAnalysisAsleepCore", "HKCategoryValueSleepAnalysisAsleepDeep",
+    "HKCategoryValueSleepAnalysisAsleepREM", "HKCategoryValueSleepAnalysisAwake",
+]
+WORKOUT_TYPES = [
+    ("HKWorkoutActivityTypeRunning", True), ("HKWorkoutActivityTypeWalking", True),
+    ("HKWorkoutActivityTypeCycling", True), ("HKWorkoutActivityTypeTraditionalStrengthTraining", False),
+]
+
+DOCTYPE = """<!DOCTYPE HealthData [
+<!ELEMENT HealthData (ExportDate,Me,(Record|Correlation|Workout|ActivitySummary|ClinicalRecord|Audiogram|VisionPrescription)*)>
+<!ATTLIST HealthData locale CDATA #REQUIRED>
+]>
+"""
+
+TZ = "-0500"
+# Zona de las rutas sinteticas (Central Park) y pasos de GPS por segundo como el Watch
+ROUTE_HOME = (40.7812, -73.9665)
+ROUTE_HZ = 1.0
+
+
+class SyntheticExportGenerator:
+    """
+    Genera exports de Apple Health (export.xml) sinteticos pero fieles al esquema.
+
+    El archivo se escribe en streaming por tipo de dato, como en un export real
+    (todos los Record de un tipo, luego Workout y ActivitySummary), sin mantener
+    nada en memoria. La salida es determinista para una misma semilla.
+    """
+
+    def __init__(self, seed: int = 0, density: float = 1.0, start: Optional[date] = None):
+        self.seed = seed
+        self.density = density
+        self.start = start or date(2022, 1, 1)
+
+    def _rng(self, name: str) -> random.Random:
+        # una secuencia independiente por tipo: cambiar un tipo no altera los demas
+        return random.Random(f"{self.seed}:{name}")
+
+    @staticmethod
+    def _fmt(ts: datetime) -> str:
+        return ts.strftime("%Y-%m-%d %H:%M:%S ") + TZ
+
+    def _day_start(self, day: int) -> datetime:
+        return datetime.combine(self.start + timedelta(days=day), datetime.min.time())
+
+    # ==== ELEMENTOS ====
+    def _quantity_records(self, record_type: str, days: int) -> Iterator[str]:
+        unit, per_day, duration, (low, high), sources = QUANTITY_TYPES[record_type]
+        rng = self._rng(record_type)
+        per_day *= self.density
+        for day in range(days):
+            base = self._day_start(day)
+            for source_name, version, device in sources:
+                # muestras fraccionarias (p.ej. VO2max cada 5 dias) se resuelven por probabilidad
+                n = int(per_day) + (1 if rng.random() < per_day - int(per_day) else 0)
+                step = 86400 / max(n, 1)
+                for i in range(n):
+                    start = base + timedelta(seconds=int(i * step + rng.uniform(0, step / 4)))
+                    end = start + timedelta(seconds=duration)
+                    value = round(rng.uniform(low, high), 3 if unit == "km" else 0 if unit == "count" else 1)
+                    if unit == "count":
+                        value = int(value)
+                    attrs = (
+                        f'type="{record_type}" sourceName="{source_name}" sourceVersion="{version}" '
+                        f'device="{device}" unit="{unit}" creationDate="{self._fmt(end)}" '
+                        f'startDate="{self._fmt(start)}" endDate="{self._fmt(end)}" value="{value}"'
+                    )
+                    if record_type == "HKQuantityTypeIdentifierHeartRate":
+                        motion = rng.choice((0, 1, 2))
+                        yield (
+                            f' <Record {attrs}>\n'
+                            f'  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="{motion}"/>\n'
+                            f' </Record>\n'
+                        )
+                    else:
+                        yield f' <Record {attrs}/>\n'
+
+    def _sleep_records(self, days: int) -> Iterator[str]:
+        rng = self._rng(SLEEP_TYPE)
+        source_name, version, device = WATCH
+        for day in range(days):
+            ts = self._day_start(day) - timedelta(hours=rng.uniform(1, 2.5))
+            end_of_night = ts + timedelta(hours=rng.uniform(6, 8.5))
+            while ts < end_of_night:
+                end = ts + timedelta(minutes=rng.randint(10, 60))
+                yield (
+                    f' <Record type="{SLEEP_TYPE}" sourceName="{source_name}" sourceVersion="{version}" '
+                    f'device="{device}" creationDate="{self._fmt(end)}" startDate="{self._fmt(ts)}" '
+                    f'endDate="{self._fmt(end)}" value="{rng.choice(SLEEP_STAGES)}">\n'
+                    f'  <MetadataEntry key="HKTimeZone" value="America/New_York"/>\n'
+                    f' </Record>\n'
+                )
+                ts = end
+
+    def _workouts(self, days: int) -> Iterator[str]:
+        for xml, _ in self._workout_items(days):
+            yield xml
+
+    def route_specs(self, days: int) -> Iterator[Tuple[datetime, float, float]]:
+        """(inicio, minutos, km) de cada entrenamiento con ruta, igual que en el XML."""
+        for _, spec in self._workout_items(days):
+            if spec is not None:
+                yield spec
+
+    def _workout_items(self, days: int) -> Iterator[Tuple[str, Optional[Tuple[datetime, float, float]]]]:
+        rng = self._rng("workouts")
+        source_name, version, device = WATCH
+        for day in range(days):
+            if rng.random() > 0.6 * min(self.density, 1.5):
+                continue
+            activity, outdoor = rng.choice(WORKOUT_TYPES)
+            start = self._day_start(day) + timedelta(hours=rng.uniform(6, 20))
+            minutes = round(rng.uniform(20, 75), 4)
+            end = start + timedelta(minutes=minutes)
+            distance = round(minutes * rng.uniform(0.1, 0.2), 4) if outdoor else 0
+            energy = round(minutes * rng.uniform(6, 11), 3)
+            lines = [
+                f' <Workout workoutActivityType="{activity}" duration="{minutes}" durationUnit="min" '
+                f'totalDistance="{distance}" totalDistanceUnit="km" totalEnergyBurned="{energy}" '
+                f'totalEnergyBurnedUnit="Cal" sourceName="{source_name}" sourceVersion="{version}" '
+                f'device="{device}" creationDate="{self._fmt(end)}" startDate="{self._fmt(start)}" endDate="{self._fmt(end)}">\n',
+                f'  <MetadataEntry key="HKIndoorWorkout" value="{0 if outdoor else 1}"/>\n',
+                f'  <MetadataEntry key="HKTimeZone" value="America/New_York"/>\n',
+            ]
+            if rng.random() < 0.3:
+                pause = start + timedelta(minutes=minutes * rng.uniform(0.3, 0.7))
+                lines.append(f'  <WorkoutEvent type="HKWorkoutEventTypePause" date="{self._fmt(pause)}"/>\n')
+                lines.append(f'  <WorkoutEvent type="HKWorkoutEventTypeResume" date="{self._fmt(pause + timedelta(minutes=1))}"/>\n')
+            if outdoor:
+                for km in range(1, int(distance) + 1):
+                    seg = start + timedelta(minutes=minutes * (km - 1) / max(distance, 1))
+                    lines.append(
+                        f'  <WorkoutEvent type="HKWorkoutEventTypeSegment" date="{self._fmt(seg)}" '
+                        f'duration="{round(minutes / max(distance, 1), 4)}" durationUnit="min">\n'
+                        f'   <MetadataEntry key="HKMetadataKeyDistance" value="{km}"/>\n'
+                        f'  </WorkoutEvent>\n'
+                    )
+            lines.append(
+                f'  <WorkoutStatistics type="HKQuantityTypeIdentifierActiveEnergyBurned" startDate="{self._fmt(start)}" '
+                f'endDate="{self._fmt(end)}" sum="{energy}" unit="Cal"/>\n'
+            )
+            if outdoor:
+                lines.append(
+                    f'  <WorkoutRoute sourceName="{source_name}" sourceVersion="{version}" '
+                    f'creationDate="{self._fmt(end)}" startDate="{self._fmt(start)}" endDate="{self._fmt(end)}">\n'
+                    f'   <MetadataEntry key="HKMetadataKeySyncVersion" value="2"/>\n'
+                    f'   <FileReference path="{self.route_path(start)}"/>\n'
+                    f'  </WorkoutRoute>\n'
+                )
+            lines.append(' </Workout>\n')
+            yield "".join(lines), (start, minutes, distance) if outdoor else None
+
+    @staticmethod
+    def route_path(start: datetime) -> str:
+        return "/workout-routes/route_" + start.strftime("%Y-%m-%d_%I.%M%p").lower() + ".gpx"
+
+    def route_gpx(self, start: datetime, minutes: float, distance_km: float) -> bytes:
+        """GPX con el formato del export de Apple: un trkpt por segundo con ele, time y extensions."""
+        rng = random.Random(f"{self.seed}:route:{start.isoformat()}")
+        n = max(2, int(minutes * 60 * ROUTE_HZ))
+        speed = distance_km * 1000 / (minutes * 60)
+        lat, lon = ROUTE_HOME[0] + rng.uniform(-0.02, 0.02), ROUTE_HOME[1] + rng.uniform(-0.02, 0.02)
+        heading = rng.uniform(0, 2 * math.pi)
+        ele = rng.uniform(5, 40)
+        utc = start + timedelta(hours=5)
+        points = []
+        for i in range(n):
+            heading += rng.gauss(0, 0.05)
+            step = speed * rng.uniform(0.8, 1.2) / ROUTE_HZ
+            lat += step * math.cos(heading) / 111_320
+            lon += step * math.sin(heading) / (111_320 * math.cos(math.radians(lat)))
+            ele += rng.gauss(0, 0.15)
+            ts = (utc + timedelta(seconds=i / ROUTE_HZ)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            points.append(
+                f'<trkpt lon="{lon:.6f}" lat="{lat:.6f}"><ele>{ele:.2f}</ele><time>{ts}</time>'
+                f'<extensions><speed>{step * ROUTE_HZ:.2f}</speed><course>{math.degrees(heading) % 360:.1f}</course>'
+                f'<hAcc>{rng.uniform(1, 5):.1f}</hAcc><vAcc>{rng.uniform(1, 4):.1f}</vAcc></extensions></trkpt>\n'
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gpx version="1.1" creator="Apple Health Export" xmlns="http://www.topografix.com/GPX/1/1">\n'
+            f' <metadata>\n  <time>{utc.strftime("%Y-%m-%dT%H:%M:%SZ")}</time>\n </metadata>\n'
+            f' <trk>\n  <name>Route {start.strftime("%Y-%m-%d %I:%M%p")}</name>\n  <trkseg>\n'
+            + "".join(points) + '  </trkseg>\n </trk>\n</gpx>\n'
+        ).encode("utf-8")
+
+    def _activity_summaries(self, days: int) -> Iterator[str]:
+        rng = self._rng("activity")
+        for day in range(days):
+            d = self.start + timedelta(days=day)
+            yield (
+                f' <ActivitySummary dateComponents="{d.isoformat()}" activeEnergyBurned="{round(rng.uniform(150, 900), 3)}" '
+                f'activeEnergyBurnedGoal="500" activeEnergyBurnedUnit="Cal" appleMoveTime="0" appleMoveTimeGoal="0" '
+                f'appleExerciseTime="{rng.randint(0, 90)}" appleExerciseTimeGoal="30" '
+                f'appleStandHours="{rng.randint(4, 16)}" appleStandHoursGoal="12"/>\n'
+            )
+
+    def _elements(self, days: int) -> Iterator[str]:
+        for record_type in QUANTITY_TYPES:
+            yield from self._quantity_records(record_type, days)
+        yield from self._sleep_records(days)
+        yield from self._workouts(days)
+        yield from self._activity_summaries(days)
+
+    # ==== ESCRITURA ====
+    def _header(self, days: int) -> str:
+        export = self._fmt(self._day_start(days))
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n' + DOCTYPE + '<HealthData locale="es_ES">\n'
+            f' <ExportDate value="{export}"/>\n'
+            ' <Me HKCharacteristicTypeIdentifierDateOfBirth="1990-05-12" '
+            'HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexFemale" '
+            'HKCharacteristicTypeIdentifierBloodType="HKBloodTypeNotSet" '
+            'HKCharacteristicTypeIdentifierFitzpatrickSkinType="HKFitzpatrickSkinTypeNotSet" '
+            'HKCharacteristicTypeIdentifierCardioFitnessMedicationsUse="None"/>\n'
+        )
+
+    def bytes_per_day(self) -> float:
+        """Tamaño medio de un dia de datos, estimado con una semana de muestra."""
+        sample_days = 7
+        return sum(len(e.encode("utf-8")) for e in self._elements(sample_days)) / sample_days
+
+    def days_for_size(self, target_bytes: int) -> int:
+        return max(1, round(target_bytes / self.bytes_per_day()))
+
+    def write(self, output, days: int) -> Dict[str, int]:
+        """
+        Escribe el export a un archivo (ruta o archivo binario abierto).
+
+        Returns:
+            Dict con los dias generados y el tamaño en bytes
+        """
+        own = isinstance(output, (str, os.PathLike))
+        f = open(output, "wb") if own else output
+        written = 0
+        try:
+            buffer: List[str] = [self._header(days)]
+            pending = 0
+            for element in self._elements(days):
+                buffer.append(element)
+                pending += 1
+                if pending >= 4096:
+                    chunk = "".join(buffer).encode("utf-8")
+                    f.write(chunk)
+                    written += len(chunk)
+                    buffer, pending = [], 0
+            buffer.append("</HealthData>\n")
+            chunk = "".join(buffer).encode("utf-8")
+            f.write(chunk)
+            written += len(chunk)
+        finally:
+            if own:
+                f.close()
+        return {"days": days, "bytes": written}
+
+    def write_zip(self, output: str, days: int, routes: bool = True) -> Dict[str, int]:
+        """Escribe un export.zip como el del iPhone: export.xml y las rutas GPX en workout-routes/."""
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            with archive.open("apple_health_export/export.xml", "w", force_zip64=True) as f:
+                result = self.write(f, days)
+            result["routes"] = 0
+            if routes:
+                for start, minutes, distance in self.route_specs(days):
+                    name = "apple_health_export" + self.route_path(start)
+                    archive.writestr(name, self.route_gpx(start, minutes, distance))
+                    result["routes"] += 1
+        result["bytes"] = os.path.getsize(output)
+        return result
+
+
+def parse_size(text: str) -> int:
+    """'10MB', '2GB', '500KB' o bytes."""
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+    text = text.strip().upper()
+    for suffix, factor in units.items():
+        if text.endswith(suffix):
+            return int(float(text[: -len(suffix)]) * factor)
+    return int(text)
+
+
+def main():
+    """Genera un export sintetico desde línea de comandos."""
+    parser = argparse.ArgumentParser(description='Generar export.xml sintetico de Apple Health')
+    parser.add_argument('-o', '--output', default='export.xml', help='Ruta del XML de salida (.zip: export.zip con rutas GPX)')
+    parser.add_argument('--size', default='10MB', help='Tamaño aproximado (ej. 10MB, 2GB)')
+    parser.add_argument('--days', type=int, help='Dias a generar (ignora --size)')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla (misma semilla = mismo archivo)')
+    parser.add_argument('--density', type=float, default=1.0, help='Multiplicador de muestras por dia')
+    parser.add_argument('--start', default='2022-01-01', help='Primer dia (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    generator = SyntheticExportGenerator(seed=args.seed, density=args.density, start=date.fromisoformat(args.start))
+    days = args.days or generator.days_for_size(parse_size(args.size))
+    inicio = time.time()
+    if args.output.endswith('.zip'):
+        result = generator.write_zip(args.output, days)
+    else:
+        result = generator.write(args.output, days)
+    rutas = f", {result['routes']} rutas" if 'routes' in result else ""
+    print(f"✅ {args.output}: {result['days']} dias{rutas}, {result['bytes'] / (1024 * 1024):.1f} MB en {time.time() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,133 @@
 import xml.etree.ElementTree as ET
 import json
 import os
+import queue
+import threading
+import zipfile
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import BinaryIO, Dict, List, Any, Optional
 import argparse
 
+from .dedup import SourceDeduplicator
+
+
+class _PrefetchReader:
+    """
+    Lee (y descomprime) el origen en un hilo aparte mientras el parser consume,
+    con una cola acotada de bloques. zlib libera el GIL, asi descompresion y
+    parseo avanzan en paralelo sin archivos temporales.
+    """
+
+    def __init__(self, raw: BinaryIO, chunk_size: int = 1 << 20, depth: int = 8):
+        self._raw = raw
+        self._chunk_size = chunk_size
+        self._queue: queue.Queue = queue.Queue(depth)
+        self._buffer = memoryview(b"")
+        self._eof = False
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self) -> None:
+        try:
+            while not self._closed.is_set():
+                data = self._raw.read(self._chunk_size)
+                self._put(data)
+                if not data:
+                    return
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item) -> None:
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def read(self, size: int = -1) -> bytes:
+        partes = []
+        while (size < 0 or size > 0) and not self._eof:
+            if not self._buffer:
+                item = self._queue.get()
+                if isinstance(item, BaseException):
+                    raise item
+                if not item:
+                    self._eof = True
+                    break
+                self._buffer = memoryview(item)
+            n = len(self._buffer) if size < 0 else min(size, len(self._buffer))
+            partes.append(self._buffer[:n].tobytes())
+            self._buffer = self._buffer[n:]
+            if size > 0:
+                size -= n
+        return b"".join(partes)
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ExportArchive:
+    """
+    export.zip de Apple Health leido sin extraer a disco.
+
+    export.xml se abre en streaming; el resto de los miembros (export_cda.xml,
+    workout-routes/*.gpx, clinical-records/*.json) se resuelven bajo demanda con
+    las mismas rutas que usa el XML (p. ej. "/workout-routes/route_1.gpx").
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self._names = set(self._zip.namelist())
+        export = next((n for n in sorted(self._names, key=len) if n.rsplit('/', 1)[-1] == 'export.xml'), None)
+        if export is None:
+            self._zip.close()
+            raise ValueError(f"{path} no contiene export.xml")
+        # carpeta raiz dentro del zip, normalmente "apple_health_export/"
+        self.prefix = export[:-len('export.xml')]
+
+    def member(self, path: str) -> str:
+        """Ruta del export (con o sin "/" inicial) -> nombre dentro del zip."""
+        name = self.prefix + path.lstrip('/')
+        if name not in self._names:
+            raise KeyError(f"{path} no esta en {self.path}")
+        return name
+
+    def exists(self, path: str) -> bool:
+        return self.prefix + path.lstrip('/') in self._names
+
+    def list(self, folder: str = '') -> List[str]:
+        """Rutas de los miembros bajo `folder` (p. ej. "workout-routes")."""
+        inicio = self.prefix + folder.strip('/')
+        return sorted('/' + n[len(self.prefix):] for n in self._names if n.startswith(inicio) and not n.endswith('/'))
+
+    def open(self, path: str, prefetch: bool = False) -> BinaryIO:
+        raw = self._zip.open(self.member(path))
+        return _PrefetchReader(raw) if prefetch else raw
+
+    def read_json(self, path: str) -> Any:
+        with self.open(path) as f:
+            return json.load(f)
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
 class AppleHealthXMLProcessor:
     """
@@ -12,7 +135,7 @@ class AppleHealthXMLProcessor:
     Maneja diferentes tipos de datos de salud y organiza la información de manera estructurada.
     """
     
-    def __init__(self):
+    def __init__(self, dedup: bool = True):
         self.health_data = {
             "metadata": {},
             "records": [],
@@ -20,6 +143,11 @@ class AppleHealthXMLProcessor:
             "clinical_records": [],
             "activity_summaries": []
         }
+        # origen de los archivos referenciados por el XML (rutas GPX, recursos clinicos)
+        self.archive: Optional[ExportArchive] = None
+        self.base_dir: Optional[str] = None
+        # Record solapados de iPhone y Watch: se resuelven mientras se parsea (ver dedup.py)
+        self.dedup: Optional[SourceDeduplicator] = SourceDeduplicator() if dedup else None
         
         # Mapeo de tipos de datos comunes de Apple Health
         self.data_type_mapping = {
@@ -43,32 +171,69 @@ class AppleHealthXMLProcessor:
         Args:
             xml_file_path (str): Ruta al archivo XML de Apple Health
         """
-        print(f"Procesando archivo XML: {xml_file_path}")
+        self.base_dir = os.path.dirname(os.path.abspath(xml_file_path))
+        with open(xml_file_path, 'rb') as f:
+            self.parse_xml_stream(f, xml_file_path)
+
+    def parse_export(self, path: str) -> None:
+        """
+        Parsea un export.zip (sin extraerlo) o un export.xml ya extraido.
+
+        Con un zip, el archivo queda abierto en `self.archive` para resolver bajo
+        demanda los demas miembros; cerrarlo con `close()`.
+        """
+        if zipfile.is_zipfile(path):
+            self.archive = ExportArchive(path)
+            with self.archive.open('export.xml', prefetch=True) as f:
+                self.parse_xml_stream(f, f"{path}!export.xml")
+        else:
+            self.parse_xml_file(path)
+
+    def parse_xml_stream(self, source: BinaryIO, name: str = 'export.xml') -> None:
+        """
+        Parsea export.xml en streaming (iterparse): cada elemento de primer nivel se
+        procesa al cerrarse y se libera, asi la memoria no crece con el tamaño del XML.
+        """
+        print(f"Procesando archivo XML: {name}")
         
         try:
-            tree = ET.parse(xml_file_path)
-            root = tree.getroot()
-            
-            # Extraer metadatos
-            self._extract_metadata(root)
-            
-            # Extraer registros de salud
-            self._extract_health_records(root)
-            
-            # Extraer entrenamientos
-            self._extract_workouts(root)
-            
-            # Extraer registros clínicos
-            self._extract_clinical_records(root)
-            
-            # Extraer resúmenes de actividad
-            self._extract_activity_summaries(root)
+            root = None
+            export_date = ''
+            depth = 0
+            for event, elem in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                        export_date = elem.attrib.get('exportDate', '')
+                    depth += 1
+                    continue
+                depth -= 1
+                tag = elem.tag
+                # los Record pueden venir anidados en Correlation
+                if tag == 'Record':
+                    self._add_record(self._record_data(elem))
+                elif depth == 1:
+                    if tag == 'Workout':
+                        self.health_data['workouts'].append(self._workout_data(elem))
+                    elif tag == 'ActivitySummary':
+                        self.health_data['activity_summaries'].append(self._activity_summary_data(elem))
+                    elif tag == 'ClinicalRecord':
+                        self.health_data['clinical_records'].append(self._clinical_record_data(elem))
+                    elif tag == 'Me':
+                        self.health_data['metadata'] = self._metadata(export_date, elem)
+                if depth == 1:
+                    root.clear()
+            if self.dedup is not None:
+                self.health_data['records'].extend(self.dedup.flush())
             
             print(f"Procesamiento completado:")
             print(f"- Registros de salud: {len(self.health_data['records'])}")
             print(f"- Entrenamientos: {len(self.health_data['workouts'])}")
             print(f"- Registros clínicos: {len(self.health_data['clinical_records'])}")
             print(f"- Resúmenes de actividad: {len(self.health_data['activity_summaries'])}")
+            if self.dedup is not None:
+                dedup = self.dedup.summary()
+                print(f"- Duplicados entre fuentes descartados: {dedup['dropped']} (prorrateados: {dedup['trimmed']})")
             
         except ET.ParseError as e:
             print(f"Error al parsear el archivo XML: {e}")
@@ -76,148 +241,131 @@ class AppleHealthXMLProcessor:
         except Exception as e:
             print(f"Error inesperado: {e}")
             raise
+
+    def _add_record(self, record: Dict[str, Any]) -> None:
+        if self.dedup is None:
+            self.health_data['records'].append(record)
+        else:
+            self.health_data['records'].extend(self.dedup.feed(record))
+
+    def open_resource(self, path: str) -> BinaryIO:
+        """Abre un archivo referenciado por el export (FileReference, resourceFilePath)."""
+        if self.archive is not None:
+            return self.archive.open(path)
+        if self.base_dir is None:
+            raise ValueError("No hay export cargado")
+        return open(os.path.join(self.base_dir, path.lstrip('/')), 'rb')
+
+    def load_clinical_resource(self, clinical_record: Dict[str, Any]) -> Any:
+        """FHIR JSON de un registro clinico, leido solo cuando se pide."""
+        with self.open_resource(clinical_record['resource_file_path']) as f:
+            return json.load(f)
+
+    def close(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    @staticmethod
+    def _metadata_entries(elem: ET.Element) -> Dict[str, str]:
+        return {m.attrib.get('key', ''): m.attrib.get('value', '') for m in elem.iter('MetadataEntry')}
     
-    def _extract_metadata(self, root: ET.Element) -> None:
-        """Extrae metadatos del archivo XML."""
-        # Información del export
-        export_date = root.attrib.get('exportDate', '')
-        
-        # Información del dispositivo
-        me_element = root.find('.//Me')
-        if me_element is not None:
-            self.health_data['metadata'] = {
-                'export_date': export_date,
-                'date_of_birth': me_element.attrib.get('HKCharacteristicTypeIdentifierDateOfBirth', ''),
-                'biological_sex': me_element.attrib.get('HKCharacteristicTypeIdentifierBiologicalSex', ''),
-                'blood_type': me_element.attrib.get('HKCharacteristicTypeIdentifierBloodType', ''),
-                'fitzpatrick_skin_type': me_element.attrib.get('HKCharacteristicTypeIdentifierFitzpatrickSkinType', '')
-            }
+    def _metadata(self, export_date: str, me_element: ET.Element) -> Dict[str, str]:
+        """Metadatos del export e informacion del usuario (elemento Me)."""
+        return {
+            'export_date': export_date,
+            'date_of_birth': me_element.attrib.get('HKCharacteristicTypeIdentifierDateOfBirth', ''),
+            'biological_sex': me_element.attrib.get('HKCharacteristicTypeIdentifierBiologicalSex', ''),
+            'blood_type': me_element.attrib.get('HKCharacteristicTypeIdentifierBloodType', ''),
+            'fitzpatrick_skin_type': me_element.attrib.get('HKCharacteristicTypeIdentifierFitzpatrickSkinType', '')
+        }
     
-    def _extract_health_records(self, root: ET.Element) -> None:
-        """Extrae registros de datos de salud."""
-        records = root.findall('.//Record')
-        
-        for record in records:
-            record_data = {
-                'type': self._normalize_data_type(record.attrib.get('type', '')),
-                'original_type': record.attrib.get('type', ''),
-                'source_name': record.attrib.get('sourceName', ''),
-                'source_version': record.attrib.get('sourceVersion', ''),
-                'device': record.attrib.get('device', ''),
-                'unit': record.attrib.get('unit', ''),
-                'creation_date': record.attrib.get('creationDate', ''),
-                'start_date': record.attrib.get('startDate', ''),
-                'end_date': record.attrib.get('endDate', ''),
-                'value': record.attrib.get('value', ''),
-                'metadata': {}
-            }
-            
-            # Extraer metadatos adicionales
-            metadata_values = record.findall('.//MetadataEntry')
-            for metadata in metadata_values:
-                key = metadata.attrib.get('key', '')
-                value = metadata.attrib.get('value', '')
-                record_data['metadata'][key] = value
-            
-            self.health_data['records'].append(record_data)
+    def _record_data(self, record: ET.Element) -> Dict[str, Any]:
+        """Registro de datos de salud."""
+        attrib = record.attrib
+        return {
+            'type': self._normalize_data_type(attrib.get('type', '')),
+            'original_type': attrib.get('type', ''),
+            'source_name': attrib.get('sourceName', ''),
+            'source_version': attrib.get('sourceVersion', ''),
+            'device': attrib.get('device', ''),
+            'unit': attrib.get('unit', ''),
+            'creation_date': attrib.get('creationDate', ''),
+            'start_date': attrib.get('startDate', ''),
+            'end_date': attrib.get('endDate', ''),
+            'value': attrib.get('value', ''),
+            'metadata': self._metadata_entries(record)
+        }
     
-    def _extract_workouts(self, root: ET.Element) -> None:
-        """Extrae datos de entrenamientos."""
-        workouts = root.findall('.//Workout')
+    def _workout_data(self, workout: ET.Element) -> Dict[str, Any]:
+        """Entrenamiento con sus eventos y rutas."""
+        workout_data = {
+            'workout_activity_type': workout.attrib.get('workoutActivityType', ''),
+            'duration': workout.attrib.get('duration', ''),
+            'duration_unit': workout.attrib.get('durationUnit', ''),
+            'total_distance': workout.attrib.get('totalDistance', ''),
+            'total_distance_unit': workout.attrib.get('totalDistanceUnit', ''),
+            'total_energy_burned': workout.attrib.get('totalEnergyBurned', ''),
+            'total_energy_burned_unit': workout.attrib.get('totalEnergyBurnedUnit', ''),
+            'source_name': workout.attrib.get('sourceName', ''),
+            'source_version': workout.attrib.get('sourceVersion', ''),
+            'device': workout.attrib.get('device', ''),
+            'creation_date': workout.attrib.get('creationDate', ''),
+            'start_date': workout.attrib.get('startDate', ''),
+            'end_date': workout.attrib.get('endDate', ''),
+            'metadata': self._metadata_entries(workout),
+            'workout_events': [],
+            'workout_routes': []
+        }
         
-        for workout in workouts:
-            workout_data = {
-                'workout_activity_type': workout.attrib.get('workoutActivityType', ''),
-                'duration': workout.attrib.get('duration', ''),
-                'duration_unit': workout.attrib.get('durationUnit', ''),
-                'total_distance': workout.attrib.get('totalDistance', ''),
-                'total_distance_unit': workout.attrib.get('totalDistanceUnit', ''),
-                'total_energy_burned': workout.attrib.get('totalEnergyBurned', ''),
-                'total_energy_burned_unit': workout.attrib.get('totalEnergyBurnedUnit', ''),
-                'source_name': workout.attrib.get('sourceName', ''),
-                'source_version': workout.attrib.get('sourceVersion', ''),
-                'device': workout.attrib.get('device', ''),
-                'creation_date': workout.attrib.get('creationDate', ''),
-                'start_date': workout.attrib.get('startDate', ''),
-                'end_date': workout.attrib.get('endDate', ''),
-                'metadata': {},
-                'workout_events': [],
-                'workout_routes': []
-            }
-            
-            # Extraer metadatos del entrenamiento
-            metadata_values = workout.findall('.//MetadataEntry')
-            for metadata in metadata_values:
-                key = metadata.attrib.get('key', '')
-                value = metadata.attrib.get('value', '')
-                workout_data['metadata'][key] = value
-            
-            # Extraer eventos del entrenamiento
-            workout_events = workout.findall('.//WorkoutEvent')
-            for event in workout_events:
-                event_data = {
-                    'type': event.attrib.get('type', ''),
-                    'date': event.attrib.get('date', ''),
-                    'metadata': {}
-                }
-                
-                event_metadata = event.findall('.//MetadataEntry')
-                for metadata in event_metadata:
-                    key = metadata.attrib.get('key', '')
-                    value = metadata.attrib.get('value', '')
-                    event_data['metadata'][key] = value
-                
-                workout_data['workout_events'].append(event_data)
-            
-            # Extraer rutas del entrenamiento
-            workout_routes = workout.findall('.//WorkoutRoute')
-            for route in workout_routes:
-                route_data = {
-                    'source_name': route.attrib.get('sourceName', ''),
-                    'source_version': route.attrib.get('sourceVersion', ''),
-                    'device': route.attrib.get('device', ''),
-                    'creation_date': route.attrib.get('creationDate', ''),
-                    'start_date': route.attrib.get('startDate', ''),
-                    'end_date': route.attrib.get('endDate', '')
-                }
-                workout_data['workout_routes'].append(route_data)
-            
-            self.health_data['workouts'].append(workout_data)
-    
-    def _extract_clinical_records(self, root: ET.Element) -> None:
-        """Extrae registros clínicos."""
-        clinical_records = root.findall('.//ClinicalRecord')
+        # Extraer eventos del entrenamiento
+        for event in workout.iterfind('WorkoutEvent'):
+            workout_data['workout_events'].append({
+                'type': event.attrib.get('type', ''),
+                'date': event.attrib.get('date', ''),
+                'metadata': self._metadata_entries(event)
+            })
         
-        for record in clinical_records:
-            clinical_data = {
-                'type': record.attrib.get('type', ''),
-                'identifier': record.attrib.get('identifier', ''),
-                'source_name': record.attrib.get('sourceName', ''),
-                'source_url': record.attrib.get('sourceURL', ''),
-                'fhir_version': record.attrib.get('fhirVersion', ''),
-                'received_date': record.attrib.get('receivedDate', ''),
-                'resource_file_path': record.attrib.get('resourceFilePath', '')
-            }
-            
-            self.health_data['clinical_records'].append(clinical_data)
-    
-    def _extract_activity_summaries(self, root: ET.Element) -> None:
-        """Extrae resúmenes de actividad diaria."""
-        activity_summaries = root.findall('.//ActivitySummary')
+        # Extraer rutas del entrenamiento
+        for route in workout.iterfind('WorkoutRoute'):
+            # el GPX va en un archivo aparte: se guarda la ruta y se carga con routes.load_routes
+            file_reference = route.find('FileReference')
+            workout_data['workout_routes'].append({
+                'source_name': route.attrib.get('sourceName', ''),
+                'source_version': route.attrib.get('sourceVersion', ''),
+                'device': route.attrib.get('device', ''),
+                'creation_date': route.attrib.get('creationDate', ''),
+                'start_date': route.attrib.get('startDate', ''),
+                'end_date': route.attrib.get('endDate', ''),
+                'file_path': file_reference.attrib.get('path', '') if file_reference is not None else ''
+            })
         
-        for summary in activity_summaries:
-            summary_data = {
-                'date_components': summary.attrib.get('dateComponents', ''),
-                'active_energy_burned': summary.attrib.get('activeEnergyBurned', ''),
-                'active_energy_burned_goal': summary.attrib.get('activeEnergyBurnedGoal', ''),
-                'active_energy_burned_unit': summary.attrib.get('activeEnergyBurnedUnit', ''),
-                'apple_exercise_time': summary.attrib.get('appleExerciseTime', ''),
-                'apple_exercise_time_goal': summary.attrib.get('appleExerciseTimeGoal', ''),
-                'apple_stand_hours': summary.attrib.get('appleStandHours', ''),
-                'apple_stand_hours_goal': summary.attrib.get('appleStandHoursGoal', '')
-            }
-            
-            self.health_data['activity_summaries'].append(summary_data)
+        return workout_data
+    
+    def _clinical_record_data(self, record: ET.Element) -> Dict[str, str]:
+        """Registro clinico (el recurso FHIR se lee aparte con load_clinical_resource)."""
+        return {
+            'type': record.attrib.get('type', ''),
+            'identifier': record.attrib.get('identifier', ''),
+            'source_name': record.attrib.get('sourceName', ''),
+            'source_url': record.attrib.get('sourceURL', ''),
+            'fhir_version': record.attrib.get('fhirVersion', ''),
+            'received_date': record.attrib.get('receivedDate', ''),
+            'resource_file_path': record.attrib.get('resourceFilePath', '')
+        }
+    
+    def _activity_summary_data(self, summary: ET.Element) -> Dict[str, str]:
+        """Resumen de actividad diaria."""
+        return {
+            'date_components': summary.attrib.get('dateComponents', ''),
+            'active_energy_burned': summary.attrib.get('activeEnergyBurned', ''),
+            'active_energy_burned_goal': summary.attrib.get('activeEnergyBurnedGoal', ''),
+            'active_energy_burned_unit': summary.attrib.get('activeEnergyBurnedUnit', ''),
+            'apple_exercise_time': summary.attrib.get('appleExerciseTime', ''),
+            'apple_exercise_time_goal': summary.attrib.get('appleExerciseTimeGoal', ''),
+            'apple_stand_hours': summary.attrib.get('appleStandHours', ''),
+            'apple_stand_hours_goal': summary.attrib.get('appleStandHoursGoal', '')
+        }
     
     def _normalize_data_type(self, original_type: str) -> str:
         """Normaliza los tipos de datos de Apple Health a nombres más legibles."""
@@ -299,9 +447,10 @@ class AppleHealthXMLProcessor:
 def main():
     """Función principal para ejecutar el procesador desde línea de comandos."""
     parser = argparse.ArgumentParser(description='Convertir archivo XML de Apple Health a JSON')
-    parser.add_argument('input_file', help='Ruta al archivo XML de Apple Health')
+    parser.add_argument('input_file', help='Ruta a export.zip (se lee sin extraer) o al export.xml de Apple Health')
     parser.add_argument('-o', '--output', help='Ruta del archivo JSON de salida (opcional)')
     parser.add_argument('--summary', action='store_true', help='Mostrar resumen de los datos procesados')
+    parser.add_argument('--no-dedup', action='store_true', help='Conservar los registros solapados de todas las fuentes')
     
     args = parser.parse_args()
     
@@ -315,13 +464,15 @@ def main():
         output_file = args.output
     else:
         base_name = os.path.splitext(os.path.basename(args.input_file))[0]
+        if zipfile.is_zipfile(args.input_file):
+            base_name = 'export'
         output_file = f"{base_name}_processed.json"
     
     # Procesar archivo
-    processor = AppleHealthXMLProcessor()
+    processor = AppleHealthXMLProcessor(dedup=not args.no_dedup)
     
     try:
-        processor.parse_xml_file(args.input_file)
+        processor.parse_export(args.input_file)
         processor.save_to_json(output_file)
         
         if args.summary:
@@ -353,6 +504,8 @@ def main():
         
     except Exception as e:
         print(f"❌ Error durante el procesamiento: {e}")
+    finally:
+        processor.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+# Materialised per-user coaching context for the LLM prompt builders.
+#
+# Goals, the latest milestones and diary entries and the training-load state
+# (readiness, last recorded workout) are assembled once per user and kept in the shared
+# state backend. Diary writes and health ingest patch the snapshot in place, so
+# a prompt costs one key lookup however much history the user has. A miss
+# (first use, expiry, eviction) rebuilds it with a handful of LIMIT-ed queries;
+# a rebuild that raced a write is dropped instead of cached (see get_context).
+
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .analytics import training_load
+from .db import AsyncSessionLocal
+from .metrics import registry
+from .state import get_state
+
+load_dotenv()
+
+# Snapshots are rebuilt from the database at least this often (seconds)
+COACH_CONTEXT_TTL = int(os.getenv("COACH_CONTEXT_TTL", "86400"))
+# Goals, milestones and diary entries kept per user
+COACH_CONTEXT_ITEMS = int(os.getenv("COACH_CONTEXT_ITEMS", "5"))
+
+VERSION = 1
+NOTE_CHARS = 160
+
+GOAL_FIELDS = ("id", "title", "target_date", "created_at")
+MILESTONE_FIELDS = ("id", "goal_id", "note", "created_at")
+DIARY_FIELDS = ("id", "note", "mood", "fatigue", "sleep_hours", "created_at")
+LOAD_FIELDS = (
+    "day", "acute_load", "chronic_load", "fatigue_short", "fatigue_long", "sleep_short", "sleep_long",
+    "resting_hr_short", "resting_hr_long", "vo2_max", "samples",
+    "last_workout_type", "last_workout_at", "last_workout_minutes",
+)
+
+lookups_total = registry.counter("coach_context_lookups_total", "Coaching context reads by cache result")
+
+
+def _key(user_id: str) -> str:
+    return f"coach_ctx:{user_id}"
+
+
+def _writes_key(user_id: str) -> str:
+    # changes on every write; lets a rebuild tell whether it may have missed one
+    return f"coach_ctx_writes:{user_id}"
+
+
+def _item(row: Any, fields: Iterable[str]) -> Dict[str, Any]:
+    """ORM row or insert dict -> JSON-safe dict."""
+    get = row.get if isinstance(row, dict) else lambda f: getattr(row, f, None)
+    item = {}
+    for field in fields:
+        value = get(field)
+        if field == "created_at":
+            value = (value or datetime.utcnow()).isoformat()
+        elif field == "note" and value and len(value) > NOTE_CHARS:
+            value = value[:NOTE_CHARS] + "…"
+        item[field] = value
+    return item
+
+
+def _merge(current: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Newest first by (created_at, id); offline syncs can arrive with older timestamps."""
+    merged = {item["id"]: item for item in current}
+    merged.update((item["id"], item) for item in new)
+    ordered = sorted(merged.values(), key=lambda i: (i["created_at"], i["id"] or 0), reverse=True)
+    return ordered[:COACH_CONTEXT_ITEMS]
+
+
+def _load(state: Optional[models.TrainingLoad]) -> Optional[Dict[str, Any]]:
+    return {f: getattr(state, f) for f in LOAD_FIELDS} if state is not None else None
+
+
+async def build(db: AsyncSession, user_id: str) -> Dict[str, Any]:
+    """Full rebuild: one LIMIT-ed query per section, each served by a (user_id, created_at) index."""
+    async def recent(model):
+        stmt = (
+            select(model).where(model.user_id == user_id)
+            .order_by(model.created_at.desc(), model.id.desc()).limit(COACH_CONTEXT_ITEMS)
+        )
+        return (await db.scalars(stmt)).all()
+
+    return {
+        "version": VERSION,
+        "goals": [_item(g, GOAL_FIELDS) for g in await recent(models.Goal)],
+        "milestones": [_item(m, MILESTONE_FIELDS) for m in await recent(models.Milestone)],
+        "diary": [_item(e, DIARY_FIELDS) for e in await recent(models.DiaryEntry)],
+        "load": _load(await db.get(models.TrainingLoad, user_id)),
+    }
+
+
+async def get_context(user_id: str, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+    state = get_state()
+    context = await state.get(_key(user_id))
+    if context is not None and context.get("version") == VERSION:
+        lookups_total.inc(result="hit")
+        return context
+    lookups_total.inc(result="miss")
+    written = await state.get(_writes_key(user_id))
+    if db is None:
+        async with AsyncSessionLocal() as session:
+            context = await build(session, user_id)
+    else:
+        context = await build(db, user_id)
+    await state.set(_key(user_id), context, ttl=COACH_CONTEXT_TTL)
+    # A write that committed after the queries above found no snapshot to patch.
+    # If one happened since the build started, drop ours; a write after this check
+    # patches the snapshot just stored.
+    if await state.get(_writes_key(user_id)) != written:
+        await state.delete(_key(user_id))
+    return context
+
+
+async def _patch(user_id: str, fn) -> None:
+    """
+    Applies `fn` to a cached snapshot. Without one there is nothing to patch: the
+    next read builds it from the database, which already has the change, and a
+    rebuild already running sees the write marker and discards its result.
+    Concurrent patches from two workers are last-writer-wins; the TTL bounds the drift.
+    """
+    state = get_state()
+    await state.set(_writes_key(user_id), uuid.uuid4().hex, ttl=COACH_CONTEXT_TTL)
+    context = await state.get(_key(user_id))
+    if context is None or context.get("version") != VERSION:
+        return
+    fn(context)
+    await state.set(_key(user_id), context, ttl=COACH_CONTEXT_TTL)
+
+
+async def add_goals(user_id: str, goals: List[Any]) -> None:
+    new = [_item(g, GOAL_FIELDS) for g in goals]
+    await _patch(user_id, lambda c: c.update(goals=_merge(c["goals"], new)))
+
+
+async def add_milestones(user_id: str, milestones: List[Any]) -> None:
+    new = [_item(m, MILESTONE_FIELDS) for m in milestones]
+    await _patch(user_id, lambda c: c.update(milestones=_merge(c["milestones"], new)))
+
+
+async def add_diary_entries(user_id: str, entries: List[Any], load: models.TrainingLoad) -> None:
+    new = [_item(e, DIARY_FIELDS) for e in entries]
+    await _patch(user_id, lambda c: c.update(diary=_merge(c["diary"], new), load=_load(load)))
+
+
+async def update_load(user_id: str, load: models.TrainingLoad) -> None:
+    """After health ingest (or anything else that only moves the training-load aggregates)."""
+    await _patch(user_id, lambda c: c.update(load=_load(load)))
+
+
+def summary(context: Dict[str, Any]) -> Dict[str, Any]:
+    """Readiness as of today from the cached training-load fields (no database access)."""
+    load = context.get("load")
+    return training_load.summary(models.TrainingLoad(**load) if load else None)
+
+
+def prompt_snippet(context: Dict[str, Any]) -> str:
+    """A few short lines for LLM prompts."""
+    lines = []
+    if context["goals"]:
+        lines.append("Goals: " + "; ".join(
+            g["title"] + (f" (by {g['target_date']})" if g.get("target_date") else "") for g in context["goals"]
+        ))
+    if context["milestones"]:
+        lines.append("Recent milestones: " + "; ".join(m["note"] for m in context["milestones"]))
+    if context["diary"]:
+        lines.append("Recent diary: " + "; ".join(
+            ", ".join(filter(None, (
+                e["created_at"][:10],
+                e.get("mood"),
+                f"fatigue {e['fatigue']}/10" if e.get("fatigue") is not None else None,
+                f"slept {e['sleep_hours']}h" if e.get("sleep_hours") is not None else None,
+            ))) for e in context["diary"]
+        ))
+    lines.append(training_load.prompt_snippet(summary(context)))
+    load = context.get("load") or {}
+    if load.get("last_workout_at"):
+        lines.append(
+            f"Last recorded workout: {load['last_workout_type']} on {load['last_workout_at'][:10]}, "
+            f"{load['last_workout_minutes']} min"
+        )
+    return "\n".join(lines)
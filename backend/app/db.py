@@ -1,9 +1,103 @@
-
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import DateTime, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.sql.functions import now
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./coach.db")
+
+# sync driver -> async driver used when ASYNC_DATABASE_URL is not given
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def _async_url(url: str) -> str:
+    u = make_url(url)
+    return u.set(drivername=ASYNC_DRIVERS.get(u.drivername, u.drivername)).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(SQLALCHEMY_DATABASE_URL))
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+
+def _engine_kwargs() -> dict:
+    if IS_SQLITE:
+        return {"connect_args": {"check_same_thread": False}}
+    # connection pool settings for server databases (Postgres)
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./coach.db"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside a writer; NORMAL sync is safe under WAL
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA cache_size=-16000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+@compiles(now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    # SQLite keeps DateTime as text: stamp server defaults in the format SQLAlchemy
+    # writes ('YYYY-MM-DD HH:MM:SS.ffffff') so (created_at, id) keyset cursors compare
+    # rows from either source correctly; CURRENT_TIMESTAMP would drop the fraction
+    return "(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')"
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs())
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs())
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+
+
+def init_db() -> None:
+    """
+    Creates missing tables, then adds columns and indexes that were introduced
+    after a table already existed (create_all leaves existing tables alone).
+    """
+    from sqlalchemy import inspect, text
+
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None and isinstance(column.server_default.arg, str):
+                    ddl += f" {'NOT NULL ' if not column.nullable else ''}DEFAULT '{column.server_default.arg}'"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            if IS_SQLITE:
+                # rows stamped by an older CURRENT_TIMESTAMP default lack the fraction
+                for column in table.columns:
+                    if isinstance(column.type, DateTime):
+                        conn.execute(text(
+                            f"UPDATE {table.name} SET {column.name} = {column.name} || '.000000' "
+                            f"WHERE length({column.name}) = 19"
+                        ))
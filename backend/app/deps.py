@@ -0,0 +1,19 @@
+from typing import Optional
+from fastapi import Header, HTTPException
+from .db import AsyncSessionLocal
+
+# No auth yet: clients identify themselves with X-User-Id
+DEFAULT_USER_ID = "default"
+
+def get_user_id(x_user_id: Optional[str] = Header(None, max_length=64)) -> str:
+    return x_user_id or DEFAULT_USER_ID
+
+def require_user_id(x_user_id: Optional[str] = Header(None, max_length=64)) -> str:
+    # for per-user live state, where falling back to "default" would mix users
+    if not x_user_id or x_user_id == DEFAULT_USER_ID:
+        raise HTTPException(status_code=400, detail="X-User-Id header required")
+    return x_user_id
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,320 @@
+import json
+import math
+import os
+import time
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .metrics import registry
+from .state import get_state
+
+load_dotenv()
+
+# Span of the live aggregates, in seconds
+HR_WINDOW_S = int(os.getenv("HR_WINDOW_S", "300"))
+# How often a stream's snapshot is published to the shared state and pushed back on /ws/hr
+HR_PUBLISH_S = float(os.getenv("HR_PUBLISH_S", "5"))
+# Max heart rate for zones when the client sends neither ?max_hr= nor ?age=
+HR_MAX_DEFAULT = int(os.getenv("HR_MAX_DEFAULT", "190"))
+
+# Zone n starts at ZONE_BOUNDS[n-1] of max HR; below 50% is zone 0
+ZONE_BOUNDS = (0.5, 0.6, 0.7, 0.8, 0.9)
+# Gaps longer than this (a dropped BLE link) don't count as time in zone
+MAX_GAP_MS = 5000
+# Plausible heart rates and beat-to-beat intervals (30-200 bpm); anything else is a sensor artifact
+HR_MIN, HR_MAX = 20, 250
+RR_MIN_MS, RR_MAX_MS = 300, 2000
+# Client clocks may run this far ahead of the server; later samples would expire the whole window
+MAX_CLOCK_SKEW_MS = 5000
+# Windows with no samples for this long are dropped from the worker
+IDLE_MS = 2 * HR_WINDOW_S * 1000
+
+samples_total = registry.counter("coach_hr_samples_total", "Heart-rate samples received")
+
+
+class _Ring:
+    """FIFO over a typed array: 1-8 bytes per item instead of a Python object."""
+
+    __slots__ = ("_data", "_head", "_len")
+
+    def __init__(self, typecode: str, capacity: int = 64):
+        self._data = array(typecode, [0]) * capacity
+        self._head = 0
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += self._len
+        return self._data[(self._head + i) % len(self._data)]
+
+    def append(self, value) -> None:
+        size = len(self._data)
+        if self._len == size:
+            # full: unroll in order and double the capacity
+            self._data = self._data[self._head:] + self._data[:self._head] + array(self._data.typecode, [0]) * size
+            self._head = 0
+            size *= 2
+        self._data[(self._head + self._len) % size] = value
+        self._len += 1
+
+    def popleft(self):
+        value = self._data[self._head]
+        self._head = (self._head + 1) % len(self._data)
+        self._len -= 1
+        return value
+
+    def pop(self):
+        self._len -= 1
+        return self._data[(self._head + self._len) % len(self._data)]
+
+
+def _reading(value: Any, low: float, high: float) -> Optional[int]:
+    """`value` as an int if it is a finite number in [low, high], else None."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    # NaN fails both comparisons, +-inf is out of range
+    return int(number) if low <= number <= high else None
+
+
+def max_hr_for(max_hr: Optional[int] = None, age: Optional[int] = None) -> int:
+    if max_hr:
+        return max_hr
+    if age:
+        return round(208 - 0.7 * age)  # Tanaka et al.
+    return HR_MAX_DEFAULT
+
+
+class HeartRateWindow:
+    """
+    Mean, peak, time in zone and RMSSD over the last `seconds`, each kept up to
+    date in amortised O(1) per sample: integer running sums for mean, zones and
+    RMSSD, and a monotonic queue of indices for the peak. Times are epoch ms.
+    """
+
+    def __init__(self, seconds: float = HR_WINDOW_S, max_hr: int = HR_MAX_DEFAULT):
+        self.window_ms = int(seconds * 1000)
+        self.max_hr = max_hr
+        self._thresholds = [b * max_hr for b in ZONE_BOUNDS]
+        self._t = _Ring("q")
+        self._hr = _Ring("B")
+        self._first = 0  # absolute index of the oldest HR sample still in the window
+        self._peak = _Ring("q")  # absolute indices with decreasing HR
+        self._hr_sum = 0
+        self._zone_ms = [0] * (len(ZONE_BOUNDS) + 1)
+        self._rr_t = _Ring("q")
+        self._rr = _Ring("H")
+        self._sq_sum = 0  # sum of squared successive RR differences
+        self.last_ms = 0
+        self.touched = 0.0  # server time of the last write, for the idle sweep
+
+    def __len__(self) -> int:
+        return len(self._t)
+
+    def zone(self, hr: int) -> int:
+        return bisect_right(self._thresholds, hr)
+
+    def stale(self, t_ms: int) -> bool:
+        """Older than the window: it would expire as soon as it was added."""
+        return t_ms <= self.last_ms - self.window_ms
+
+    def add_hr(self, t_ms: int, hr: int) -> bool:
+        if not HR_MIN <= hr <= HR_MAX or self.stale(t_ms) or (self._t and t_ms < self._t[-1]):
+            return False
+        if self._t:
+            # the time since the previous sample counts towards that sample's zone
+            self._zone_ms[self.zone(self._hr[-1])] += min(t_ms - self._t[-1], MAX_GAP_MS)
+        while self._peak and self._hr[self._peak[-1] - self._first] <= hr:
+            self._peak.pop()
+        self._peak.append(self._first + len(self._t))
+        self._t.append(t_ms)
+        self._hr.append(hr)
+        self._hr_sum += hr
+        self._expire(t_ms)
+        return True
+
+    def add_rr(self, t_ms: int, rr_ms: int) -> bool:
+        if not RR_MIN_MS <= rr_ms <= RR_MAX_MS or self.stale(t_ms) or (self._rr_t and t_ms < self._rr_t[-1]):
+            return False
+        if self._rr:
+            d = rr_ms - self._rr[-1]
+            self._sq_sum += d * d
+        self._rr_t.append(t_ms)
+        self._rr.append(rr_ms)
+        self._expire(t_ms)
+        return True
+
+    def _expire(self, now_ms: int) -> None:
+        self.last_ms = max(self.last_ms, now_ms)
+        cutoff = self.last_ms - self.window_ms
+        while self._t and self._t[0] <= cutoff:
+            # a sample only holds zone time once the next one has arrived
+            if len(self._t) > 1:
+                self._zone_ms[self.zone(self._hr[0])] -= min(self._t[1] - self._t[0], MAX_GAP_MS)
+            self._hr_sum -= self._hr[0]
+            self._t.popleft()
+            self._hr.popleft()
+            if self._peak[0] == self._first:
+                self._peak.popleft()
+            self._first += 1
+        while self._rr_t and self._rr_t[0] <= cutoff:
+            if len(self._rr) > 1:
+                d = self._rr[1] - self._rr[0]
+                self._sq_sum -= d * d
+            self._rr_t.popleft()
+            self._rr.popleft()
+
+    def ingest(self, sample: Dict[str, Any], now_ms: Optional[int] = None) -> int:
+        """
+        {"t": <epoch ms>, "hr": 142, "rr": [812, 790]}; `t` defaults to arrival time.
+        Samples stamped more than MAX_CLOCK_SKEW_MS in the future are rejected, as
+        are non-numeric or implausible hr and rr values.
+        """
+        arrival = now_ms or int(time.time() * 1000)
+        t_ms = arrival if sample.get("t") is None else _reading(sample["t"], 1, arrival + MAX_CLOCK_SKEW_MS)
+        if t_ms is None:
+            return 0
+        accepted = 0
+        hr = _reading(sample.get("hr"), HR_MIN, HR_MAX)
+        if hr is not None:
+            accepted += self.add_hr(t_ms, hr)
+        for value in sample.get("rr") or ():
+            rr = _reading(value, RR_MIN_MS, RR_MAX_MS)
+            if rr is not None:
+                accepted += self.add_rr(t_ms, rr)
+        return accepted
+
+    def ingest_lines(self, lines: Iterable[bytes]) -> int:
+        """NDJSON lines; malformed ones are skipped."""
+        accepted = 0
+        self.touched = time.time()
+        now_ms = int(self.touched * 1000)
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                accepted += self.ingest(json.loads(line), now_ms)
+            except (ValueError, TypeError, AttributeError):
+                continue
+        samples_total.inc(accepted)
+        return accepted
+
+    def snapshot(self) -> Dict[str, Any]:
+        n = len(self._t)
+        pairs = len(self._rr) - 1
+        return {
+            "hr": self._hr[-1] if n else None,
+            "mean_hr": round(self._hr_sum / n, 1) if n else None,
+            "peak_hr": self._hr[self._peak[0] - self._first] if n else None,
+            "zone": self.zone(self._hr[-1]) if n else None,
+            "zone_seconds": [round(ms / 1000, 1) for ms in self._zone_ms],
+            "rmssd_ms": round(math.sqrt(self._sq_sum / pairs), 1) if pairs > 0 else None,
+            "samples": n,
+            "window_s": self.window_ms // 1000,
+            "max_hr": self.max_hr,
+            "updated_at": self.last_ms,
+        }
+
+
+# Per-worker windows by user: a stream and the NDJSON batches of one user share one
+_windows: Dict[str, HeartRateWindow] = {}
+_streams = 0
+_last_sweep = 0.0
+
+registry.gauge("coach_hr_streams_active", "Open /ws/hr streams in this worker", lambda: _streams)
+registry.gauge("coach_hr_windows", "Live heart-rate windows in this worker", lambda: len(_windows))
+
+
+def get_window(user_id: str, max_hr: int = HR_MAX_DEFAULT) -> HeartRateWindow:
+    global _last_sweep
+    now = time.time()
+    if now - _last_sweep > 60:
+        _last_sweep = now
+        # by server time: `last_ms` follows the client's clock
+        for key in [k for k, w in _windows.items() if (now - w.touched) * 1000 > IDLE_MS]:
+            del _windows[key]
+    window = _windows.get(user_id)
+    if window is None:
+        window = _windows[user_id] = HeartRateWindow(max_hr=max_hr)
+        window.last_ms = int(now * 1000)
+    window.touched = now
+    return window
+
+
+async def publish(user_id: str, window: HeartRateWindow) -> Dict[str, Any]:
+    """Snapshot to the shared state so feedback generators on any worker can read it."""
+    snapshot = window.snapshot()
+    await get_state().set(f"hr:{user_id}", snapshot, ttl=HR_WINDOW_S)
+    return snapshot
+
+
+async def live_snapshot(user_id: str) -> Optional[Dict[str, Any]]:
+    window = _windows.get(user_id)
+    if window is not None and len(window):
+        return window.snapshot()
+    return await get_state().get(f"hr:{user_id}")
+
+
+def prompt_snippet(snapshot: Optional[Dict[str, Any]]) -> str:
+    """One-line summary for LLM prompts; empty when there is no recent data."""
+    if not snapshot or not snapshot.get("samples"):
+        return ""
+    zones = snapshot["zone_seconds"]
+    total = sum(zones) or 1
+    busiest = max(range(len(zones)), key=zones.__getitem__)
+    text = (
+        f"Heart rate now {snapshot['hr']} bpm (zone {snapshot['zone']}), "
+        f"last {snapshot['window_s'] // 60} min mean {snapshot['mean_hr']} / peak {snapshot['peak_hr']} bpm, "
+        f"{round(100 * zones[busiest] / total)}% of the time in zone {busiest}"
+    )
+    if snapshot.get("rmssd_ms") is not None:
+        text += f", HRV (RMSSD) {snapshot['rmssd_ms']} ms"
+    return text
+
+
+async def stream(websocket: WebSocket, user_id: str) -> None:
+    """
+    /ws/hr: each frame carries one or more NDJSON samples (binary frames as
+    UTF-8, undecodable ones are skipped). Every
+    HR_PUBLISH_S the snapshot is published and sent back to the client.
+    `user_id` must identify the user: windows are keyed by it.
+    """
+    global _streams
+    params = websocket.query_params
+    try:
+        max_hr = max_hr_for(int(params.get("max_hr") or 0), int(params.get("age") or 0))
+    except ValueError:
+        max_hr = HR_MAX_DEFAULT
+    await websocket.accept()
+    window = get_window(user_id, max_hr)
+    _streams += 1
+    sent = 0.0  # the first frame of a connection always gets a snapshot back
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                lines = message["text"].splitlines()
+            else:
+                lines = (message.get("bytes") or b"").splitlines()
+            window.ingest_lines(lines)
+            if time.time() - sent >= HR_PUBLISH_S:
+                sent = time.time()
+                await websocket.send_json(await publish(user_id, window))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _streams -= 1
+        if len(window):
+            await publish(user_id, window)
@@ -1,22 +1,52 @@
 
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from .routers import elevenlabs, suggestions, diary
-from .opencv.opencv import procesar_frame, text_to_text_ollama, text_to_speech
-import cv2
+from .routers import elevenlabs, suggestions, diary, analytics, sessions, heart_rate as heart_rate_router
+from . import coach_context, heart_rate, serialization, voice_relay, workout_sessions
+from .db import init_db
+from .services import services
+from . import metrics
+from .metrics import timer
+from .opencv.session_replay import SessionRecorder
+from .state import SESSION_TTL, close_state, get_state
+from .deps import DEFAULT_USER_ID
+from .admission import Rejected, client_key, llm_calls, pose_sessions, reject_websocket, video_bucket, websocket_user
+import asyncio
 import json
 import random
-import aiohttp
-import asyncio
 import time
-
-ELEVENLABS_WS_URL = "wss://api.elevenlabs.io/v1/stream"
+import uuid
 
 load_dotenv()
 
-app = FastAPI(title="AI Sports Coach Backend")
+# Heavy services load on first use; set PRELOAD_POSE=1 on workers dedicated to video
+PRELOAD_POSE = os.getenv("PRELOAD_POSE", "0") == "1"
+# /ws/video history is written to the shared state in batches, not per frame
+HISTORY_FLUSH_S = 1.0
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # tables, plus columns/indexes added since a table was created (see db.init_db)
+    init_db()
+    if PRELOAD_POSE:
+        from .opencv import opencv  # noqa: F401
+        services.get("pose")
+    yield
+    await voice_relay.close_session()
+    await close_state()
+    services.close()
+
+
+app = FastAPI(
+    title="AI Sports Coach Backend",
+    lifespan=lifespan,
+    default_response_class=serialization.JSONResponseClass,
+)
 
 allowed = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
 app.add_middleware(
@@ -26,86 +56,191 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip (brotli when installed) for bodies over COMPRESS_MIN_BYTES
+app.add_middleware(serialization.CompressionMiddleware)
 
 app.include_router(elevenlabs.router)
 app.include_router(suggestions.router)
 app.include_router(diary.router)
+app.include_router(analytics.router)
+app.include_router(heart_rate_router.router)
+app.include_router(sessions.router)
 
 @app.get("/api/health")
 def health():
     return {"ok": True}
 
 
+metrics.registry.gauge("coach_voice_relays_active", "Open /ws/voice relays", lambda: len(voice_relay._active))
+metrics.registry.gauge("coach_services_loaded", "Lazily built services currently loaded", lambda: len(services.loaded()))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/voice/stats")
+def voice_stats():
+    return voice_relay.relay_stats()
+
+
 @app.websocket("/ws/voice")
 async def voice_chat(websocket: WebSocket):
     await websocket.accept()
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.ws_connect(ELEVENLABS_WS_URL, headers={
-            "xi-api-key": "TU_API_KEY"
-        }) as eleven_ws:
+    await voice_relay.VoiceRelay(websocket).run()
 
-            async def forward_to_eleven():
-                while True:
-                    audio_chunk = await websocket.receive_bytes()
-                    await eleven_ws.send_bytes(audio_chunk)
 
-            async def forward_to_client():
-                async for msg in eleven_ws:
-                    if msg.type == aiohttp.WSMsgType.BINARY:
-                        await websocket.send_bytes(msg.data)
-                    elif msg.type == aiohttp.WSMsgType.TEXT:
-                        await websocket.send_text(msg.data)
-
-            # Ejecutar envío y recepción en paralelo
-            await asyncio.gather(forward_to_eleven(), forward_to_client())
+@app.websocket("/ws/hr")
+async def heart_rate_stream(websocket: WebSocket):
+    # BLE heart-rate samples as NDJSON text (or UTF-8 binary) frames; see heart_rate.stream
+    user_id = websocket_user(websocket)
+    if user_id == DEFAULT_USER_ID:
+        # windows are per user: anonymous streams would all land in "default"
+        await websocket.accept()
+        await websocket.close(code=1008, reason="X-User-Id header or ?user= required")
+        return
+    await heart_rate.stream(websocket, user_id)
 
 
 @app.websocket("/ws/video")
 async def websocket_video(websocket: WebSocket):
+    # Admision antes de aceptar: limite por cliente y sesiones de pose por worker;
+    # si no hay lugar se cierra con 1013 en vez de dejar que todo se degrade
+    try:
+        if video_bucket is not None:
+            await video_bucket.take(client_key(websocket))
+        await pose_sessions.acquire()
+    except Rejected as e:
+        await reject_websocket(websocket, e)
+        return
+    try:
+        await _video_session(websocket)
+    finally:
+        pose_sessions.release()
+
+
+def _tts_bytes(text_to_speech, texto: str) -> bytes:
+    audio = text_to_speech(datos=texto)
+    if not isinstance(audio, (bytes, bytearray)):
+        audio = b"".join(audio)
+    return audio
+
+
+async def _video_session(websocket: WebSocket):
+    # MediaPipe/cv2 se importan solo en los procesos que reciben video
+    from .opencv.opencv import procesar_frame, text_to_text_ollama, text_to_speech
+    from .opencv.profiles import perfil_ejercicio
+    from .opencv.tracking import POSE_TRACKING, PoseTracker
+
     await websocket.accept()
 
-    ejercicio = None
-    history = []
-    start_time = time.time()
+    # Estado de la sesion en el backend compartido (STATE_BACKEND_URL): al reconectar
+    # con ?session=<id>, incluso a otro worker, se retoman ejercicio, inicio e historial.
+    # El primer mensaje lleva el id ({"session": id}); la clave incluye al usuario,
+    # asi un id ajeno no retoma la sesion de otro
+    state = get_state()
+    usuario = websocket_user(websocket)
+    session_id = websocket.query_params.get("session") or uuid.uuid4().hex
+    session_key = f"ws_video:{usuario}:{session_id}"
+    await websocket.send_json({"session": session_id})
+    sesion = await state.get(session_key)
+    if sesion is None:
+        sesion = {"ejercicio": None, "start_time": time.time()}
+        await state.set(session_key, sesion, ttl=SESSION_TTL)
+    ejercicio = sesion["ejercicio"]
+    start_time = sesion["start_time"]
+    history = await state.items(session_key + ":history")
+    pendientes = []
+    ultimo_flush = time.time()
+    terminado = False
+
+    perfil = None
+    tracker = None
+    # WS_RECORD_DIR activa la grabacion de la sesion para reproducirla despues
+    recorder = SessionRecorder.from_env({"path": "/ws/video"})
 
     try:
         while True:
-            mensaje = await websocket.receive_json()
+            texto = await websocket.receive_text()
+            if recorder:
+                recorder.inbound(texto)
+            mensaje = json.loads(texto)
             data = json.loads(mensaje)
 
             if "ejercicio" in data and ejercicio is None:
                 ejercicio = data["ejercicio"]
+                await state.set(session_key, {"ejercicio": ejercicio, "start_time": start_time}, ttl=SESSION_TTL)
 
             if "frame" in data and data["frame"]:
+                # Perfil y seguimiento por sesion: landmarks/angulos del ejercicio,
+                # el modelo corre cada K frames
+                if perfil is None:
+                    perfil = perfil_ejercicio(ejercicio)
+                    if POSE_TRACKING:
+                        tracker = PoseTracker.para_ejercicio(ejercicio)
                 # Procesar frame
-                angulos, simetrias = procesar_frame(data['frame'])
+                with timer("ws_video.frame"):
+                    angulos, simetrias = procesar_frame(data['frame'], tracker, perfil)
 
                 # Guardar en historial
-                history.append({
+                entrada = {
                     "timestamp": time.time(),
                     "angulos": angulos,
                     "simetrias": simetrias
-                })
+                }
+                history.append(entrada)
+                pendientes.append(entrada)
+                if entrada["timestamp"] - ultimo_flush >= HISTORY_FLUSH_S:
+                    await state.append(session_key + ":history", pendientes, ttl=SESSION_TTL)
+                    pendientes, ultimo_flush = [], entrada["timestamp"]
 
             # mantener 15 segundos
             if time.time() - start_time >= 15:
-                # llamada a ollama
-                response = text_to_text_ollama(datos=random.sample(history[5:-6],3), ejercicio=ejercicio)
-                # envio a elevenlabs
-                audio = text_to_speech(datos=response)
+                # pulso en vivo (/ws/hr) y contexto del usuario (objetivos, diario), ya materializados
+                pulso = heart_rate.prompt_snippet(await heart_rate.live_snapshot(usuario))
+                contexto = coach_context.prompt_snippet(await coach_context.get_context(usuario))
+                # llamada a ollama (con cupo en el limite global de LLM); las llamadas
+                # HTTP bloqueantes van a un hilo para no frenar el resto de sockets
+                try:
+                    async with llm_calls.slot():
+                        response = await asyncio.to_thread(
+                            text_to_text_ollama, datos=random.sample(history[5:-6],3), ejercicio=ejercicio, pulso=pulso, contexto=contexto
+                        )
+                except Rejected as e:
+                    terminado = True
+                    await websocket.close(code=1013, reason=f"{e}; retry after {e.retry_after}s")
+                    break
+                # envio a elevenlabs (el SDK devuelve el mp3 en trozos, leidos en el mismo hilo)
+                audio = await asyncio.to_thread(_tts_bytes, text_to_speech, response)
                 
-                # Enviar audio y texto al cliente
-                await websocket.send_json({
-                    "audio": audio,
-                    "texto": response
-                })
+                # Enviar texto y audio al cliente: el JSON anuncia el audio y el
+                # siguiente mensaje lleva el mp3 como frame binario (sin base64)
+                mensaje = {"texto": response, "audio": {"format": "mp3", "bytes": len(audio)}}
+                if recorder:
+                    recorder.outbound(json.dumps(mensaje))
+                with timer("ws_video.send"):
+                    await websocket.send_json(mensaje)
+                    await websocket.send_bytes(bytes(audio))
 
                 # Cerrar conexión WebSocket
+                terminado = True
+                await state.delete(session_key)
+                await state.delete(session_key + ":history")
                 await websocket.close()
                 break
 
     except Exception as e:
         print("WebSocket cerrado:", e)
     finally:
-        cv2.destroyAllWindows()
+        if recorder:
+            recorder.close()
+        # sesion cortada: dejar el historial listo para retomarla
+        if pendientes and not terminado:
+            await state.append(session_key + ":history", pendientes, ttl=SESSION_TTL)
+        # guardar la sesion (flujo compacto + resumen); al retomarla se reescribe la misma fila
+        if history:
+            try:
+                await workout_sessions.save_session(usuario, ejercicio, history, session_id[:64])
+            except Exception as e:
+                print("No se pudo guardar la sesion:", e)
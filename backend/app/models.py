@@ -1,27 +1,122 @@
-
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from .db import Base
 
 class Goal(Base):
     __tablename__ = "goals"
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String(64), nullable=False, server_default="default")
     title = Column(String(200))
     target_date = Column(String(40), nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
+    __table_args__ = (Index("ix_goals_user_created", "user_id", "created_at"),)
 
 class Milestone(Base):
     __tablename__ = "milestones"
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String(64), nullable=False, server_default="default")
     goal_id = Column(Integer, index=True)
     note = Column(Text)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
+    __table_args__ = (Index("ix_milestones_user_created", "user_id", "created_at"),)
 
 class DiaryEntry(Base):
     __tablename__ = "diary_entries"
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String(64), nullable=False, server_default="default")
     note = Column(Text)
     mood = Column(String(32), nullable=True)
     fatigue = Column(Integer, nullable=True)  # 1-10
     sleep_hours = Column(Float, nullable=True)
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
+    __table_args__ = (Index("ix_diary_entries_user_created", "user_id", "created_at"),)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False)
+    key = Column(String(128), nullable=False)
+    response = Column(Text)  # JSON body returned the first time
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),)
+
+class TrainingLoad(Base):
+    """Running aggregates per user, updated incrementally by app.analytics.training_load."""
+    __tablename__ = "training_load"
+    user_id = Column(String(64), primary_key=True)
+    day = Column(Integer, nullable=True)  # date ordinal the load EWMAs are valid for
+    acute_load = Column(Float, default=0.0)
+    chronic_load = Column(Float, default=0.0)
+    fatigue_short = Column(Float, nullable=True)
+    fatigue_long = Column(Float, nullable=True)
+    sleep_short = Column(Float, nullable=True)
+    sleep_long = Column(Float, nullable=True)
+    resting_hr_short = Column(Float, nullable=True)
+    resting_hr_long = Column(Float, nullable=True)
+    vo2_max = Column(Float, nullable=True)
+    # weights behind the wellness means above, decayed to wellness_day (see training_load._smooth)
+    wellness_day = Column(Integer, nullable=True)
+    fatigue_short_w = Column(Float, nullable=True)
+    fatigue_long_w = Column(Float, nullable=True)
+    sleep_short_w = Column(Float, nullable=True)
+    sleep_long_w = Column(Float, nullable=True)
+    resting_hr_short_w = Column(Float, nullable=True)
+    resting_hr_long_w = Column(Float, nullable=True)
+    health_through = Column(Float, nullable=True)  # epoch s of the newest health record/workout applied
+    last_workout_type = Column(String(64), nullable=True)
+    last_workout_at = Column(String(40), nullable=True)  # Apple Health start_date
+    last_workout_minutes = Column(Float, nullable=True)
+    samples = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class WorkoutSession(Base):
+    """One pose session: summary columns for progress queries, the frame stream as a compact blob (app.workout_sessions)."""
+    __tablename__ = "workout_sessions"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False, server_default="default")
+    session_key = Column(String(64), nullable=True)  # /ws/video ?session=, so a resumed session updates its row
+    exercise = Column(String(64), nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    duration_s = Column(Float, default=0.0)
+    frames = Column(Integer, default=0)
+    reps = Column(Integer, nullable=True)
+    rom = Column(Float, nullable=True)  # main angle, degrees
+    symmetry = Column(Float, nullable=True)  # mean tilt from level, degrees
+    main_angle = Column(String(64), nullable=True)
+    stats = Column(Text)  # JSON per-column summary
+    columns = Column(Text)  # JSON column names of the stream
+    features = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
+    __table_args__ = (
+        Index("ix_workout_sessions_user_exercise_started", "user_id", "exercise", "started_at"),
+        Index("ix_workout_sessions_user_created", "user_id", "created_at"),
+        UniqueConstraint("user_id", "session_key", name="uq_workout_sessions_user_key"),
+    )
+
+class UserPreferences(Base):
+    """Where and what a user trains, remembered from /api/suggest/exercises for the nightly plan run (app.plans)."""
+    __tablename__ = "user_preferences"
+    user_id = Column(String(64), primary_key=True)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    city = Column(String(128), nullable=True)
+    sport = Column(String(64), nullable=False, default="running")
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_user_preferences_last_seen", "last_seen_at"),)
+
+class DailyPlan(Base):
+    """A generated plan for one user, day and sport; written by the nightly run or on a live miss."""
+    __tablename__ = "daily_plans"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False)
+    day = Column(String(10), nullable=False)  # ISO date
+    sport = Column(String(64), nullable=False)
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    recommendations = Column(Text)
+    weather = Column(Text)  # JSON
+    events = Column(Text)  # JSON
+    source = Column(String(16), nullable=False)  # "batch" or "live"
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
+    __table_args__ = (UniqueConstraint("user_id", "day", "sport", name="uq_daily_plans_user_day_sport"),)
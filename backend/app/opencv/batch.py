@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+# Procesamiento offline de videos grabados (sin ventana ni camara).
+#
+# Cada video se divide en segmentos de frames que se reparten en un pool de
+# procesos; cada proceso carga su propio modelo de MediaPipe una sola vez.
+# Por video se escribe:
+#   <nombre>.features.npz  frame, t (s) y una matriz float32 con angulos/simetrias
+#   <nombre>.reps.json     resumen por repeticion
+#
+# Uso:
+#   python -m app.opencv.batch ../frontend/public/bicep-curl-video.mp4 -o out/ --workers 4
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .profiles import perfil_ejercicio
+
+VIDEO_EXTS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+
+# ==== WORKER ====
+_pose = None
+
+
+def _init_worker(model_complexity: int) -> None:
+    global _pose
+    import mediapipe as mp
+    _pose = mp.solutions.pose.Pose(static_image_mode=False, model_complexity=model_complexity)
+
+
+def _procesar_segmento(path: str, inicio: int, fin: int, stride: int, ejercicio: str) -> dict:
+    """Decodifica frames [inicio, fin) en streaming y extrae los features del perfil del ejercicio."""
+    perfil = perfil_ejercicio(ejercicio)
+    columnas = perfil.columnas
+    _pose.reset()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"No se pudo abrir el video {path}")
+    cap.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    frames, features = [], []
+    idx = inicio
+    while idx < fin:
+        # grab() sin retrieve() evita decodificar los frames que se saltan
+        if (idx - inicio) % stride:
+            if not cap.grab():
+                break
+            idx += 1
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        fila = np.full(len(columnas), np.nan, dtype=np.float32)
+        results = _pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if results.pose_landmarks:
+            h, w, _ = frame.shape
+            angulos, simetrias = perfil.calcular(perfil.extraer(results), w, h)
+            valores = {**angulos, **simetrias}
+            for j, col in enumerate(columnas):
+                if valores.get(col) is not None:
+                    fila[j] = valores[col]
+        frames.append(idx)
+        features.append(fila)
+        idx += 1
+    cap.release()
+
+    return {
+        "path": path,
+        "inicio": inicio,
+        "frame": np.asarray(frames, dtype=np.int32),
+        "t": np.asarray(frames, dtype=np.float32) / np.float32(fps),
+        "features": np.vstack(features) if features else np.empty((0, len(columnas)), np.float32),
+    }
+
+
+# ==== REPETICIONES ====
+def detectar_repeticiones(t: np.ndarray, features: np.ndarray, ejercicio: str) -> dict:
+    """
+    Cuenta repeticiones con histeresis sobre el angulo principal del ejercicio.
+
+    Una repeticion es un ciclo extendido -> flexionado -> extendido. Los umbrales
+    salen de los percentiles 20/80 de la serie, asi no dependen de la camara.
+    """
+    perfil = perfil_ejercicio(ejercicio)
+    columnas = perfil.columnas
+    # angulo principal del perfil: se usa el lado con mas datos
+    cols = [columnas.index(c) for c in perfil.angulo_reps]
+    col = max(cols, key=lambda c: np.count_nonzero(~np.isnan(features[:, c])))
+    serie = features[:, col]
+    validos = ~np.isnan(serie)
+    if validos.sum() < 10:
+        return {"angulo": columnas[col], "repeticiones": []}
+
+    # rellenar huecos y suavizar (media movil de 5 frames)
+    idx = np.arange(len(serie))
+    serie = np.interp(idx, idx[validos], serie[validos])
+    serie = np.convolve(serie, np.ones(5) / 5, mode='same')
+    bajo, alto = np.percentile(serie, [20, 80])
+    if alto - bajo < 15:
+        return {"angulo": columnas[col], "repeticiones": []}
+
+    sim_col = columnas.index('simetria_hombros')
+
+    def repeticion(inicio: int, fin: int) -> dict:
+        tramo = slice(inicio, fin + 1)
+        simetria = features[tramo, sim_col]
+        return {
+            "inicio_s": round(float(t[inicio]), 2),
+            "fin_s": round(float(t[fin]), 2),
+            "duracion_s": round(float(t[fin] - t[inicio]), 2),
+            "angulo_min": round(float(serie[tramo].min()), 1),
+            "angulo_max": round(float(serie[tramo].max()), 1),
+            "rom": round(float(serie[tramo].max() - serie[tramo].min()), 1),
+            "simetria_hombros": round(float(np.nanmean(simetria)), 1) if np.any(~np.isnan(simetria)) else None,
+        }
+
+    reps = []
+    estado, inicio = None, None
+    for i, valor in enumerate(serie):
+        if valor >= alto:
+            if estado == 'abajo':
+                reps.append(repeticion(inicio, i))
+            # la repeticion empieza al dejar la zona alta
+            estado, inicio = 'arriba', i
+        elif valor <= bajo and estado == 'arriba':
+            estado = 'abajo'
+    return {"angulo": columnas[col], "repeticiones": reps}
+
+
+# ==== PIPELINE ====
+def _listar_videos(entradas: List[str]) -> List[str]:
+    videos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            for nombre in sorted(os.listdir(entrada)):
+                if nombre.lower().endswith(VIDEO_EXTS):
+                    videos.append(os.path.join(entrada, nombre))
+        else:
+            videos.append(entrada)
+    return videos
+
+
+def _segmentos(path: str, frames_por_segmento: int) -> List[tuple]:
+    cap = cv2.VideoCapture(path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total <= 0:
+        # contenedores sin indice: un solo segmento leido hasta el final
+        return [(path, 0, 2 ** 31 - 1)]
+    return [(path, i, min(i + frames_por_segmento, total)) for i in range(0, total, frames_por_segmento)]
+
+
+def _guardar(path: str, partes: List[dict], out_dir: str, ejercicio: str) -> dict:
+    partes.sort(key=lambda p: p["inicio"])
+    frame = np.concatenate([p["frame"] for p in partes])
+    t = np.concatenate([p["t"] for p in partes])
+    features = np.vstack([p["features"] for p in partes])
+
+    base = os.path.splitext(os.path.basename(path))[0]
+    np.savez_compressed(
+        os.path.join(out_dir, f"{base}.features.npz"),
+        frame=frame, t=t, features=features, columnas=np.array(perfil_ejercicio(ejercicio).columnas),
+    )
+    reps = detectar_repeticiones(t, features, ejercicio)
+    resumen = {
+        "video": path,
+        "ejercicio": ejercicio,
+        "frames": int(len(frame)),
+        "frames_con_pose": int(np.count_nonzero(~np.all(np.isnan(features), axis=1))),
+        "duracion_s": round(float(t[-1]), 2) if len(t) else 0.0,
+        **reps,
+    }
+    with open(os.path.join(out_dir, f"{base}.reps.json"), 'w') as archivo:
+        json.dump(resumen, archivo)
+    return resumen
+
+
+def process_videos(
+    entradas: List[str],
+    out_dir: str,
+    workers: Optional[int] = None,
+    ejercicio: str = "curl biceps",
+    frames_por_segmento: int = 600,
+    stride: int = 1,
+    model_complexity: int = 1,
+) -> List[dict]:
+    """
+    Procesa videos en paralelo y devuelve el resumen de cada uno. Un video que
+    falla (ilegible, corrupto) no corta el lote: su resumen es {"video", "error"}.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    videos = _listar_videos(entradas)
+    tareas = [seg for v in videos for seg in _segmentos(v, frames_por_segmento)]
+    partes: Dict[str, List[dict]] = {v: [] for v in videos}
+    pendientes = {v: sum(1 for s in tareas if s[0] == v) for v in videos}
+    resumenes = []
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_complexity,)) as pool:
+        futures = {
+            pool.submit(_procesar_segmento, path, inicio, fin, stride, ejercicio): path
+            for path, inicio, fin in tareas
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            if path not in partes:
+                continue  # otro segmento del video ya fallo
+            try:
+                partes[path].append(future.result())
+                pendientes[path] -= 1
+                # escribir cada video apenas termina, sin esperar al resto del lote
+                if pendientes[path] == 0:
+                    resumenes.append(_guardar(path, partes.pop(path), out_dir, ejercicio))
+            except Exception as e:
+                partes.pop(path, None)
+                resumenes.append({"video": path, "error": f"{type(e).__name__}: {e}"})
+    return resumenes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analisis de pose offline para videos grabados')
+    parser.add_argument('entradas', nargs='+', help='Videos o directorios con videos')
+    parser.add_argument('-o', '--output', default='pose_features', help='Directorio de salida')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Procesos (por defecto: CPUs)')
+    parser.add_argument('-e', '--ejercicio', default='curl biceps')
+    parser.add_argument('--segment-frames', type=int, default=600, help='Frames por tarea')
+    parser.add_argument('--stride', type=int, default=1, help='Procesar 1 de cada N frames')
+    parser.add_argument('--model-complexity', type=int, default=1, choices=[0, 1, 2])
+    args = parser.parse_args()
+
+    inicio = time.time()
+    resumenes = process_videos(
+        args.entradas, args.output, workers=args.workers, ejercicio=args.ejercicio,
+        frames_por_segmento=args.segment_frames, stride=args.stride, model_complexity=args.model_complexity,
+    )
+    total = time.time() - inicio
+    duracion = sum(r["duracion_s"] for r in resumenes if "error" not in r)
+    for r in resumenes:
+        if "error" in r:
+            print(f"❌ {r['video']}: {r['error']}")
+        else:
+            print(f"✅ {r['video']}: {r['frames']} frames, {len(r['repeticiones'])} repeticiones")
+    if total > 0:
+        print(f"⏱️  {total:.1f}s para {duracion:.1f}s de video ({duracion / total:.1f}x tiempo real)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,16 @@
-from elevenlabs import ElevenLabs, play
-import os
-from dotenv import load_dotenv
+from ..services import services
+from ..metrics import timed
 
 # ==== ELEVENLABS CLIENT ====
-load_dotenv()
-ELEVEN_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-eleven_client = ElevenLabs(api_key=ELEVEN_API_KEY)
+# el cliente se crea en la primera llamada (services.get("tts"))
 
+@timed("tts.elevenlabs")
 def text_to_speech(datos:str):
     """
     Envía las coordenadas del cuerpo en formato JSON como texto al agente.
     """
     texto = datos
-    audio = eleven_client.text_to_speech.convert(
+    audio = services.get("tts").text_to_speech.convert(
         voice_id="21m00Tcm4TlvDq8ikWAM",
         model_id="eleven_multilingual_v2",
         text=texto
@@ -20,6 +18,8 @@ def text_to_speech(datos:str):
     return audio
 
 if __name__ == "__main__":
+    # python -m app.opencv.elevenlabs_connection
+    from elevenlabs import play
     # Ejemplo de uso
     texto = "Hola, este es un ejemplo de texto a voz."
     audio = text_to_speech(texto)
@@ -1,11 +1,13 @@
 import requests
 from dotenv import load_dotenv
 import os   
+from ..metrics import timed
 
 load_dotenv()   
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 # ==== GROQ ====
+@timed("llm.groq")
 def text_to_text_groq(datos, ejercicio):
     """
     Usa Groq con Llama
@@ -1,17 +1,14 @@
 import requests
-import subprocess
-import os   
-
-process = subprocess.Popen(
-    ['ollama','run','llama2'], 
-    stdout=subprocess.PIPE, 
-    stderr=subprocess.PIPE
-)
+from ..services import services
+from ..metrics import timed
 
 # === OLLAMA (local) ====
-def text_to_text_ollama(datos, ejercicio):
+@timed("llm.ollama")
+def text_to_text_ollama(datos, ejercicio, pulso="", contexto=""):
     """
-    Usa Ollama para generar texto de acuerdo al prompt
+    Usa Ollama para generar texto de acuerdo al prompt; `pulso` es el resumen
+    del ritmo cardiaco en vivo (heart_rate.prompt_snippet) y `contexto` el del
+    usuario (coach_context.prompt_snippet), si los hay
     """
     try:
         # Crear resumen de datos
@@ -19,10 +16,17 @@ def text_to_text_ollama(datos, ejercicio):
             return "No hay datos suficientes para analizar."
         
         
+        # levanta `ollama run llama2` la primera vez que se usa
+        services.get("ollama")
+
         # Crear prompt específico
         prompt = f"""
 You are a professional sports trainer. Analyze the following exercise {ejercicio} using next data and give concise, clear feedback in English, maximum 50 words, in a motivating and professional tone. Data:{datos}
 """
+        if pulso:
+            prompt += f"{pulso}. Adjust the intensity advice to it.\n"
+        if contexto:
+            prompt += f"About the athlete:\n{contexto}\n"
 
         # Llamada a Ollama (local)
         response = requests.post(
@@ -53,6 +57,7 @@ You are a professional sports trainer. Analyze the following exercise {ejercicio
     
 
 if __name__ == "__main__":
+    # python -m app.opencv.ollama_connection
     # Test the Ollama connection
     test_data = {
         "angle": 45,
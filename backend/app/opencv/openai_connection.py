@@ -1,24 +1,19 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os   
+from ..services import services
+from ..metrics import timed
 
-
-load_dotenv()
-OPEN_API_KEY = os.getenv("OPENAI_API_KEY")
 # # ==== OPENAI CLIENT ====
-openai_client = OpenAI(
-  api_key=OPEN_API_KEY
-)
+# cliente compartido, se crea en la primera llamada (services.get("openai"))
 
 
 # === OPENAI GPT-4o ====
+@timed("llm.openai")
 def text_to_text_gpt(datos, ejercicio):
     """
     Transforma texto a texto usando OpenAI GPT-4o
     """
     
     try:
-        response = openai_client.chat.completions.create(
+        response = services.get("openai").chat.completions.create(
             model="gpt-5-nano",
             messages=[
                 {"role": "system", "content": "You are a professional sports trainer."},
@@ -1,24 +1,22 @@
 import cv2
 import mediapipe as mp
-import json
 import time
 import random
 import numpy as np
 import base64
-from datetime import datetime
-from elevenlabs import play
-from tools import calcular_angulos_corporales
-from elevenlabs_connection import text_to_speech
-from ollama_connection import text_to_text_ollama
-
-# mediapipe setup
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose()
+from .profiles import ExerciseProfile, perfil_ejercicio
+from .tracking import PoseTracker
+from .elevenlabs_connection import text_to_speech
+from .ollama_connection import text_to_text_ollama
+from ..services import services
+from ..metrics import timer
+from ..db import SessionLocal, init_db
+from ..deps import DEFAULT_USER_ID
+from ..workout_sessions import build_session
 
 # ==== CONFIGURACIÓN MEDIAPIPE ====
+# el modelo Pose se crea en el primer frame (services.get("pose")), no al importar
 mp_pose = mp.solutions.pose
-pose = mp_pose.Pose()
 mp_drawing = mp.solutions.drawing_utils
 start_time = time.time()
 
@@ -26,10 +24,6 @@ start_time = time.time()
 pausado = False
 grabando = True
 history = []
-posx = [
-    'RIGHT_SHOULDER', 'RIGHT_ELBOW', 'RIGHT_WRIST','RIGHT_HIP',
-    'LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST','LEFT_HIP'
-]
 
 # === configuraciones de ventana opcionales ===
 def mostrar_controles(frame):
@@ -77,52 +71,61 @@ def mostrar_estado(frame):
 
 
 # === Guardar historial ===
-def guardar_historial():
+def guardar_historial(ejercicio: str = "curl biceps", user_id: str = DEFAULT_USER_ID):
     """
-    Guarda el historial en un archivo JSON.
+    Guarda el historial como sesion de entrenamiento en la base de datos (flujo
+    binario compacto + resumen, ver workout_sessions), igual que /ws/video.
     """
     if not history:
         print("📭 No hay datos para guardar")
         return
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    nombre_archivo = f"coordenadas_{timestamp}.json"
-    
     try:
-        with open(nombre_archivo, 'w') as archivo:
-            json.dump(history, archivo, indent=2)
-        print(f"✅ Historial guardado en: {nombre_archivo}")
+        init_db()
+        sesion = build_session(user_id, ejercicio, history)
+        with SessionLocal() as db:
+            db.add(sesion)
+            db.commit()
+            print(f"✅ Sesion #{sesion.id} guardada ({len(sesion.features)} bytes, {sesion.frames} frames)")
     except Exception as e:
         print(f"❌ Error guardando: {e}")
 
 
-def procesar_frame(frame_b64):
+def procesar_frame(frame_b64, tracker: PoseTracker = None, perfil: ExerciseProfile = None):
+    """
+    Angulos y simetrias de un frame en base64 segun el perfil del ejercicio.
+
+    Con `tracker` el modelo solo corre cada tracker.k frames: en los demas no se
+    decodifica la imagen y los landmarks salen de la prediccion suavizada. El
+    tracker debe venir de PoseTracker.para_ejercicio con el mismo ejercicio.
+    """
+    perfil = perfil or perfil_ejercicio(None)
+    ahora = time.monotonic()
+    if tracker is not None and not tracker.next_frame():
+        with timer("pose.track"):
+            puntos = tracker.predict(ahora)
+            w, h = tracker.size
+            return perfil.calcular(puntos, w, h)
+
     # Convertir a RGB para MediaPipe
-    img_data = base64.b64decode(frame_b64.split(",")[1])
-    np_arr = np.frombuffer(img_data, np.uint8)
-    frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = pose.process(rgb_frame)
-    
-    posiciones = {}
-
-    if results.pose_landmarks:
-        h, w, _ = frame.shape
-        for i, lm in enumerate(results.pose_landmarks.landmark):
-            if lm.visibility < 0.5:
-                continue
-            if mp_pose.PoseLandmark(i).name not in posx:
-                continue
-            posiciones[mp_pose.PoseLandmark(i).name] = {
-                "x": round(lm.x * w, 2),
-                "y": round(lm.y * h, 2),
-                "z": round(lm.z, 4),
-                "visibility": round(lm.visibility, 4),
-                "timestamp": time.time()
-            }
-
-        angulos, simetrias = calcular_angulos_corporales(posiciones)
-        return angulos, simetrias
+    with timer("frame.b64decode"):
+        img_data = base64.b64decode(frame_b64.split(",")[1])
+    with timer("frame.imdecode"):
+        np_arr = np.frombuffer(img_data, np.uint8)
+        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    with timer("pose.process"):
+        results = services.get("pose").process(rgb_frame)
+
+    h, w, _ = frame.shape
+    puntos = perfil.extraer(results)
+    if tracker is not None:
+        # sin deteccion el tracker rellena los huecos cortos con confianza decreciente
+        puntos = tracker.update(puntos, ahora, (w, h))
+
+    if puntos is not None:
+        with timer("pose.angulos"):
+            return perfil.calcular(puntos, w, h)
     return {}, {}
 
 
@@ -136,6 +139,7 @@ def run_opencv_process(ejercicio:str="curl biceps"):
 
     start_point = time.time()
     time_interval = 0.5
+    perfil = perfil_ejercicio(ejercicio)
 
     while cap.isOpened():
         ret, frame = cap.read()
@@ -166,32 +170,15 @@ def run_opencv_process(ejercicio:str="curl biceps"):
         if not pausado:
             # Convertir a RGB para MediaPipe
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(rgb_frame)
+            results = services.get("pose").process(rgb_frame)
             # results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
 
             if results.pose_landmarks:
                 mp_drawing.draw_landmarks(frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
 
-                # Extraer todas las posiciones en un diccionario
+                # Calcular ángulos del perfil del ejercicio
                 h, w, _ = frame.shape
-                posiciones = {}
-                for i, lm in enumerate(results.pose_landmarks.landmark):
-                    if lm.visibility < 0.5:
-                        continue
-
-                    if mp_pose.PoseLandmark(i).name not in posx:
-                        continue
-
-                    posiciones[mp_pose.PoseLandmark(i).name] = {
-                        "x": round(lm.x * w, 2),
-                        "y": round(lm.y * h, 2),
-                        "z": round(lm.z, 4),
-                        "visibility": round(lm.visibility, 4),
-                        "timestamp": time.time()
-                    }
-
-                # Calcular ángulos
-                angulos, simetrias = calcular_angulos_corporales(posiciones)
+                angulos, simetrias = perfil.calcular(perfil.extraer(results), w, h)
 
                 # Agregar al historial solo si está grabando
                 if grabando and time.time() - start_point >= time_interval:
@@ -221,9 +208,9 @@ def run_opencv_process(ejercicio:str="curl biceps"):
         cv2.imshow('Control de Entrenamiento', frame)
         
     
-    #print("💾 Guardando historial final...")
-    #guardar_historial()
-    #print(f"📊 Total de capturas: {len(history)}")
+    print("💾 Guardando historial final...")
+    guardar_historial(ejercicio)
+    print(f"📊 Total de capturas: {len(history)}")
 
     cap.release()
     cv2.destroyAllWindows()
@@ -238,5 +225,7 @@ def run_opencv_process(ejercicio:str="curl biceps"):
 
 
 if __name__ == "__main__": 
+    # python -m app.opencv.opencv
+    from elevenlabs import play
     audio = run_opencv_process(ejercicio="curl biceps")
     play(audio)
\ No newline at end of file
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Perfiles de ejercicio: que landmarks, angulos y simetrias necesita cada uno.
+#
+# Cada perfil se compila una vez a arrays de indices: por frame solo se copian
+# los landmarks del perfil (indexando directo por el indice de PoseLandmark) y
+# los angulos se calculan vectorizados, sin pasar por nombres ni diccionarios.
+#
+# Con usar_world=True los angulos salen de pose_world_landmarks (metros, 3D,
+# origen en la cadera), que no dependen del angulo de la camara. Las simetrias
+# siempre se miden en el plano de la imagen (inclinacion respecto a la horizontal).
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Mismo orden que mediapipe.solutions.pose.PoseLandmark (no hace falta importar MediaPipe)
+LANDMARKS = (
+    'NOSE', 'LEFT_EYE_INNER', 'LEFT_EYE', 'LEFT_EYE_OUTER', 'RIGHT_EYE_INNER', 'RIGHT_EYE',
+    'RIGHT_EYE_OUTER', 'LEFT_EAR', 'RIGHT_EAR', 'MOUTH_LEFT', 'MOUTH_RIGHT',
+    'LEFT_SHOULDER', 'RIGHT_SHOULDER', 'LEFT_ELBOW', 'RIGHT_ELBOW', 'LEFT_WRIST', 'RIGHT_WRIST',
+    'LEFT_PINKY', 'RIGHT_PINKY', 'LEFT_INDEX', 'RIGHT_INDEX', 'LEFT_THUMB', 'RIGHT_THUMB',
+    'LEFT_HIP', 'RIGHT_HIP', 'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_ANKLE', 'RIGHT_ANKLE',
+    'LEFT_HEEL', 'RIGHT_HEEL', 'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX',
+)
+INDICE = {nombre: i for i, nombre in enumerate(LANDMARKS)}
+
+# ==== DEFINICIONES ====
+# angulo: (extremo, vertice, extremo); simetria: (derecho, izquierdo)
+ANGULOS_BRAZOS = {
+    'codo_izquierdo': ('LEFT_SHOULDER', 'LEFT_ELBOW', 'LEFT_WRIST'),
+    'codo_derecho': ('RIGHT_SHOULDER', 'RIGHT_ELBOW', 'RIGHT_WRIST'),
+    'hombro_izquierdo': ('LEFT_HIP', 'LEFT_SHOULDER', 'LEFT_ELBOW'),
+    'hombro_derecho': ('RIGHT_HIP', 'RIGHT_SHOULDER', 'RIGHT_ELBOW'),
+    'brazo_izquierdo': ('LEFT_HIP', 'LEFT_SHOULDER', 'LEFT_WRIST'),
+    'brazo_derecho': ('RIGHT_HIP', 'RIGHT_SHOULDER', 'RIGHT_WRIST'),
+}
+ANGULOS_PIERNAS = {
+    'rodilla_izquierda': ('LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE'),
+    'rodilla_derecha': ('RIGHT_HIP', 'RIGHT_KNEE', 'RIGHT_ANKLE'),
+    'cadera_izquierda': ('LEFT_SHOULDER', 'LEFT_HIP', 'LEFT_KNEE'),
+    'cadera_derecha': ('RIGHT_SHOULDER', 'RIGHT_HIP', 'RIGHT_KNEE'),
+    'tobillo_izquierdo': ('LEFT_KNEE', 'LEFT_ANKLE', 'LEFT_FOOT_INDEX'),
+    'tobillo_derecho': ('RIGHT_KNEE', 'RIGHT_ANKLE', 'RIGHT_FOOT_INDEX'),
+}
+SIMETRIAS_BRAZOS = {
+    'simetria_hombros': ('RIGHT_SHOULDER', 'LEFT_SHOULDER'),
+    'simetria_codos': ('RIGHT_ELBOW', 'LEFT_ELBOW'),
+    'simetria_cadera': ('RIGHT_HIP', 'LEFT_HIP'),
+    'simetria_munecas': ('RIGHT_WRIST', 'LEFT_WRIST'),
+}
+SIMETRIAS_PIERNAS = {
+    'simetria_hombros': ('RIGHT_SHOULDER', 'LEFT_SHOULDER'),
+    'simetria_cadera': ('RIGHT_HIP', 'LEFT_HIP'),
+    'simetria_rodillas': ('RIGHT_KNEE', 'LEFT_KNEE'),
+}
+
+
+class ExerciseProfile:
+    """
+    Landmarks y angulos de un ejercicio, compilados a indices.
+
+    Los puntos se manejan como arrays (n, 4) -> x, y, z, visibility, o (n, 7) con
+    world -> x, y, z, wx, wy, wz, visibility; n = len(indices), en el orden de `indices`.
+    """
+
+    def __init__(self, nombre: str, angulos: Dict[str, Tuple[str, str, str]], simetrias: Dict[str, Tuple[str, str]],
+                 angulo_reps: Sequence[str], usar_world: bool = False):
+        self.nombre = nombre
+        self.usar_world = usar_world
+        self.angulo_reps = tuple(angulo_reps)
+        self.nombres_angulos = tuple(angulos)
+        self.nombres_simetrias = tuple(simetrias)
+        self.columnas = self.nombres_angulos + self.nombres_simetrias
+
+        usados = sorted({INDICE[n] for tri in angulos.values() for n in tri} |
+                        {INDICE[n] for par in simetrias.values() for n in par})
+        self.indices = tuple(usados)
+        fila = {indice: k for k, indice in enumerate(usados)}
+        self._tri = np.array([[fila[INDICE[n]] for n in tri] for tri in angulos.values()], dtype=np.intp).reshape(-1, 3)
+        self._pares = np.array([[fila[INDICE[n]] for n in par] for par in simetrias.values()], dtype=np.intp).reshape(-1, 2)
+
+    @property
+    def n_coords(self) -> int:
+        return 6 if self.usar_world else 3
+
+    def extraer(self, results) -> Optional[np.ndarray]:
+        """Landmarks del perfil desde el resultado de Pose.process, o None sin deteccion."""
+        if not results.pose_landmarks:
+            return None
+        lms = results.pose_landmarks.landmark
+        if not self.usar_world:
+            return np.array([(lms[i].x, lms[i].y, lms[i].z, lms[i].visibility) for i in self.indices])
+        # sin world landmarks se usan las coordenadas normalizadas como aproximacion
+        world = results.pose_world_landmarks.landmark if results.pose_world_landmarks else lms
+        return np.array([
+            (lms[i].x, lms[i].y, lms[i].z, world[i].x, world[i].y, world[i].z, lms[i].visibility)
+            for i in self.indices
+        ])
+
+    def calcular(self, puntos: np.ndarray, w: int, h: int, min_visibilidad: float = 0.5) -> Tuple[dict, dict]:
+        """Angulos y simetrias (grados) con los mismos nombres que calcular_angulos_corporales."""
+        visible = puntos[:, -1] >= min_visibilidad
+        pixeles = puntos[:, :2] * (w, h)
+        coords = puntos[:, 3:6] if self.usar_world and puntos.shape[1] == 7 else pixeles
+
+        angulos = {}
+        if len(self._tri):
+            ba = coords[self._tri[:, 0]] - coords[self._tri[:, 1]]
+            bc = coords[self._tri[:, 2]] - coords[self._tri[:, 1]]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cos = np.einsum('ij,ij->i', ba, bc) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
+            grados = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+            validos = visible[self._tri].all(axis=1) & np.isfinite(grados)
+            angulos = {n: round(float(g), 1) for n, g, ok in zip(self.nombres_angulos, grados, validos) if ok}
+
+        simetrias = {}
+        if len(self._pares):
+            delta = pixeles[self._pares[:, 0]] - pixeles[self._pares[:, 1]]
+            grados = np.abs(np.degrees(np.arctan2(delta[:, 1], delta[:, 0])))
+            validos = visible[self._pares].all(axis=1)
+            simetrias = {n: round(float(g), 1) for n, g, ok in zip(self.nombres_simetrias, grados, validos) if ok}
+        return angulos, simetrias
+
+
+PROFILES = {
+    "curl biceps": ExerciseProfile("curl biceps", ANGULOS_BRAZOS, SIMETRIAS_BRAZOS, ['codo_derecho', 'codo_izquierdo']),
+    "press hombro": ExerciseProfile("press hombro", ANGULOS_BRAZOS, SIMETRIAS_BRAZOS, ['hombro_derecho', 'hombro_izquierdo']),
+    "sentadilla": ExerciseProfile("sentadilla", ANGULOS_PIERNAS, SIMETRIAS_PIERNAS,
+                                  ['rodilla_derecha', 'rodilla_izquierda'], usar_world=True),
+    "zancada": ExerciseProfile("zancada", ANGULOS_PIERNAS, SIMETRIAS_PIERNAS,
+                               ['rodilla_derecha', 'rodilla_izquierda'], usar_world=True),
+    # ejercicio desconocido o sin indicar: cuerpo completo en 2D
+    "general": ExerciseProfile("general", {**ANGULOS_BRAZOS, **ANGULOS_PIERNAS}, {**SIMETRIAS_BRAZOS, **SIMETRIAS_PIERNAS},
+                               ['codo_derecho', 'codo_izquierdo']),
+}
+ALIASES = {"squat": "sentadilla", "sentadillas": "sentadilla", "bicep curl": "curl biceps", "lunge": "zancada"}
+
+
+def perfil_ejercicio(ejercicio: Optional[str]) -> ExerciseProfile:
+    nombre = (ejercicio or "").strip().lower()
+    return PROFILES.get(ALIASES.get(nombre, nombre), PROFILES["general"])
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# Grabacion y reproduccion de sesiones de /ws/video.
+#
+# Formato .wsrec (gzip):
+#   b"WSREC1\n" + una linea JSON con metadatos
+#   por mensaje: struct "<BII" (tipo, ms desde el inicio, largo) + payload
+#     IN_TEXT  mensaje de texto del cliente tal cual
+#     IN_FRAME mensaje con frame: uint32 largo del JSON + JSON (frame = solo el
+#              prefijo "data:image/...;base64,") + bytes de la imagen sin base64
+#     OUT_TEXT mensaje enviado por el servidor
+#
+# Guardar la imagen en binario evita el 33% extra del base64.
+#
+# Uso:
+#   WS_RECORD_DIR=recordings uvicorn app.main:app        # grabar sesiones reales
+#   python -m app.opencv.session_replay info recordings/*.wsrec
+#   ADMISSION_VIDEO_RATE= uvicorn app.main:app           # sin limite de admision por IP
+#   python -m app.opencv.session_replay replay recordings/x.wsrec --clients 50 --speed max
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import os
+import struct
+import time
+import uuid
+from typing import Iterator, List, Optional, Tuple
+
+MAGIC = b"WSREC1\n"
+HEADER = struct.Struct("<BII")
+IN_TEXT, IN_FRAME, OUT_TEXT = 0, 1, 2
+
+WS_RECORD_DIR = os.getenv("WS_RECORD_DIR", "")
+
+
+class SessionRecorder:
+    """Escribe los mensajes de una sesion a medida que ocurren."""
+
+    def __init__(self, path: str, meta: Optional[dict] = None):
+        self.path = path
+        self.start = time.monotonic()
+        self._file = gzip.open(path, "wb", compresslevel=6)
+        self._file.write(MAGIC)
+        self._file.write(json.dumps({"started_at": time.time(), **(meta or {})}).encode() + b"\n")
+
+    @classmethod
+    def from_env(cls, meta: Optional[dict] = None) -> Optional["SessionRecorder"]:
+        """Grabador en WS_RECORD_DIR, o None si la grabacion esta desactivada."""
+        if not WS_RECORD_DIR:
+            return None
+        os.makedirs(WS_RECORD_DIR, exist_ok=True)
+        name = time.strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:8] + ".wsrec"
+        return cls(os.path.join(WS_RECORD_DIR, name), meta)
+
+    def _write(self, kind: int, payload: bytes) -> None:
+        ms = int((time.monotonic() - self.start) * 1000)
+        self._file.write(HEADER.pack(kind, ms, len(payload)))
+        self._file.write(payload)
+
+    def inbound(self, text: str) -> None:
+        try:
+            data = json.loads(text)
+            if isinstance(data, str):
+                data = json.loads(data)
+        except ValueError:
+            data = None
+        frame = data.get("frame") if isinstance(data, dict) else None
+        if isinstance(frame, str) and "," in frame:
+            prefix, b64 = frame.split(",", 1)
+            meta = json.dumps({**data, "frame": prefix + ","}).encode()
+            self._write(IN_FRAME, struct.pack("<I", len(meta)) + meta + base64.b64decode(b64))
+        else:
+            self._write(IN_TEXT, text.encode())
+
+    def outbound(self, text: str) -> None:
+        self._write(OUT_TEXT, text.encode())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_recording(path: str) -> Tuple[dict, Iterator[Tuple[int, int, str]]]:
+    """Devuelve (metadatos, iterador de (tipo, ms, texto)) con los frames ya reconstruidos."""
+    f = gzip.open(path, "rb")
+    if f.readline() != MAGIC:
+        f.close()
+        raise ValueError(f"{path} no es una grabacion .wsrec")
+    meta = json.loads(f.readline())
+
+    def messages():
+        try:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                kind, ms, length = HEADER.unpack(header)
+                payload = f.read(length)
+                if kind == IN_FRAME:
+                    (meta_len,) = struct.unpack_from("<I", payload)
+                    data = json.loads(payload[4:4 + meta_len])
+                    data["frame"] += base64.b64encode(payload[4 + meta_len:]).decode()
+                    # el cliente envia el JSON serializado dos veces (receive_json + json.loads)
+                    yield IN_TEXT, ms, json.dumps(json.dumps(data))
+                else:
+                    yield kind, ms, payload.decode()
+        finally:
+            f.close()
+
+    return meta, messages()
+
+
+# ==== REPRODUCCION ====
+async def _replay_client(url: str, inbound: List[Tuple[int, str]], speed: Optional[float], linger: float) -> dict:
+    import aiohttp
+
+    sent, received = 0, 0
+    first_reply: Optional[float] = None
+    send_lag = []
+    start = time.monotonic()
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(url, max_msg_size=0) as ws:
+
+            async def reader():
+                nonlocal received, first_reply
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.BINARY:
+                        continue  # audio del coach, anunciado en el mensaje de texto anterior
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    if msg.data.startswith('{"session"'):
+                        continue  # id de la sesion, enviado al conectar
+                    received += 1
+                    if first_reply is None:
+                        first_reply = time.monotonic() - start
+
+            reader_task = asyncio.create_task(reader())
+            try:
+                for ms, text in inbound:
+                    if speed:
+                        due = start + ms / 1000 / speed
+                        delay = due - time.monotonic()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        send_lag.append(max(0.0, -delay))
+                    if ws.closed:
+                        break
+                    await ws.send_str(text)
+                    sent += 1
+            except (ConnectionResetError, aiohttp.ClientError):
+                pass
+            # esperar la respuesta del coach un tiempo acotado y cerrar
+            await asyncio.wait([reader_task], timeout=linger)
+            reader_task.cancel()
+            # codigo con el que cerro el servidor (1013 = rechazado por admision), None si cerramos nosotros
+            close_code = ws.close_code if ws.closed else None
+            await ws.close()
+    return {
+        "close_code": close_code,
+        "sent": sent,
+        "received": received,
+        "seconds": time.monotonic() - start,
+        "first_reply_s": first_reply,
+        "max_send_lag_s": max(send_lag) if send_lag else 0.0,
+    }
+
+
+async def replay(paths: List[str], url: str, clients: int, speed: Optional[float], linger: float = 20.0) -> dict:
+    """Lanza `clients` clientes simultaneos; cada uno reproduce una grabacion (en ronda)."""
+    sessions = []
+    for path in paths:
+        _, messages = read_recording(path)
+        sessions.append([(ms, text) for kind, ms, text in messages if kind == IN_TEXT])
+
+    start = time.monotonic()
+    results = await asyncio.gather(
+        *(_replay_client(url, sessions[i % len(sessions)], speed, linger) for i in range(clients)),
+        return_exceptions=True,
+    )
+    elapsed = time.monotonic() - start
+    ok = [r for r in results if isinstance(r, dict)]
+    # 1013 = rechazado por admision; cualquier otro cierre distinto de 1000 cuenta como fallo
+    rejected = sum(1 for r in ok if r["close_code"] == 1013)
+    closed_bad = sum(1 for r in ok if r["close_code"] not in (None, 1000, 1013))
+    firsts = sorted(r["first_reply_s"] for r in ok if r["first_reply_s"] is not None)
+    frames = sum(r["sent"] for r in ok)
+    return {
+        "url": url,
+        "clients": clients,
+        "speed": speed or "max",
+        "rejected": rejected,
+        "failed": len(results) - len(ok) + closed_bad,
+        "frames_sent": frames,
+        "frames_per_s": round(frames / elapsed, 1) if elapsed else 0.0,
+        "replies": sum(r["received"] for r in ok),
+        "first_reply_p50_s": round(firsts[len(firsts) // 2], 3) if firsts else None,
+        "first_reply_max_s": round(firsts[-1], 3) if firsts else None,
+        "max_send_lag_s": round(max((r["max_send_lag_s"] for r in ok), default=0.0), 3),
+        "seconds": round(elapsed, 2),
+    }
+
+
+def info(path: str) -> dict:
+    meta, messages = read_recording(path)
+    counts = {IN_TEXT: 0, OUT_TEXT: 0}
+    last_ms = 0
+    for kind, ms, _ in messages:
+        counts[kind] = counts.get(kind, 0) + 1
+        last_ms = ms
+    return {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "inbound": counts[IN_TEXT],
+        "outbound": counts[OUT_TEXT],
+        "duration_s": last_ms / 1000,
+        "meta": meta,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Grabaciones de sesiones /ws/video')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_info = sub.add_parser('info', help='Resumen de grabaciones')
+    p_info.add_argument('grabaciones', nargs='+')
+    p_replay = sub.add_parser(
+        'replay', help='Reproducir contra el servidor',
+        epilog='Todos los clientes salen de la misma IP: arrancar el servidor con ADMISSION_VIDEO_RATE= '
+               '(vacio, sin limite) o con un limite mayor que --clients, o las sesiones se rechazan con 1013 '
+               "y cuentan en 'rejected'.",
+    )
+    p_replay.add_argument('grabaciones', nargs='+')
+    p_replay.add_argument('--url', default='ws://localhost:8000/ws/video')
+    p_replay.add_argument('-c', '--clients', type=int, default=1, help='Clientes simultaneos')
+    p_replay.add_argument('--speed', default='1', help="Factor de velocidad (1 = original) o 'max'")
+    p_replay.add_argument('--linger', type=float, default=20.0, help='Segundos de espera por la respuesta al terminar')
+    args = parser.parse_args()
+
+    if args.comando == 'info':
+        for path in args.grabaciones:
+            print(json.dumps(info(path)))
+    else:
+        speed = None if args.speed == 'max' else float(args.speed)
+        print(json.dumps(asyncio.run(replay(args.grabaciones, args.url, args.clients, speed, args.linger)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
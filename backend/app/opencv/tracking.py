@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Seguimiento temporal de landmarks para no correr MediaPipe en cada frame.
+#
+# El modelo se ejecuta 1 de cada K frames; en los intermedios los landmarks se
+# extrapolan con la velocidad filtrada. Todas las posiciones pasan por un filtro
+# One-Euro (Casiez et al. 2012): suaviza mucho con movimiento lento y poco con
+# movimiento rapido, asi los angulos salen estables sin retraso visible.
+#
+# Los puntos se manejan como arrays (n, coords + 1) con visibility en la ultima
+# columna, en el formato de ExerciseProfile (solo los landmarks del perfil).
+
+import math
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .profiles import perfil_ejercicio
+
+# Parametros por ejercicio: k = frames por deteccion, min_cutoff (Hz) y beta del
+# One-Euro (beta sobre velocidades en coordenadas normalizadas/s, por eso es alto),
+# max_gap = frames que se rellena un landmark perdido antes de descartarlo.
+TRACKING_PROFILES = {
+    "default": {"k": 2, "min_cutoff": 1.5, "beta": 10.0, "max_gap": 4},
+    "curl biceps": {"k": 3, "min_cutoff": 1.5, "beta": 10.0, "max_gap": 6},
+    "press hombro": {"k": 3, "min_cutoff": 1.5, "beta": 10.0, "max_gap": 6},
+    # movimientos mas rapidos / de cuerpo completo: detectar mas seguido
+    "sentadilla": {"k": 2, "min_cutoff": 2.0, "beta": 20.0, "max_gap": 4},
+    "zancada": {"k": 2, "min_cutoff": 2.0, "beta": 20.0, "max_gap": 4},
+    "salto": {"k": 1, "min_cutoff": 2.0, "beta": 30.0, "max_gap": 2},
+}
+
+# POSE_TRACKING=0 vuelve a procesar cada frame con el modelo completo
+POSE_TRACKING = os.getenv("POSE_TRACKING", "1") == "1"
+
+
+class OneEuroFilter:
+    """Filtro One-Euro vectorizado; solo actualiza las filas indicadas por `mask`."""
+
+    def __init__(self, shape: tuple, min_cutoff: float = 1.0, beta: float = 0.0, d_cutoff: float = 1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.x = np.zeros(shape)
+        self.dx = np.zeros(shape)
+        self.t = np.zeros(shape[0])
+        self.initialized = np.zeros(shape[0], dtype=bool)
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x: np.ndarray, t: float, mask: np.ndarray) -> np.ndarray:
+        nuevos = mask & ~self.initialized
+        self.x[nuevos] = x[nuevos]
+        self.dx[nuevos] = 0.0
+        self.t[nuevos] = t
+        self.initialized |= nuevos
+
+        upd = mask & ~nuevos
+        if upd.any():
+            dt = np.maximum(t - self.t[upd], 1e-3)[:, None]
+            dx = (x[upd] - self.x[upd]) / dt
+            a_d = self._alpha(self.d_cutoff, dt)
+            dx_hat = a_d * dx + (1 - a_d) * self.dx[upd]
+            cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+            a = self._alpha(cutoff, dt)
+            self.x[upd] = a * x[upd] + (1 - a) * self.x[upd]
+            self.dx[upd] = dx_hat
+            self.t[upd] = t
+        return self.x
+
+
+class PoseTracker:
+    """
+    Estado de seguimiento de una sesion.
+
+    Uso por frame:
+        if tracker.next_frame():   # toca correr el modelo
+            puntos = tracker.update(puntos_detectados_o_None, t, (w, h))
+        else:
+            puntos = tracker.predict(t)
+    """
+
+    def __init__(self, k: int = 2, min_cutoff: float = 1.5, beta: float = 10.0, max_gap: int = 4,
+                 n_landmarks: int = 33, n_coords: int = 3, min_visibilidad: float = 0.5, decaimiento: float = 0.92):
+        self.k = max(1, k)
+        self.max_gap = max_gap
+        self.min_visibilidad = min_visibilidad
+        self.decaimiento = decaimiento
+        self.filtro = OneEuroFilter((n_landmarks, n_coords), min_cutoff=min_cutoff, beta=beta)
+        self.visibilidad = np.zeros(n_landmarks)
+        self.gap = np.zeros(n_landmarks, dtype=np.int32)
+        self.size: Optional[Tuple[int, int]] = None
+        self.frames = 0
+        self.frames_detectados = 0
+
+    @classmethod
+    def para_ejercicio(cls, ejercicio: Optional[str]) -> "PoseTracker":
+        perfil = perfil_ejercicio(ejercicio)
+        params = TRACKING_PROFILES.get(perfil.nombre, TRACKING_PROFILES["default"])
+        return cls(**params, n_landmarks=len(perfil.indices), n_coords=perfil.n_coords)
+
+    def next_frame(self) -> bool:
+        """True si este frame debe pasar por el modelo (cada k frames o sin estado valido)."""
+        detectar = self.size is None or self.frames % self.k == 0 or not self.filtro.initialized.any()
+        self.frames += 1
+        if detectar:
+            self.frames_detectados += 1
+        return detectar
+
+    def _salida(self, t: float, pasos: np.ndarray) -> np.ndarray:
+        """Posicion extrapolada y confianza decreciente segun cuantos frames sin ver cada landmark."""
+        dt = (t - self.filtro.t)[:, None]
+        pos = self.filtro.x + self.filtro.dx * np.clip(dt, 0.0, 0.5)
+        vis = np.where(
+            self.filtro.initialized & (pasos <= self.max_gap),
+            self.visibilidad * self.decaimiento ** pasos,
+            0.0,
+        )
+        return np.column_stack([pos, vis])
+
+    def update(self, puntos: Optional[np.ndarray], t: float, size: Tuple[int, int]) -> np.ndarray:
+        self.size = size
+        if puntos is None:
+            visibles = np.zeros(len(self.gap), dtype=bool)
+        else:
+            visibles = puntos[:, -1] >= self.min_visibilidad
+            self.filtro(puntos[:, :-1], t, visibles)
+            self.visibilidad[visibles] = puntos[visibles, -1]
+        # landmarks perdidos: se rellenan con la prediccion hasta max_gap frames
+        self.gap = np.where(visibles, 0, self.gap + 1)
+        return self._salida(t, self.gap)
+
+    def predict(self, t: float) -> np.ndarray:
+        return self._salida(t, self.gap + (self.frames - 1) % self.k)
+
+    @property
+    def ahorro(self) -> float:
+        """Fraccion de frames que no pasaron por el modelo."""
+        return 1 - self.frames_detectados / self.frames if self.frames else 0.0
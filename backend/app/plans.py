@@ -0,0 +1,291 @@
+# Daily training plans for /api/suggest/exercises.
+#
+# The nightly run (python -m app.plans run) generates today's plan for every
+# user seen in the last PLAN_ACTIVE_DAYS days, before they open the app. Plans
+# land in daily_plans, which the endpoint serves with one indexed lookup; only a
+# miss (new user, moved location, failed generation) pays the LLM at request time.
+#
+# The run is restartable: each plan is committed as soon as it is generated and
+# users who already have one for the day are skipped, so a crashed run picks up
+# where it stopped. Set LLM_PROVIDER=stub to run it against the local stub LLM.
+#
+#   python -m app.plans run [--day 2026-10-20] [--concurrency 4] [--retries 3] [--force]
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import coach_context, heart_rate, models
+from .db import AsyncSessionLocal
+from .metrics import registry, timer
+from .services import services
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
+TICKETMASTER_API_KEY = os.getenv("TICKETMASTER_API_KEY", "")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+
+# Users seen within this many days get a plan from the nightly run
+PLAN_ACTIVE_DAYS = int(os.getenv("PLAN_ACTIVE_DAYS", "14"))
+# Concurrent LLM calls and retries per user in the nightly run
+PLAN_BATCH_CONCURRENCY = int(os.getenv("PLAN_BATCH_CONCURRENCY", "4"))
+PLAN_BATCH_RETRIES = int(os.getenv("PLAN_BATCH_RETRIES", "3"))
+
+# a stored plan is reused while the request is this close to where it was generated (degrees, ~25 km)
+MAX_DISTANCE_DEG = 0.25
+DEFAULT_SPORT = "running"
+SEEN_RESOLUTION = timedelta(hours=1)
+
+plans_served_total = registry.counter("coach_plans_served_total", "Daily plans served by source")
+plan_batch_total = registry.counter("coach_plan_batch_total", "Nightly plan generation outcomes")
+
+
+def today() -> str:
+    return date.today().isoformat()
+
+
+def llm_configured() -> bool:
+    return LLM_PROVIDER == "stub" or bool(OPENAI_API_KEY)
+
+
+async def fetch_weather(client: httpx.AsyncClient, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+    if not OPENWEATHER_API_KEY:
+        return None
+    params = {"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric"}
+    with timer("suggest.weather"):
+        r = await client.get("https://api.openweathermap.org/data/2.5/weather", params=params)
+    return r.json() if r.status_code == 200 else None
+
+
+async def fetch_events(client: httpx.AsyncClient, city: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not (TICKETMASTER_API_KEY and city):
+        return None
+    params = {"apikey": TICKETMASTER_API_KEY, "city": city, "classificationName": "sports", "size": 5}
+    with timer("suggest.events"):
+        r = await client.get("https://app.ticketmaster.com/discovery/v2/events.json", params=params)
+    return r.json() if r.status_code == 200 else None
+
+
+def build_prompt(sport: str, athlete_snip: str, weather: Any, events: Any, hr_snip: Optional[str] = None) -> str:
+    # the nightly run has no live heart rate, so that line is left out
+    hr_line = f"\n- Live heart rate (wearable): {hr_snip}" if hr_snip is not None else ""
+    return f"""
+You are an elite sports coach. Propose a tailored {sport} plan for TODAY given:
+- Athlete context (goals, recent diary, readiness):
+{athlete_snip}
+- Weather (OpenWeather JSON): {weather or {}}
+- Nearby sports events (Ticketmaster JSON, optional): {events or {}}{hr_line}
+
+Output:
+1) Brief 1-sentence overview.
+2) Warm-up (minutes + drills).
+3) Main set (intervals/effort with HR or RPE).
+4) Technique focus cues (short imperatives).
+5) Safety notes for weather.
+6) If outdoors is poor, give an indoor alternative.
+7) 3 short exercise ideas to try this week related to local events (if any).
+"""
+
+
+async def complete(prompt: str) -> str:
+    with timer("suggest.llm"):
+        # off the event loop, so the llm_calls cap / batch concurrency bound real concurrency
+        resp = await asyncio.to_thread(
+            services.get("openai").chat.completions.create,
+            model=OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.6,
+        )
+    return resp.choices[0].message.content
+
+
+async def lookups(lat: float, lon: float, city: Optional[str]) -> Tuple[Any, Any]:
+    async with httpx.AsyncClient(timeout=20) as client:
+        return await fetch_weather(client, lat, lon), await fetch_events(client, city)
+
+
+async def generate(user_id: str, sport: str, weather: Any, events: Any, live: bool = True) -> Dict[str, Any]:
+    """Athlete context plus one LLM call; `live` adds the heart rate being streamed right now."""
+    hr_snip = None
+    if live:
+        hr_snip = heart_rate.prompt_snippet(await heart_rate.live_snapshot(user_id)) or "not streaming"
+    athlete_snip = coach_context.prompt_snippet(await coach_context.get_context(user_id))
+    text = await complete(build_prompt(sport, athlete_snip, weather, events, hr_snip))
+    return {"recommendations": text, "weather": weather, "events": events}
+
+
+def response(plan: models.DailyPlan) -> Dict[str, Any]:
+    return {
+        "recommendations": plan.recommendations,
+        "weather": json.loads(plan.weather) if plan.weather else None,
+        "events": json.loads(plan.events) if plan.events else None,
+        "day": plan.day,
+        "source": plan.source,
+        "generated_at": plan.created_at,
+    }
+
+
+async def remember(db: AsyncSession, user_id: str, lat: float, lon: float, city: Optional[str], sport: str) -> None:
+    """Keeps the user's location and sport for the next nightly run (at most one write an hour if nothing changed)."""
+    now = datetime.utcnow()
+    prefs = await db.get(models.UserPreferences, user_id)
+    if prefs is None:
+        prefs = models.UserPreferences(user_id=user_id)
+        db.add(prefs)
+    elif (prefs.lat, prefs.lon, prefs.sport) == (lat, lon, sport) and (not city or prefs.city == city) \
+            and now - prefs.last_seen_at < SEEN_RESOLUTION:
+        return
+    prefs.lat, prefs.lon, prefs.sport, prefs.last_seen_at = lat, lon, sport, now
+    if city:
+        prefs.city = city
+    try:
+        await db.commit()
+    except IntegrityError:
+        # a concurrent first request stored the same user
+        await db.rollback()
+
+
+async def stored_plan(
+    db: AsyncSession, user_id: str, day: str, sport: str, lat: Optional[float] = None, lon: Optional[float] = None
+) -> Optional[models.DailyPlan]:
+    """Today's plan, unless it was generated for a different place (e.g. the user is travelling)."""
+    plan = await db.scalar(select(models.DailyPlan).where(
+        models.DailyPlan.user_id == user_id, models.DailyPlan.day == day, models.DailyPlan.sport == sport
+    ))
+    if plan is None or lat is None or plan.lat is None:
+        return plan
+    if abs(plan.lat - lat) > MAX_DISTANCE_DEG or abs(plan.lon - lon) > MAX_DISTANCE_DEG:
+        return None
+    return plan
+
+
+async def save_plan(
+    db: AsyncSession, user_id: str, day: str, sport: str, lat: float, lon: float, plan: Dict[str, Any], source: str
+) -> models.DailyPlan:
+    """Upsert on (user_id, day, sport); a concurrent insert for the same key is overwritten."""
+    values = {
+        "lat": lat, "lon": lon, "source": source, "recommendations": plan["recommendations"],
+        "weather": json.dumps(plan["weather"]) if plan["weather"] is not None else None,
+        "events": json.dumps(plan["events"]) if plan["events"] is not None else None,
+        "created_at": datetime.utcnow(),
+    }
+    for _ in range(2):
+        row = await db.scalar(select(models.DailyPlan).where(
+            models.DailyPlan.user_id == user_id, models.DailyPlan.day == day, models.DailyPlan.sport == sport
+        ))
+        if row is None:
+            row = models.DailyPlan(user_id=user_id, day=day, sport=sport)
+            db.add(row)
+        for field, value in values.items():
+            setattr(row, field, value)
+        try:
+            await db.commit()
+            return row
+        except IntegrityError:
+            await db.rollback()
+    raise RuntimeError(f"could not store plan for {user_id} on {day}")
+
+
+async def run_batch(
+    day: Optional[str] = None, concurrency: int = PLAN_BATCH_CONCURRENCY,
+    retries: int = PLAN_BATCH_RETRIES, force: bool = False,
+) -> Dict[str, Any]:
+    """Generates `day`'s plan for every active user who doesn't have one yet."""
+    day = day or today()
+    since = datetime.utcnow() - timedelta(days=PLAN_ACTIVE_DAYS)
+    async with AsyncSessionLocal() as db:
+        users = (await db.scalars(
+            select(models.UserPreferences).where(models.UserPreferences.last_seen_at >= since)
+            .order_by(models.UserPreferences.user_id)
+        )).all()
+        done = set() if force else set((await db.execute(
+            select(models.DailyPlan.user_id, models.DailyPlan.sport).where(models.DailyPlan.day == day)
+        )).all())
+    pending = [u for u in users if (u.user_id, u.sport) not in done]
+    stats = {"day": day, "active_users": len(users), "skipped": len(users) - len(pending),
+             "generated": 0, "failed": 0, "retries": 0}
+    start = time.perf_counter()
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for prefs in pending:
+        queue.put_nowait(prefs)
+    # users in the same area share one weather lookup (and city one events lookup)
+    shared_lookups: Dict[Any, asyncio.Task] = {}
+
+    def shared(key, factory):
+        task = shared_lookups.get(key)
+        # a failed lookup is retried with the user's next attempt
+        if task is None or (task.done() and task.exception() is not None):
+            task = shared_lookups[key] = asyncio.ensure_future(factory())
+        return task
+
+    async with httpx.AsyncClient(timeout=20) as client:
+        async def one(prefs: models.UserPreferences) -> None:
+            weather = await shared(("weather", round(prefs.lat, 1), round(prefs.lon, 1)),
+                                   lambda: fetch_weather(client, prefs.lat, prefs.lon))
+            events = await shared(("events", prefs.city), lambda: fetch_events(client, prefs.city))
+            plan = await generate(prefs.user_id, prefs.sport, weather, events, live=False)
+            async with AsyncSessionLocal() as db:
+                await save_plan(db, prefs.user_id, day, prefs.sport, prefs.lat, prefs.lon, plan, "batch")
+
+        async def worker() -> None:
+            while not queue.empty():
+                prefs = queue.get_nowait()
+                for attempt in range(retries + 1):
+                    try:
+                        await one(prefs)
+                        stats["generated"] += 1
+                        plan_batch_total.inc(result="generated")
+                        break
+                    except Exception as e:
+                        if attempt == retries:
+                            stats["failed"] += 1
+                            plan_batch_total.inc(result="failed")
+                            print(f"Plan for {prefs.user_id} failed after {attempt + 1} attempts: {e}")
+                            break
+                        stats["retries"] += 1
+                        plan_batch_total.inc(result="retried")
+                        # exponential backoff with jitter, so retries don't arrive in lockstep
+                        await asyncio.sleep(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nightly pre-generation of daily plans')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help="Generate the day's plan for every active user")
+    p_run.add_argument('--day', help='ISO date (default: today)')
+    p_run.add_argument('-c', '--concurrency', type=int, default=PLAN_BATCH_CONCURRENCY, help='Concurrent LLM calls')
+    p_run.add_argument('--retries', type=int, default=PLAN_BATCH_RETRIES, help='Retries per user')
+    p_run.add_argument('--force', action='store_true', help='Regenerate plans that already exist')
+    args = parser.parse_args()
+
+    from .db import init_db
+
+    if not llm_configured():
+        parser.error("OPENAI_API_KEY not configured (or set LLM_PROVIDER=stub)")
+    init_db()
+    stats = asyncio.run(run_batch(args.day, args.concurrency, args.retries, args.force))
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
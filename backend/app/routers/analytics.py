@@ -0,0 +1,46 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from ..deps import get_db, get_user_id
+from ..analytics import training_load
+from .. import coach_context
+from .. import models, serialization
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+@router.get("/training-load")
+async def get_training_load(
+    on: Optional[date] = None,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    state = await db.get(models.TrainingLoad, user_id)
+    data = training_load.summary(state, on.toordinal() if on else None)
+    data["prompt"] = training_load.prompt_snippet(data)
+    return data
+
+@router.get("/context")
+async def get_coach_context(user_id: str = Depends(get_user_id)):
+    """The cached snapshot the coaching prompts are built from."""
+    context = await coach_context.get_context(user_id)
+    return {**context, "readiness": coach_context.summary(context), "prompt": coach_context.prompt_snippet(context)}
+
+@router.post("/health")
+async def ingest_health(
+    request: Request,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Accepts AppleHealthXMLProcessor output (records/workouts), as JSON or MessagePack, and folds it into the aggregates."""
+    health_data = await serialization.read_body(request)
+    if not isinstance(health_data, dict) or not all(
+        isinstance(health_data.get(key) or [], list) for key in ("records", "workouts")
+    ):
+        raise HTTPException(status_code=422, detail="Expected an object with records/workouts lists")
+    state = await training_load.get_state(db, user_id)
+    # items without a readable date are skipped and counted, like heart-rate lines
+    count, malformed = training_load.apply_health_data(state, health_data)
+    await db.commit()
+    await coach_context.update_load(user_id, state)
+    return {"applied": count, "malformed": malformed, **training_load.summary(state)}
@@ -1,53 +1,229 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from ..deps import get_db, get_user_id
+from ..analytics import training_load
+from .. import coach_context
+from ..metrics import timed
+from .. import models, schemas, serialization
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import List
-from ..db import SessionLocal, engine, Base
-from .. import models, schemas
-
-Base.metadata.create_all(bind=engine)
 router = APIRouter(prefix="/api/diary", tags=["diary"])
 
-def get_db():
-    db = SessionLocal()
+MAX_BULK_ITEMS = 1000
+
+def encode_cursor(row) -> str:
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, id_ = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(id_)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate(db: AsyncSession, stmt, model, cursor: Optional[str], limit: int) -> dict:
+    """Keyset page over (created_at, id) desc; cost depends on limit, not history size."""
+    if cursor:
+        stmt = stmt.where(tuple_(model.created_at, model.id) < decode_cursor(cursor))
+    stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    rows = (await db.scalars(stmt)).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+def date_range(stmt, model, since: Optional[datetime], until: Optional[datetime]):
+    if since is not None:
+        stmt = stmt.where(model.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(model.created_at < until)
+    return stmt
+
+async def read_items(request: Request, schema) -> list:
+    """Parses a JSON array, or an NDJSON stream line by line as it arrives."""
+    item_adapter = TypeAdapter(schema)
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith(serialization.MSGPACK_TYPES):
+            items = TypeAdapter(List[schema]).validate_python(await serialization.read_body(request))
+        elif content_type.startswith("application/x-ndjson"):
+            items, buf = [], b""
+            async for chunk in request.stream():
+                buf += chunk
+                *lines, buf = buf.split(b"\n")
+                items.extend(item_adapter.validate_json(line) for line in lines if line.strip())
+                if len(items) > MAX_BULK_ITEMS:
+                    break
+            if buf.strip():
+                items.append(item_adapter.validate_json(buf))
+        else:
+            items = TypeAdapter(List[schema]).validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+    return items
+
+async def stored_response(db: AsyncSession, user_id: str, key: str) -> Optional[dict]:
+    stored = await db.scalar(
+        select(models.IdempotencyKey.response).where(
+            models.IdempotencyKey.user_id == user_id, models.IdempotencyKey.key == key
+        )
+    )
+    return json.loads(stored) if stored is not None else None
+
+async def bulk_insert(db: AsyncSession, model, items: list, user_id: str, idempotency_key: Optional[str]) -> dict:
+    """Inserts every item in one transaction (executemany); replays the stored result for a known key."""
+    if idempotency_key:
+        replay = await stored_response(db, user_id, idempotency_key)
+        if replay is not None:
+            return replay
+    rows = [{**item.model_dump(exclude_none=True), "user_id": user_id} for item in items]
+    ids = list(await db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows)) if rows else []
+    state = None
+    if model is models.DiaryEntry and rows:
+        state = await training_load.get_state(db, user_id)
+        for row in rows:
+            training_load.add_diary_entry(state, row.get("fatigue"), row.get("sleep_hours"), row.get("created_at"))
+    result = {"count": len(ids), "ids": ids}
+    if idempotency_key:
+        db.add(models.IdempotencyKey(user_id=user_id, key=idempotency_key, response=json.dumps(result)))
     try:
-        yield db
-    finally:
-        db.close()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        # a concurrent retry with the same key committed first
+        replay = await stored_response(db, user_id, idempotency_key) if idempotency_key else None
+        if replay is None:
+            raise HTTPException(status_code=409, detail="Conflicting write, retry the request")
+        return replay
+    inserted = [{**row, "id": id_} for row, id_ in zip(rows, ids)]
+    if state is not None:
+        await coach_context.add_diary_entries(user_id, inserted, state)
+    elif model is models.Milestone and inserted:
+        await coach_context.add_milestones(user_id, inserted)
+    return result
 
 @router.post("/goals", response_model=schemas.GoalOut)
-def create_goal(payload: schemas.GoalCreate, db: Session = Depends(get_db)):
-    g = models.Goal(title=payload.title, target_date=payload.target_date)
-    db.add(g)
-    db.commit()
-    db.refresh(g)
+@timed("diary.create_goal")
+async def create_goal(payload: schemas.GoalCreate, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    # INSERT ... RETURNING gives back the row without a refresh round trip
+    g = await db.scalar(insert(models.Goal).values(**payload.model_dump(exclude_none=True), user_id=user_id).returning(models.Goal))
+    await db.commit()
+    await coach_context.add_goals(user_id, [g])
     return g
 
-@router.get("/goals", response_model=List[schemas.GoalOut])
-def list_goals(db: Session = Depends(get_db)):
-    return db.query(models.Goal).order_by(models.Goal.id.desc()).all()
+@router.get("/goals", response_model=schemas.Page[schemas.GoalOut])
+@timed("diary.list_goals")
+async def list_goals(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    stmt = select(models.Goal).where(models.Goal.user_id == user_id)
+    stmt = date_range(stmt, models.Goal, since, until)
+    return serialization.page(request, await paginate(db, stmt, models.Goal, cursor, limit), schemas.GoalOut)
+
+@router.get("/goals/{goal_id}/milestones", response_model=schemas.Page[schemas.MilestoneOut])
+@timed("diary.list_goal_milestones")
+async def list_goal_milestones(
+    request: Request,
+    goal_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    # served by ix_milestones_goal_id
+    stmt = select(models.Milestone).where(models.Milestone.goal_id == goal_id, models.Milestone.user_id == user_id)
+    return serialization.page(request, await paginate(db, stmt, models.Milestone, cursor, limit), schemas.MilestoneOut)
 
 @router.post("/milestones", response_model=schemas.MilestoneOut)
-def add_milestone(payload: schemas.MilestoneCreate, db: Session = Depends(get_db)):
-    m = models.Milestone(goal_id=payload.goal_id, note=payload.note)
-    db.add(m)
-    db.commit()
-    db.refresh(m)
+@timed("diary.add_milestone")
+async def add_milestone(payload: schemas.MilestoneCreate, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    m = await db.scalar(insert(models.Milestone).values(**payload.model_dump(exclude_none=True), user_id=user_id).returning(models.Milestone))
+    await db.commit()
+    await coach_context.add_milestones(user_id, [m])
     return m
 
+@router.post("/milestones/bulk", response_model=schemas.BulkResult)
+@timed("diary.add_milestones_bulk")
+async def add_milestones_bulk(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    items = await read_items(request, schemas.MilestoneCreate)
+    return await bulk_insert(db, models.Milestone, items, user_id, idempotency_key)
+
+@router.get("/milestones", response_model=schemas.Page[schemas.MilestoneOut])
+@timed("diary.list_milestones")
+async def list_milestones(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    stmt = select(models.Milestone).where(models.Milestone.user_id == user_id)
+    stmt = date_range(stmt, models.Milestone, since, until)
+    return serialization.page(request, await paginate(db, stmt, models.Milestone, cursor, limit), schemas.MilestoneOut)
+
 @router.post("/entries", response_model=schemas.DiaryOut)
-def add_entry(payload: schemas.DiaryCreate, db: Session = Depends(get_db)):
-    e = models.DiaryEntry(
-        note=payload.note,
-        mood=payload.mood,
-        fatigue=payload.fatigue,
-        sleep_hours=payload.sleep_hours,
-    )
-    db.add(e)
-    db.commit()
-    db.refresh(e)
+@timed("diary.add_entry")
+async def add_entry(payload: schemas.DiaryCreate, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    e = await db.scalar(insert(models.DiaryEntry).values(**payload.model_dump(exclude_none=True), user_id=user_id).returning(models.DiaryEntry))
+    state = await training_load.get_state(db, user_id)
+    training_load.add_diary_entry(state, e.fatigue, e.sleep_hours, e.created_at)
+    await db.commit()
+    await coach_context.add_diary_entries(user_id, [e], state)
     return e
 
-@router.get("/entries", response_model=List[schemas.DiaryOut])
-def list_entries(db: Session = Depends(get_db)):
-    return db.query(models.DiaryEntry).order_by(models.DiaryEntry.id.desc()).all()
+@router.post("/entries/bulk", response_model=schemas.BulkResult)
+@timed("diary.add_entries_bulk")
+async def add_entries_bulk(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    items = await read_items(request, schemas.DiaryCreate)
+    return await bulk_insert(db, models.DiaryEntry, items, user_id, idempotency_key)
+
+@router.get("/entries", response_model=schemas.Page[schemas.DiaryOut])
+@timed("diary.list_entries")
+async def list_entries(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    mood: Optional[str] = None,
+    min_fatigue: Optional[int] = Query(None, ge=1, le=10),
+    max_fatigue: Optional[int] = Query(None, ge=1, le=10),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    stmt = select(models.DiaryEntry).where(models.DiaryEntry.user_id == user_id)
+    stmt = date_range(stmt, models.DiaryEntry, since, until)
+    if mood is not None:
+        stmt = stmt.where(models.DiaryEntry.mood == mood)
+    if min_fatigue is not None:
+        stmt = stmt.where(models.DiaryEntry.fatigue >= min_fatigue)
+    if max_fatigue is not None:
+        stmt = stmt.where(models.DiaryEntry.fatigue <= max_fatigue)
+    # rows -> dicts without per-row model validation (see app.serialization)
+    return serialization.page(request, await paginate(db, stmt, models.DiaryEntry, cursor, limit), schemas.DiaryOut)
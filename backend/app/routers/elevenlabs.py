@@ -1,8 +1,9 @@
 
 import os
 import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from dotenv import load_dotenv
+from ..admission import admit, voice_token_bucket
 
 load_dotenv()
 
@@ -11,7 +12,7 @@ ELEVENLABS_AGENT_ID = os.getenv("ELEVENLABS_AGENT_ID", "")
 
 router = APIRouter(prefix="/api/elevenlabs", tags=["elevenlabs"])
 
-@router.get("/webrtc-token")
+@router.get("/webrtc-token", dependencies=[Depends(admit(voice_token_bucket))])
 async def get_webrtc_token():
     if not ELEVENLABS_API_KEY or not ELEVENLABS_AGENT_ID:
         raise HTTPException(status_code=500, detail="Missing ElevenLabs configuration")
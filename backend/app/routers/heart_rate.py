@@ -0,0 +1,34 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request
+from ..deps import require_user_id
+from .. import heart_rate
+
+router = APIRouter(prefix="/api/hr", tags=["heart-rate"])
+
+@router.post("/samples")
+async def ingest_samples(
+    request: Request,
+    max_hr: Optional[int] = Query(None, ge=100, le=240),
+    age: Optional[int] = Query(None, ge=5, le=100),
+    user_id: str = Depends(require_user_id),
+):
+    """
+    NDJSON body, one sample per line: {"t": <epoch ms>, "hr": 142, "rr": [812, 790]}.
+    `accepted` counts the samples kept: out-of-order, implausible, future-dated
+    and already expired (older than the window) ones are rejected.
+    """
+    window = heart_rate.get_window(user_id, heart_rate.max_hr_for(max_hr, age))
+    accepted = 0
+    pending = b""
+    # parsed as it arrives, so long uploads never sit in memory whole
+    async for chunk in request.stream():
+        *lines, pending = (pending + chunk).split(b"\n")
+        accepted += window.ingest_lines(lines)
+    accepted += window.ingest_lines([pending])
+    snapshot = await heart_rate.publish(user_id, window)
+    return {"accepted": accepted, **snapshot}
+
+@router.get("/live")
+async def live(user_id: str = Depends(require_user_id)):
+    snapshot = await heart_rate.live_snapshot(user_id)
+    return {**(snapshot or {"samples": 0}), "prompt": heart_rate.prompt_snippet(snapshot)}
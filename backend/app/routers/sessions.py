@@ -0,0 +1,85 @@
+import json
+from typing import Optional
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from ..deps import get_db, get_user_id
+from ..metrics import timed
+from .. import models, schemas, serialization, workout_sessions
+from .diary import paginate
+
+router = APIRouter(prefix="/api/sessions", tags=["sessions"])
+
+WS = models.WorkoutSession
+
+def _exercise(name: str) -> str:
+    from ..opencv.profiles import perfil_ejercicio
+    return perfil_ejercicio(name).nombre
+
+@router.get("", response_model=schemas.Page[schemas.WorkoutSessionOut])
+@timed("sessions.list")
+async def list_sessions(
+    request: Request,
+    exercise: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    # summary columns only: the frame streams stay on disk
+    stmt = select(WS).options(defer(WS.features), defer(WS.stats), defer(WS.columns)).where(WS.user_id == user_id)
+    if exercise:
+        stmt = stmt.where(WS.exercise == _exercise(exercise))
+    return serialization.page(request, await paginate(db, stmt, WS, cursor, limit), schemas.WorkoutSessionOut)
+
+@router.get("/progress", response_model=schemas.Progress)
+@timed("sessions.progress")
+async def progress(
+    exercise: str,
+    limit: int = Query(50, ge=2, le=500),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """ROM, symmetry and reps across the latest sessions, from the summary columns (served by the (user, exercise, started_at) index)."""
+    exercise = _exercise(exercise)
+    rows = (await db.execute(
+        select(WS.id, WS.started_at, WS.reps, WS.rom, WS.symmetry)
+        .where(WS.user_id == user_id, WS.exercise == exercise)
+        .order_by(WS.started_at.desc()).limit(limit)
+    )).all()
+    points = [row._asdict() for row in reversed(rows)]
+    roms = [p["rom"] for p in points if p["rom"] is not None]
+    return {
+        "exercise": exercise,
+        "sessions": points,
+        "best_rom": max(roms) if roms else None,
+        "rom_per_week": workout_sessions.trend(points, "rom"),
+        "symmetry_per_week": workout_sessions.trend(points, "symmetry"),
+        "reps_per_week": workout_sessions.trend(points, "reps"),
+    }
+
+@router.get("/{session_id}", response_model=schemas.WorkoutSessionDetail)
+@timed("sessions.detail")
+async def get_session(
+    session_id: int,
+    series: bool = False,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    row = await db.get(WS, session_id)
+    if row is None or row.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    data = schemas.WorkoutSessionOut.model_validate(row).model_dump()
+    data.update(stats=json.loads(row.stats or "{}"), stream_bytes=len(row.features or b""))
+    if series:
+        # the only path that decodes the stream
+        t_ms, features = workout_sessions.decode_features(row.features)
+        columns = json.loads(row.columns)
+        data["t_ms"] = t_ms.tolist()
+        data["series"] = {
+            name: np.where(np.isnan(features[:, j]), None, np.round(features[:, j].astype(np.float64), 1)).tolist()
+            for j, name in enumerate(columns)
+        }
+    return data
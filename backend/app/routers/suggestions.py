@@ -1,67 +1,41 @@
-
-import os
 from typing import Optional
-import httpx
-from fastapi import APIRouter, Query, HTTPException
-from dotenv import load_dotenv
-from openai import OpenAI
-
-load_dotenv()
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
-TICKETMASTER_API_KEY = os.getenv("TICKETMASTER_API_KEY", "")
+from fastapi import APIRouter, Depends, Query, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..admission import Rejected, admit, llm_calls, suggest_bucket, too_many_requests
+from ..deps import get_db, get_user_id
+from .. import plans
+from ..metrics import timed
 
 router = APIRouter(prefix="/api/suggest", tags=["suggestions"])
 
-@router.get("/exercises")
+@router.get("/exercises", dependencies=[Depends(admit(suggest_bucket))])
+@timed("suggest.exercises")
 async def suggest_exercises(
     lat: float = Query(...),
     lon: float = Query(...),
     city: Optional[str] = Query(None),
-    sport: Optional[str] = Query("running"),
+    sport: Optional[str] = Query(plans.DEFAULT_SPORT),
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_db),
 ):
-    if not OPENAI_API_KEY:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
-    weather = None
-    if OPENWEATHER_API_KEY:
-        w_url = "https://api.openweathermap.org/data/2.5/weather"
-        params = {"lat": lat, "lon": lon, "appid": OPENWEATHER_API_KEY, "units": "metric"}
-        async with httpx.AsyncClient(timeout=20) as client:
-            wr = await client.get(w_url, params=params)
-            if wr.status_code == 200:
-                weather = wr.json()
-    events = None
-    if TICKETMASTER_API_KEY and city:
-        e_url = "https://app.ticketmaster.com/discovery/v2/events.json"
-        params = {"apikey": TICKETMASTER_API_KEY, "city": city, "classificationName": "sports", "size": 5}
-        async with httpx.AsyncClient(timeout=20) as client:
-            er = await client.get(e_url, params=params)
-            if er.status_code == 200:
-                events = er.json()
-
-    weather_snip = weather or {}
-    event_snip = events or {}
-    prompt = f"""
-You are an elite sports coach. Propose a tailored {sport} plan for TODAY given:
-- Weather (OpenWeather JSON): {weather_snip}
-- Nearby sports events (Ticketmaster JSON, optional): {event_snip}
+    sport = sport or plans.DEFAULT_SPORT
+    day = plans.today()
+    await plans.remember(db, user_id, lat, lon, city, sport)
+    # usually generated by the nightly run (python -m app.plans run)
+    stored = await plans.stored_plan(db, user_id, day, sport, lat, lon)
+    if stored is not None:
+        plans.plans_served_total.inc(source="stored")
+        return plans.response(stored)
 
-Output:
-1) Brief 1-sentence overview.
-2) Warm-up (minutes + drills).
-3) Main set (intervals/effort with HR or RPE).
-4) Technique focus cues (short imperatives).
-5) Safety notes for weather.
-6) If outdoors is poor, give an indoor alternative.
-7) 3 short exercise ideas to try this week related to local events (if any).
-"""
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.6,
-    )
-    text = resp.choices[0].message.content
-    return {"recommendations": text, "weather": weather, "events": events}
+    if not plans.llm_configured():
+        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not configured")
+    weather, events = await plans.lookups(lat, lon, city)
+    try:
+        # only a miss holds an LLM slot
+        async with llm_calls.slot():
+            plan = await plans.generate(user_id, sport, weather, events)
+    except Rejected as e:
+        raise too_many_requests(e)
+    plans.plans_served_total.inc(source="live")
+    # later opens today are served from the table
+    return plans.response(await plans.save_plan(db, user_id, day, sport, lat, lon, plan, "live"))
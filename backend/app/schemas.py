@@ -1,6 +1,22 @@
 
-from pydantic import BaseModel
-from typing import Optional, List
+from datetime import datetime, timezone
+from pydantic import AfterValidator, BaseModel
+from typing import Annotated, Dict, Generic, Optional, List, TypeVar
+
+T = TypeVar("T")
+
+def _naive_utc(value: datetime) -> datetime:
+    # stored timestamps are naive UTC (server defaults use utcnow)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+# client timestamps with an offset ("2024-01-01T10:00:00+02:00") become naive UTC
+UtcDatetime = Annotated[datetime, AfterValidator(_naive_utc)]
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
 
 class GoalCreate(BaseModel):
     title: str
@@ -10,17 +26,20 @@ class GoalOut(BaseModel):
     id: int
     title: str
     target_date: Optional[str] = None
+    created_at: Optional[datetime] = None
     class Config:
         from_attributes = True
 
 class MilestoneCreate(BaseModel):
     goal_id: int
     note: str
+    created_at: Optional[UtcDatetime] = None  # set by offline clients on sync
 
 class MilestoneOut(BaseModel):
     id: int
     goal_id: int
     note: str
+    created_at: Optional[datetime] = None
     class Config:
         from_attributes = True
 
@@ -29,6 +48,7 @@ class DiaryCreate(BaseModel):
     mood: Optional[str] = None
     fatigue: Optional[int] = None
     sleep_hours: Optional[float] = None
+    created_at: Optional[UtcDatetime] = None  # set by offline clients on sync
 
 class DiaryOut(BaseModel):
     id: int
@@ -36,5 +56,44 @@ class DiaryOut(BaseModel):
     mood: Optional[str] = None
     fatigue: Optional[int] = None
     sleep_hours: Optional[float] = None
+    created_at: Optional[datetime] = None
     class Config:
         from_attributes = True
+
+class BulkResult(BaseModel):
+    count: int
+    ids: List[int]
+
+class WorkoutSessionOut(BaseModel):
+    id: int
+    exercise: str
+    started_at: datetime
+    duration_s: float
+    frames: int
+    reps: Optional[int] = None
+    rom: Optional[float] = None
+    symmetry: Optional[float] = None
+    main_angle: Optional[str] = None
+    class Config:
+        from_attributes = True
+
+class WorkoutSessionDetail(WorkoutSessionOut):
+    stats: Dict[str, Dict[str, float]]
+    stream_bytes: int
+    t_ms: Optional[List[int]] = None
+    series: Optional[Dict[str, List[Optional[float]]]] = None
+
+class ProgressPoint(BaseModel):
+    id: int
+    started_at: datetime
+    reps: Optional[int] = None
+    rom: Optional[float] = None
+    symmetry: Optional[float] = None
+
+class Progress(BaseModel):
+    exercise: str
+    sessions: List[ProgressPoint]
+    best_rom: Optional[float] = None
+    rom_per_week: Optional[float] = None
+    symmetry_per_week: Optional[float] = None
+    reps_per_week: Optional[float] = None
@@ -0,0 +1,153 @@
+# Request/response encoding for the REST routers.
+#
+# - JSON goes through orjson (FastAPI's ORJSONResponse) when it is installed,
+#   the stdlib encoder otherwise.
+# - Bulk diary/health endpoints also speak MessagePack: send it with
+#   Content-Type: application/msgpack, ask for it with Accept: application/msgpack
+#   (needs `pip install msgpack`; without it everything stays JSON).
+# - Large bodies are compressed: brotli when installed and accepted, gzip otherwise.
+# - List endpoints build their items straight from the ORM rows (`rows`) instead
+#   of validating every row through the response model; the model still
+#   documents the schema in OpenAPI.
+
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Iterable, List, Optional, Type
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # optional: no MessagePack negotiation
+    msgpack = None
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+load_dotenv()
+
+# Bodies smaller than this are sent uncompressed (bytes)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# gzip level 6 / brotli quality 4: most of the size win for a fraction of the CPU of the maximum levels
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+DECODE_ERRORS = (ValueError, msgpack.UnpackException) if msgpack is not None else (ValueError,)
+
+
+def _default(value: Any) -> Any:
+    # the same wire format as the JSON responses
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class _StdJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+JSONResponseClass = ORJSONResponse if orjson is not None else _StdJSONResponse
+
+
+class MsgPackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def wants_msgpack(request: Request) -> bool:
+    return msgpack is not None and any(t in request.headers.get("accept", "") for t in MSGPACK_TYPES)
+
+
+def respond(request: Request, content: Any, status_code: int = 200) -> Response:
+    """`content` (plain dicts/lists, datetimes allowed) as MessagePack or JSON, whichever the client accepts."""
+    if wants_msgpack(request):
+        response = MsgPackResponse(content, status_code=status_code)
+    else:
+        response = JSONResponseClass(content, status_code=status_code)
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+async def read_body(request: Request) -> Any:
+    """Request body as Python objects, from MessagePack or JSON by Content-Type."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith(MSGPACK_TYPES):
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="MessagePack support is not installed")
+            return msgpack.unpackb(body, raw=False)
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+    except DECODE_ERRORS as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {e}")
+
+
+def rows(items: Iterable[Any], schema: Type[BaseModel]) -> List[dict]:
+    """ORM rows -> dicts with the fields of `schema`, without per-row validation (the rows come from our own tables)."""
+    fields = list(schema.model_fields)
+    return [{field: getattr(item, field) for field in fields} for item in items]
+
+
+def page(request: Request, result: dict, schema: Type[BaseModel]) -> Response:
+    """A `paginate` result as a Page[schema] body."""
+    return respond(request, {"items": rows(result["items"], schema), "next_cursor": result["next_cursor"]})
+
+
+class CompressionMiddleware:
+    """
+    Starlette's GZipMiddleware, plus brotli for clients that accept it when the
+    `brotli` package is installed. Streamed bodies (NDJSON, audio) are left as
+    they are for brotli clients, since brotli here compresses whole bodies only.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=GZIP_LEVEL)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or brotli is None or "br" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.gzip(scope, receive, send)
+            return
+        start: Optional[Message] = None
+
+        async def send_brotli(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if not (message.get("more_body") or len(body) < self.minimum_size or "content-encoding" in headers):
+                body = brotli.compress(body, quality=BROTLI_QUALITY)
+                headers["Content-Encoding"] = "br"
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "body": body}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_brotli)
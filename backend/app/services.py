@@ -0,0 +1,114 @@
+import hashlib
+import os
+import random
+import subprocess
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ServiceRegistry:
+    """
+    Lazily built singletons (pose model, TTS/LLM clients, local processes).
+
+    Nothing is constructed at import time: the first `get(name)` builds the
+    service, later calls return the same instance. Workers that never handle
+    video never load MediaPipe.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._closers: Dict[str, Optional[Callable[[Any], None]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], None]] = None) -> None:
+        self._factories[name] = factory
+        self._closers[name] = close
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = self._factories[name]()
+                    self._instances[name] = instance
+        return instance
+
+    def loaded(self) -> list:
+        return list(self._instances)
+
+    def close(self) -> None:
+        for name, instance in list(self._instances.items()):
+            closer = self._closers.get(name)
+            try:
+                if closer is not None:
+                    closer(instance)
+            except Exception as e:
+                print(f"Error cerrando {name}: {e}")
+            self._instances.pop(name, None)
+
+
+def _pose():
+    import mediapipe as mp
+    return mp.solutions.pose.Pose()
+
+
+def _tts():
+    from elevenlabs import ElevenLabs
+    return ElevenLabs(api_key=os.getenv("ELEVENLABS_API_KEY"))
+
+
+class StubLLM:
+    """
+    Local stand-in for the OpenAI client (LLM_PROVIDER=stub): canned text after
+    LLM_STUB_LATENCY_MS, failing a LLM_STUB_FAILURE_RATE fraction of calls.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str = "", messages: Optional[list] = None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("stub LLM failure")
+        prompt = (messages or [{}])[-1].get("content", "")
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        content = f"[stub {model} {digest}] Warm-up 10 min easy, 5x3 min at RPE 7 with 2 min jog, cool down 10 min."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def close(self):
+        pass
+
+
+def _openai():
+    if os.getenv("LLM_PROVIDER", "openai") == "stub":
+        return StubLLM(float(os.getenv("LLM_STUB_LATENCY_MS", "0")), float(os.getenv("LLM_STUB_FAILURE_RATE", "0")))
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
+
+
+def _ollama():
+    return subprocess.Popen(
+        ['ollama', 'run', 'llama2'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+
+
+services = ServiceRegistry()
+services.register("pose", _pose, close=lambda pose: pose.close())
+services.register("tts", _tts)
+services.register("openai", _openai, close=lambda client: client.close())
+services.register("ollama", _ollama, close=lambda process: process.terminate())
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# memory://                 per-process (single worker, default)
+# sqlite:///./state.db      shared by every worker on one machine
+# redis://host:6379/0       shared across machines (needs the `redis` package)
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "memory://")
+# Seconds an idle /ws/video session stays resumable
+SESSION_TTL = int(os.getenv("SESSION_TTL", "600"))
+
+
+class MemoryState:
+    """Dict-backed store; values never leave the process."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def _put(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    async def get(self, key: str) -> Any:
+        item = self._live(key)
+        return item[0] if item else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._put(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: float = 1, ttl: Optional[float] = None) -> float:
+        item = self._live(key)
+        if item is None:
+            self._put(key, amount, ttl)
+            return amount
+        value = item[0] + amount
+        self._data[key] = (value, item[1])
+        return value
+
+    async def append(self, key: str, items: List[Any], ttl: Optional[float] = None) -> None:
+        item = self._live(key)
+        if item is None:
+            self._put(key, list(items), ttl)
+        else:
+            item[0].extend(items)
+            if ttl:
+                self._data[key] = (item[0], time.time() + ttl)
+
+    async def items(self, key: str) -> List[Any]:
+        item = self._live(key)
+        return list(item[0]) if item else []
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class SQLiteState:
+    """
+    Key/value + list store in a WAL-mode SQLite file, for several workers on one host.
+
+    Calls run in a thread so the event loop never waits on the file lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = asyncio.Lock()
+        conn = self._connect()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL);"
+            "CREATE TABLE IF NOT EXISTS list_items (key TEXT NOT NULL, value TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_list_items_key ON list_items (key);"
+        )
+        self._conn = conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    async def _run(self, fn, *args):
+        # one connection per store; the lock serialises the threads using it
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    @contextmanager
+    def _tx(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _expires(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def _get(self, key: str):
+        row = self._conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self._conn.execute(
+            "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+            (key, json.dumps(value), self._expires(ttl)),
+        )
+
+    def _delete(self, key: str) -> None:
+        with self._tx():
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM list_items WHERE key = ?", (key,))
+
+    def _incr(self, key: str, amount: float, ttl: Optional[float]) -> float:
+        now = time.time()
+        with self._tx():
+            self._conn.execute("DELETE FROM kv WHERE key = ? AND expires <= ?", (key, now))
+            row = self._conn.execute(
+                "INSERT INTO kv (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS REAL) + excluded.value "
+                "RETURNING value",
+                (key, json.dumps(amount), self._expires(ttl)),
+            ).fetchone()
+        return float(row[0])
+
+    def _append(self, key: str, items: List[Any], ttl: Optional[float]) -> None:
+        now = time.time()
+        with self._tx():
+            expired = self._conn.execute("DELETE FROM kv WHERE key = ? AND expires <= ?", (key, now)).rowcount
+            if expired:
+                self._conn.execute("DELETE FROM list_items WHERE key = ?", (key,))
+            # the kv row carries the list's expiry
+            self._conn.execute(
+                "INSERT INTO kv (key, value, expires) VALUES (?, 'null', ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires = excluded.expires",
+                (key, self._expires(ttl)),
+            )
+            self._conn.executemany(
+                "INSERT INTO list_items (key, value) VALUES (?, ?)", [(key, json.dumps(i)) for i in items]
+            )
+
+    def _items(self, key: str) -> List[Any]:
+        alive = self._conn.execute(
+            "SELECT 1 FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        if not alive:
+            return []
+        rows = self._conn.execute("SELECT value FROM list_items WHERE key = ? ORDER BY rowid", (key,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def _purge(self) -> None:
+        with self._tx():
+            now = time.time()
+            self._conn.execute(
+                "DELETE FROM list_items WHERE key IN (SELECT key FROM kv WHERE expires <= ?)", (now,)
+            )
+            self._conn.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+
+    async def get(self, key: str) -> Any:
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._run(self._set, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._delete, key)
+
+    async def incr(self, key: str, amount: float = 1, ttl: Optional[float] = None) -> float:
+        return await self._run(self._incr, key, amount, ttl)
+
+    async def append(self, key: str, items: List[Any], ttl: Optional[float] = None) -> None:
+        if items:
+            await self._run(self._append, key, items, ttl)
+
+    async def items(self, key: str) -> List[Any]:
+        return await self._run(self._items, key)
+
+    async def close(self) -> None:
+        await self._run(self._purge)
+        self._conn.close()
+
+
+class RedisState:
+    """Redis (or any RESP-compatible server such as Valkey/KeyDB) for multi-host deployments."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND_URL=redis://... requires `pip install redis`") from e
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Any:
+        raw = await self._redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._redis.set(key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+    async def incr(self, key: str, amount: float = 1, ttl: Optional[float] = None) -> float:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incrbyfloat(key, amount)
+            if ttl:
+                # only sets the expiry on the first increment of the window
+                pipe.expire(key, int(ttl), nx=True)
+            value, *_ = await pipe.execute()
+        return float(value)
+
+    async def append(self, key: str, items: List[Any], ttl: Optional[float] = None) -> None:
+        if not items:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *(json.dumps(i) for i in items))
+            if ttl:
+                pipe.expire(key, int(ttl))
+            await pipe.execute()
+
+    async def items(self, key: str) -> List[Any]:
+        return [json.loads(raw) for raw in await self._redis.lrange(key, 0, -1)]
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+_state = None
+
+
+def create_state(url: str):
+    if url.startswith("memory://"):
+        return MemoryState()
+    if url.startswith("sqlite:///"):
+        return SQLiteState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url)
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
+
+
+def get_state():
+    """Process-wide store selected by STATE_BACKEND_URL."""
+    global _state
+    if _state is None:
+        _state = create_state(STATE_BACKEND_URL)
+    return _state
+
+
+async def close_state() -> None:
+    global _state
+    if _state is not None:
+        await _state.close()
+    _state = None
@@ -0,0 +1,214 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import aiohttp
+from fastapi import WebSocket
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ELEVENLABS_WS_URL = os.getenv("ELEVENLABS_WS_URL", "wss://api.elevenlabs.io/v1/stream")
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
+
+# Max chunks buffered per direction before the policy kicks in
+VOICE_RELAY_QUEUE_SIZE = int(os.getenv("VOICE_RELAY_QUEUE_SIZE", "64"))
+# "drop_oldest": keep audio fresh under congestion, "block": backpressure the sender
+VOICE_RELAY_POLICY = os.getenv("VOICE_RELAY_POLICY", "drop_oldest")
+# Seconds to keep sending queued audio to the client after the upstream finishes
+VOICE_RELAY_DRAIN_S = float(os.getenv("VOICE_RELAY_DRAIN_S", "5"))
+
+_session: Optional[aiohttp.ClientSession] = None
+_active: Dict[int, "VoiceRelay"] = {}
+_next_id = 0
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Shared upstream session; one connection pool for every voice relay."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=None, connect=10),
+        )
+    return _session
+
+
+async def close_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+@dataclass
+class DirectionStats:
+    messages: int = 0
+    bytes: int = 0
+    dropped: int = 0
+    max_depth: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+    def snapshot(self, elapsed: float, depth: int) -> dict:
+        return {
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "bytes_per_s": round(self.bytes / elapsed, 1) if elapsed > 0 else 0.0,
+            "dropped": self.dropped,
+            "queue_depth": depth,
+            "max_queue_depth": self.max_depth,
+            "avg_latency_ms": round(1000 * self.latency_total / self.messages, 3) if self.messages else 0.0,
+            "max_latency_ms": round(1000 * self.latency_max, 3),
+        }
+
+
+@dataclass
+class RelayStats:
+    started_at: float = field(default_factory=time.monotonic)
+    to_upstream: DirectionStats = field(default_factory=DirectionStats)
+    to_client: DirectionStats = field(default_factory=DirectionStats)
+
+
+class VoiceRelay:
+    """
+    Relays a client WebSocket to the ElevenLabs stream through two bounded queues.
+
+    Each direction has a reader and a writer task; when any of the four ends
+    (either side closed or errored) the rest are cancelled, so no task outlives
+    the connection. When the upstream ends its reply normally, the audio still
+    queued for the client is delivered first (for up to VOICE_RELAY_DRAIN_S).
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        url: str = ELEVENLABS_WS_URL,
+        queue_size: int = VOICE_RELAY_QUEUE_SIZE,
+        policy: str = VOICE_RELAY_POLICY,
+    ):
+        global _next_id
+        _next_id += 1
+        self.id = _next_id
+        self.websocket = websocket
+        self.url = url
+        self.policy = policy
+        self.to_upstream: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.to_client: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = RelayStats()
+
+    async def run(self) -> None:
+        _active[self.id] = self
+        try:
+            async with get_session().ws_connect(
+                self.url, headers={"xi-api-key": ELEVENLABS_API_KEY}, heartbeat=20
+            ) as upstream:
+                read_upstream = asyncio.create_task(self._read_upstream(upstream))
+                write_client = asyncio.create_task(self._write_client())
+                tasks = [
+                    asyncio.create_task(self._read_client()),
+                    asyncio.create_task(self._write_upstream(upstream)),
+                    read_upstream,
+                    write_client,
+                ]
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                if read_upstream in done and read_upstream.exception() is None and write_client in pending:
+                    # the sentinel ends the writer once everything queued before it is sent
+                    drain = asyncio.create_task(self._drain_client(write_client))
+                    await asyncio.wait([drain], timeout=VOICE_RELAY_DRAIN_S)
+                    drain.cancel()
+                    await asyncio.gather(drain, return_exceptions=True)
+                done = {task for task in tasks if task.done()}
+                pending = [task for task in tasks if not task.done()]
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                for task in done:
+                    if not task.cancelled() and task.exception() is not None:
+                        print(f"Voice relay {self.id} cerrado:", task.exception())
+        finally:
+            _active.pop(self.id, None)
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+
+    async def _enqueue(self, queue: asyncio.Queue, stats: DirectionStats, item: tuple) -> None:
+        if self.policy == "block":
+            await queue.put(item)
+        else:
+            if queue.full():
+                queue.get_nowait()
+                stats.dropped += 1
+            queue.put_nowait(item)
+        stats.max_depth = max(stats.max_depth, queue.qsize())
+
+    @staticmethod
+    def _record(stats: DirectionStats, data, enqueued_at: float) -> None:
+        latency = time.monotonic() - enqueued_at
+        stats.messages += 1
+        stats.bytes += len(data)
+        stats.latency_total += latency
+        stats.latency_max = max(stats.latency_max, latency)
+
+    async def _read_client(self) -> None:
+        while True:
+            msg = await self.websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                return
+            data = msg.get("bytes")
+            item = ("bytes", data, time.monotonic()) if data is not None else ("text", msg.get("text") or "", time.monotonic())
+            await self._enqueue(self.to_upstream, self.stats.to_upstream, item)
+
+    async def _write_upstream(self, upstream: aiohttp.ClientWebSocketResponse) -> None:
+        while True:
+            kind, data, enqueued_at = await self.to_upstream.get()
+            if kind == "bytes":
+                await upstream.send_bytes(data)
+            else:
+                await upstream.send_str(data)
+            self._record(self.stats.to_upstream, data, enqueued_at)
+
+    async def _read_upstream(self, upstream: aiohttp.ClientWebSocketResponse) -> None:
+        async for msg in upstream:
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                item = ("bytes", msg.data, time.monotonic())
+            elif msg.type == aiohttp.WSMsgType.TEXT:
+                item = ("text", msg.data, time.monotonic())
+            else:
+                return
+            await self._enqueue(self.to_client, self.stats.to_client, item)
+
+    async def _drain_client(self, writer: asyncio.Task) -> None:
+        await self.to_client.put(None)
+        await writer
+
+    async def _write_client(self) -> None:
+        while True:
+            item = await self.to_client.get()
+            if item is None:
+                return
+            kind, data, enqueued_at = item
+            if kind == "bytes":
+                await self.websocket.send_bytes(data)
+            else:
+                await self.websocket.send_text(data)
+            self._record(self.stats.to_client, data, enqueued_at)
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.stats.started_at
+        return {
+            "id": self.id,
+            "uptime_s": round(elapsed, 1),
+            "to_upstream": self.stats.to_upstream.snapshot(elapsed, self.to_upstream.qsize()),
+            "to_client": self.stats.to_client.snapshot(elapsed, self.to_client.qsize()),
+        }
+
+
+def relay_stats() -> dict:
+    return {
+        "active": len(_active),
+        "connections": [relay.snapshot() for relay in list(_active.values())],
+    }
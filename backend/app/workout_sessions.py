@@ -0,0 +1,189 @@
+# Persistent pose sessions: the per-frame angle/symmetry stream of each
+# workout plus a summary row that progress queries read without the stream.
+#
+# Stream format (one blob per session), zlib-compressed:
+#   header    magic, frames, columns, first timestamp (epoch ms)
+#   dt        int32 ms between frames
+#   valid     bit-packed mask of which (column, frame) values exist
+#   values    int16 deltas of 0.1-degree fixed point, column-major; gaps
+#             repeat the previous value so they delta-encode to zero
+# Angles already come rounded to 0.1 degree, so the encoding is lossless.
+
+import asyncio
+import json
+import struct
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from . import models
+from .db import AsyncSessionLocal
+
+MAGIC = b"WSF1"
+HEADER = struct.Struct("<4sIIq")
+SCALE = 10  # fixed point: 0.1 degree
+LIMIT = 3000  # |value| <= 300 degrees keeps every delta inside int16
+
+
+def encode_features(t_ms: np.ndarray, features: np.ndarray) -> bytes:
+    """(n,) epoch ms and (n, columns) degrees with NaN gaps -> compact blob."""
+    n, c = features.shape
+    q = np.clip(np.round(features * SCALE), -LIMIT, LIMIT)
+    valid = ~np.isnan(q)
+    # forward-fill each column: gaps then cost a zero delta
+    last = np.where(valid, np.arange(n)[:, None], 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    filled = np.nan_to_num(q[last, np.arange(c)]).astype(np.int32)
+    deltas = np.diff(filled, axis=0, prepend=np.zeros((1, c), np.int32)).astype("<i2")
+    t_ms = np.asarray(t_ms, dtype=np.int64)
+    t0 = int(t_ms[0]) if n else 0
+    dt = np.diff(t_ms, prepend=t0).astype("<i4")
+    payload = b"".join((
+        HEADER.pack(MAGIC, n, c, t0),
+        dt.tobytes(),
+        np.packbits(valid.T).tobytes(),
+        deltas.T.tobytes(),
+    ))
+    return zlib.compress(payload, 9)
+
+
+def decode_features(blob: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of encode_features: (epoch ms int64, float32 degrees with NaN gaps)."""
+    payload = zlib.decompress(blob)
+    magic, n, c, t0 = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a workout session stream")
+    offset = HEADER.size
+    dt = np.frombuffer(payload, "<i4", n, offset)
+    offset += 4 * n
+    mask_bytes = (n * c + 7) // 8
+    valid = np.unpackbits(np.frombuffer(payload, np.uint8, mask_bytes, offset), count=n * c).reshape(c, n).T.astype(bool)
+    offset += mask_bytes
+    deltas = np.frombuffer(payload, "<i2", n * c, offset).reshape(c, n).T
+    t_ms = t0 + np.cumsum(dt, dtype=np.int64)
+    features = np.cumsum(deltas, axis=0, dtype=np.int32).astype(np.float32) / SCALE
+    features[~valid] = np.nan
+    return t_ms, features
+
+
+def from_history(history: Sequence[Dict[str, Any]], columns: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """/ws/video history entries ({timestamp, angulos, simetrias}) -> arrays in `columns` order."""
+    t_ms = np.array([round(h["timestamp"] * 1000) for h in history], dtype=np.int64)
+    features = np.full((len(history), len(columns)), np.nan, dtype=np.float32)
+    index = {name: j for j, name in enumerate(columns)}
+    for i, h in enumerate(history):
+        for values in (h.get("angulos") or {}, h.get("simetrias") or {}):
+            for name, value in values.items():
+                j = index.get(name)
+                if j is not None and value is not None:
+                    features[i, j] = value
+    return t_ms, features
+
+
+def summarize(t_ms: np.ndarray, features: np.ndarray, columns: Sequence[str], exercise: Optional[str]) -> Dict[str, Any]:
+    """
+    Per-column stats and the headline numbers stored next to the stream.
+
+    ROM is the 5th-95th percentile spread, so a single bad frame can't inflate
+    it. Symmetry is the tilt of the shoulder/hip/... line from level, in degrees
+    (0 = level), whichever way the athlete faces the camera.
+    """
+    from .opencv.profiles import perfil_ejercicio
+    from .opencv.batch import detectar_repeticiones
+
+    perfil = perfil_ejercicio(exercise)
+    stats: Dict[str, Dict[str, float]] = {}
+    for j, name in enumerate(columns):
+        values = features[:, j]
+        values = values[~np.isnan(values)].astype(np.float64)
+        if not len(values):
+            continue
+        if name.startswith("simetria"):
+            tilt = np.minimum(values, 180 - values)
+            stats[name] = {"mean": round(float(tilt.mean()), 1), "p90": round(float(np.percentile(tilt, 90)), 1)}
+        else:
+            low, high = np.percentile(values, [5, 95])
+            stats[name] = {
+                "min": round(float(low), 1), "max": round(float(high), 1),
+                "rom": round(float(high - low), 1), "mean": round(float(values.mean()), 1),
+            }
+
+    main = max((c for c in perfil.angulo_reps if c in stats), key=lambda c: stats[c]["rom"], default=None)
+    tilts = [s["mean"] for name, s in stats.items() if name.startswith("simetria")]
+    reps = None
+    if list(columns) == list(perfil.columnas) and len(t_ms):
+        reps = len(detectar_repeticiones((t_ms - t_ms[0]) / 1000.0, features, perfil.nombre)["repeticiones"])
+    return {
+        "main_angle": main,
+        "rom": stats[main]["rom"] if main else None,
+        "symmetry": round(float(np.mean(tilts)), 1) if tilts else None,
+        "reps": reps,
+        "duration_s": round(float(t_ms[-1] - t_ms[0]) / 1000, 1) if len(t_ms) else 0.0,
+        "frames": int(len(t_ms)),
+        "stats": stats,
+    }
+
+
+def build_session(
+    user_id: str, exercise: Optional[str], history: Sequence[Dict[str, Any]], session_key: Optional[str] = None
+) -> models.WorkoutSession:
+    """A WorkoutSession row (not yet added to any db session) from a pose history."""
+    from .opencv.profiles import perfil_ejercicio
+
+    perfil = perfil_ejercicio(exercise)
+    columns = list(perfil.columnas)
+    t_ms, features = from_history(history, columns)
+    summary = summarize(t_ms, features, columns, exercise)
+    return models.WorkoutSession(
+        user_id=user_id,
+        session_key=session_key,
+        exercise=perfil.nombre,
+        started_at=datetime.utcfromtimestamp(t_ms[0] / 1000) if len(t_ms) else datetime.utcnow(),
+        duration_s=summary["duration_s"],
+        frames=summary["frames"],
+        reps=summary["reps"],
+        rom=summary["rom"],
+        symmetry=summary["symmetry"],
+        main_angle=summary["main_angle"],
+        stats=json.dumps(summary["stats"]),
+        columns=json.dumps(columns),
+        features=encode_features(t_ms, features),
+    )
+
+
+async def save_session(
+    user_id: str, exercise: Optional[str], history: Sequence[Dict[str, Any]], session_key: Optional[str] = None
+) -> int:
+    """
+    Encodes and stores a session; with `session_key` an existing row for the
+    same key is overwritten, so a resumed /ws/video session keeps one row.
+    """
+    built = await asyncio.to_thread(build_session, user_id, exercise, history, session_key)
+    async with AsyncSessionLocal() as db:
+        row = None
+        if session_key:
+            row = await db.scalar(select(models.WorkoutSession).where(
+                models.WorkoutSession.user_id == user_id, models.WorkoutSession.session_key == session_key
+            ))
+        if row is None:
+            db.add(built)
+            row = built
+        else:
+            for column in models.WorkoutSession.__table__.columns:
+                if column.name not in ("id", "created_at"):
+                    setattr(row, column.name, getattr(built, column.name))
+        await db.commit()
+        return row.id
+
+
+def trend(points: List[Dict[str, Any]], field: str) -> Optional[float]:
+    """Least-squares slope of `field` per week across sessions (None with < 2 points)."""
+    xs = [p["started_at"].timestamp() / (7 * 86400) for p in points if p.get(field) is not None]
+    ys = [p[field] for p in points if p.get(field) is not None]
+    if len(xs) < 2 or max(xs) == min(xs):
+        return None
+    slope = np.polyfit(np.array(xs) - xs[0], np.array(ys, dtype=np.float64), 1)[0]
+    return round(float(slope), 2) + 0.0  # no "-0.0"
@@ -0,0 +1,125 @@
+"""
+REST throughput/latency, in-process over ASGI with the LLM, TTS and weather
+upstreams replaced by local stubs and a throwaway SQLite database.
+
+    python -m benchmarks.bench_api [--requests 500] [--concurrency 16] [--llm-latency-ms 0]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from .common import emit, environment, peak_rss_mb, percentiles
+
+
+class StubOpenAI:
+    """Just enough of the OpenAI client for suggest_exercises."""
+
+    def __init__(self, latency: float):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.latency = latency
+
+    def _create(self, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        message = SimpleNamespace(content="Warm-up 10 min, 5x3 min at RPE 7, cool down.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def close(self):
+        pass
+
+
+def install_stubs(llm_latency: float):
+    import httpx
+    from app.services import services
+    from app import plans
+
+    services.register("openai", lambda: StubOpenAI(llm_latency))
+    services.register("tts", lambda: SimpleNamespace(text_to_speech=SimpleNamespace(convert=lambda **kw: b"\0" * 1024)))
+
+    weather = {"weather": [{"main": "Clear"}], "main": {"temp": 18.5}}
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=weather))
+    real_client = httpx.AsyncClient
+    plans.httpx = SimpleNamespace(AsyncClient=lambda **kw: real_client(transport=transport, **kw))
+    plans.OPENAI_API_KEY = "stub"
+    plans.OPENWEATHER_API_KEY = "stub"
+
+
+async def run_scenario(client, method: str, url: str, total: int, concurrency: int, body=None) -> dict:
+    latencies, errors = [], 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in counter:
+            start = time.perf_counter()
+            r = await client.request(method, url, json=body, headers={"X-User-Id": "bench"})
+            latencies.append(time.perf_counter() - start)
+            if r.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "method": method,
+        "url": url,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_s": round(total / elapsed, 1),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.main import app
+
+    install_stubs(args.llm_latency_ms / 1000)
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport doesn't send lifespan events; run startup (init_db) and shutdown here
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # seed history so list endpoints page over a realistic table
+        seed = [{"note": f"entry {i}", "fatigue": i % 10 + 1, "sleep_hours": 7.5} for i in range(1000)]
+        for i in range(0, args.seed_entries, 1000):
+            await client.post("/api/diary/entries/bulk", json=seed[: min(1000, args.seed_entries - i)], headers={"X-User-Id": "bench"})
+
+        scenarios = [
+            ("GET", "/api/health", None),
+            ("POST", "/api/diary/entries", {"note": "bench", "fatigue": 5, "sleep_hours": 7}),
+            ("GET", "/api/diary/entries?limit=50", None),
+            ("GET", "/api/analytics/training-load", None),
+            # the first request generates today's plan, the rest are served from daily_plans
+            ("GET", "/api/suggest/exercises?lat=40.4&lon=-3.7", None),
+        ]
+        results = []
+        for method, url, body in scenarios:
+            await run_scenario(client, method, url, min(20, args.requests), args.concurrency, body)  # warm-up
+            results.append(await run_scenario(client, method, url, args.requests, args.concurrency, body))
+    return {"suite": "api", "env": environment(), "seed_entries": args.seed_entries, "routes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed-entries", type=int, default=5000)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM latency")
+    parser.add_argument("-o", "--output")
+    args = parser.parse_args()
+
+    # must be set before app.db is imported
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="api-bench-"), "bench.db")
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    # measure handler capacity, not the per-user rate limits (override to benchmark shedding)
+    os.environ.setdefault("ADMISSION_SUGGEST_RATE", "")
+    result = asyncio.run(run(args))
+    result["peak_rss_mb"] = peak_rss_mb()
+    emit(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Apple Health ingest: records/s and peak RSS of AppleHealthXMLProcessor on
+synthetic exports. Each size is parsed in a fresh subprocess so peak RSS is
+measured per run. --zip also packs each export like the iPhone does and
+measures streaming ingest straight from the archive.
+
+    python -m benchmarks.bench_ingest [--sizes 10MB,100MB,1GB] [--seed 0] [--workdir DIR] [--zip]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from app.apple_health.synthetic_export import SyntheticExportGenerator, parse_size
+
+from .common import BACKEND_DIR, emit, environment, peak_rss_mb
+
+
+def parse_worker(path: str) -> dict:
+    """Runs in the child process: parse one file and report timing and memory."""
+    from app.apple_health.xml_preprocess import AppleHealthXMLProcessor
+
+    processor = AppleHealthXMLProcessor()
+    start = time.perf_counter()
+    processor.parse_export(path)
+    elapsed = time.perf_counter() - start
+    processor.close()
+    records = len(processor.health_data["records"])
+    return {"records": records, "seconds": round(elapsed, 3), "peak_rss_mb": peak_rss_mb()}
+
+
+def pack_zip(xml_path: str) -> str:
+    zip_path = os.path.splitext(xml_path)[0] + ".zip"
+    if not os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(xml_path, "apple_health_export/export.xml")
+    return zip_path
+
+
+def bench_file(path: str) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_ingest", "--parse", path],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    stats = json.loads(proc.stdout.strip().splitlines()[-1])
+    file_mb = os.path.getsize(path) / (1024 * 1024)
+    return {
+        "file_mb": round(file_mb, 1),
+        **stats,
+        "records_per_s": round(stats["records"] / stats["seconds"], 1) if stats["seconds"] else None,
+        "mb_per_s": round(file_mb / stats["seconds"], 2) if stats["seconds"] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10MB", help="Comma separated export sizes, e.g. 10MB,100MB,2GB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Where synthetic exports are written (reused across runs)")
+    parser.add_argument("--zip", action="store_true", help="Also benchmark ingest from export.zip")
+    parser.add_argument("--parse", help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output")
+    args = parser.parse_args()
+
+    if args.parse:
+        # parsing output goes to stderr so stdout only carries the JSON line
+        real_stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            stats = parse_worker(args.parse)
+        finally:
+            sys.stdout = real_stdout
+        print(json.dumps(stats))
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="health-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    runs = []
+    for text in args.sizes.split(","):
+        size = parse_size(text)
+        path = os.path.join(workdir, f"export_{text.strip()}_{args.seed}.xml")
+        if not os.path.exists(path):
+            generator = SyntheticExportGenerator(seed=args.seed)
+            generator.write(path, generator.days_for_size(size))
+        runs.append({"size": text.strip(), "source": "xml", **bench_file(path)})
+        if args.zip:
+            runs.append({"size": text.strip(), "source": "zip", **bench_file(pack_zip(path))})
+    emit({"suite": "ingest", "env": environment(), "seed": args.seed, "runs": runs}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Pose hot paths: procesar_frame on encoded frames, decode+pose over the bundled
+video, and calcular_angulos_corporales / ExerciseProfile.calcular alone.
+
+    python -m benchmarks.bench_pose [--video PATH] [--frames 120]
+"""
+import argparse
+import base64
+import time
+
+import cv2
+
+from .common import DEFAULT_VIDEO, emit, environment, peak_rss_mb
+
+
+def load_frames(video: str, count: int) -> list:
+    """First `count` frames as the data URLs /ws/video receives."""
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        frames.append("data:image/jpeg;base64," + base64.b64encode(jpg.tobytes()).decode())
+    cap.release()
+    return frames
+
+
+def bench_procesar_frame(frames: list) -> dict:
+    from app.opencv.opencv import procesar_frame
+    from app import metrics
+
+    for frame in frames[:5]:
+        procesar_frame(frame)  # model load + warm-up
+    metrics.stage_seconds._series.clear()
+    start = time.perf_counter()
+    for frame in frames:
+        procesar_frame(frame)
+    elapsed = time.perf_counter() - start
+    stages = {
+        dict(key)["stage"]: round(1000 * total / count, 3)
+        for key, (_, total, count) in metrics.stage_seconds._series.items()
+        if count
+    }
+    return {"frames": len(frames), "frames_per_s": round(len(frames) / elapsed, 2), "stage_mean_ms": stages}
+
+
+def bench_video(video: str) -> dict:
+    from app.opencv.profiles import perfil_ejercicio
+    from app.services import services
+
+    pose = services.get("pose")
+    perfil = perfil_ejercicio("curl biceps")
+    cap = cv2.VideoCapture(video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    count = 0
+    start = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if results.pose_landmarks:
+            h, w, _ = frame.shape
+            perfil.calcular(perfil.extraer(results), w, h)
+        count += 1
+    cap.release()
+    elapsed = time.perf_counter() - start
+    return {
+        "video": video,
+        "frames": count,
+        "frames_per_s": round(count / elapsed, 2),
+        "realtime_factor": round((count / fps) / elapsed, 3),
+    }
+
+
+def bench_angles(iterations: int) -> dict:
+    from app.opencv.tools import calcular_angulos_corporales
+
+    posiciones = {
+        "RIGHT_SHOULDER": {"x": 320.0, "y": 200.0}, "RIGHT_ELBOW": {"x": 340.0, "y": 300.0},
+        "RIGHT_WRIST": {"x": 330.0, "y": 390.0}, "RIGHT_HIP": {"x": 315.0, "y": 420.0},
+        "LEFT_SHOULDER": {"x": 220.0, "y": 202.0}, "LEFT_ELBOW": {"x": 200.0, "y": 300.0},
+        "LEFT_WRIST": {"x": 210.0, "y": 392.0}, "LEFT_HIP": {"x": 225.0, "y": 421.0},
+    }
+    start = time.perf_counter()
+    for _ in range(iterations):
+        calcular_angulos_corporales(posiciones)
+    elapsed = time.perf_counter() - start
+    return {"iterations": iterations, "calls_per_s": round(iterations / elapsed, 1)}
+
+
+def bench_profile(iterations: int) -> dict:
+    """ExerciseProfile.calcular on the compiled landmark arrays (curl and squat profiles)."""
+    import numpy as np
+    from app.opencv.profiles import perfil_ejercicio
+
+    rng = np.random.default_rng(0)
+    result = {"iterations": iterations}
+    for ejercicio in ("curl biceps", "sentadilla"):
+        perfil = perfil_ejercicio(ejercicio)
+        puntos = np.column_stack([rng.random((len(perfil.indices), perfil.n_coords)), np.ones(len(perfil.indices))])
+        start = time.perf_counter()
+        for _ in range(iterations):
+            perfil.calcular(puntos, 640, 480)
+        result[ejercicio] = round(iterations / (time.perf_counter() - start), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--frames", type=int, default=120, help="Frames for the procesar_frame benchmark")
+    parser.add_argument("--angle-iterations", type=int, default=20000)
+    parser.add_argument("-o", "--output")
+    args = parser.parse_args()
+
+    result = {
+        "suite": "pose",
+        "env": environment(),
+        "calcular_angulos_corporales": bench_angles(args.angle_iterations),
+        "perfil_calcular_per_s": bench_profile(args.angle_iterations),
+        "procesar_frame": bench_procesar_frame(load_frames(args.video, args.frames)),
+        "video": bench_video(args.video),
+    }
+    result["peak_rss_mb"] = peak_rss_mb()
+    emit(result, args.output)
+
+
+if __name__ == "__main__":
+    main()
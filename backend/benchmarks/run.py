@@ -0,0 +1,44 @@
+"""
+Runs the benchmark suites, each in its own process, and writes one JSON file.
+
+    cd backend
+    python -m benchmarks.run --suites pose,ingest,api -o bench.json
+    python -m benchmarks.run --suites ingest --ingest-args "--sizes 10MB,1GB"
+"""
+import argparse
+import json
+import shlex
+import subprocess
+import sys
+
+from .common import BACKEND_DIR, emit, environment
+
+SUITES = {"pose": "benchmarks.bench_pose", "ingest": "benchmarks.bench_ingest", "api": "benchmarks.bench_api"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", default=",".join(SUITES))
+    parser.add_argument("-o", "--output")
+    for name in SUITES:
+        parser.add_argument(f"--{name}-args", default="", help=f"Extra arguments for the {name} suite")
+    args = parser.parse_args()
+
+    results = {"env": environment(), "suites": {}}
+    for name in args.suites.split(","):
+        name = name.strip()
+        extra = shlex.split(getattr(args, f"{name}_args"))
+        proc = subprocess.run(
+            [sys.executable, "-m", SUITES[name], *extra], cwd=BACKEND_DIR, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            results["suites"][name] = {"error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+            continue
+        # suites print their JSON document last; anything before it is library noise
+        out = proc.stdout
+        results["suites"][name] = json.loads(out[out.index("{\n"):])
+    emit(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+import pytest
+
+# before any app module reads its settings
+_tmp = tempfile.mkdtemp(prefix="coach-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/coach.db"
+os.environ.setdefault("STATE_BACKEND_URL", "memory://")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
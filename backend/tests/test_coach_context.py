@@ -0,0 +1,34 @@
+import asyncio
+
+from app import coach_context, models
+from app.db import AsyncSessionLocal, init_db
+
+
+async def _add_entry(user_id, note):
+    async with AsyncSessionLocal() as db:
+        entry = models.DiaryEntry(user_id=user_id, note=note)
+        db.add(entry)
+        await db.commit()
+        await coach_context.add_diary_entries(user_id, [entry], None)
+
+
+def test_rebuild_racing_a_write_is_not_cached(monkeypatch):
+    user = "ctx-race"
+    build = coach_context.build
+
+    async def slow_build(db, user_id):
+        context = await build(db, user_id)
+        await _add_entry(user_id, "written during the rebuild")  # commits after the queries ran
+        return context
+
+    async def main():
+        init_db()
+        await _add_entry(user, "first")
+        monkeypatch.setattr(coach_context, "build", slow_build)
+        stale = await coach_context.get_context(user)
+        monkeypatch.setattr(coach_context, "build", build)
+        return stale, await coach_context.get_context(user)
+
+    stale, fresh = asyncio.run(main())
+    assert [e["note"] for e in stale["diary"]] == ["first"]
+    assert [e["note"] for e in fresh["diary"]] == ["written during the rebuild", "first"]
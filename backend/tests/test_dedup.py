@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from app.apple_health.dedup import deduplicate, resolve_overlaps
+
+
+def _brute_force(samples, additive):
+    """O(n^2) reference: coverage of every lower rank, merged, intersected with each sample."""
+    kept = []
+    for pos, (start, end, rank) in enumerate(samples):
+        covering = sorted((s, e) for s, e, r in samples if r < rank)
+        union = []
+        for s, e in covering:
+            if union and s <= union[-1][1]:
+                union[-1] = (union[-1][0], max(union[-1][1], e))
+            else:
+                union.append((s, e))
+        if end == start:
+            free = 0.0 if any(s <= start <= e for s, e in union) else 1.0
+        else:
+            covered = sum(max(0.0, min(end, e) - max(start, s)) for s, e in union)
+            free = 1.0 - covered / (end - start)
+        if free >= 1.0 - 1e-9:
+            kept.append((pos, 1.0))
+        elif additive and free > 1e-9:
+            kept.append((pos, free))
+    return kept
+
+
+@pytest.mark.parametrize("additive", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_sweep_matches_brute_force(seed, additive):
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(rng.randint(1, 60)):
+        start = rng.randint(0, 200)
+        samples.append((float(start), float(start + rng.choice([0, 1, 5, 10, 30])), rng.randint(0, 3)))
+    got = resolve_overlaps(samples, additive)
+    expected = _brute_force(samples, additive)
+    assert [pos for pos, _ in got] == [pos for pos, _ in expected]
+    assert all(abs(a - b) < 1e-9 for (_, a), (_, b) in zip(got, expected))
+
+
+def _steps(source, device, start, end, value):
+    return {
+        "type": "step_count", "source_name": source, "device": device, "unit": "count", "value": str(value),
+        "start_date": f"2024-03-01 {start} +0000", "end_date": f"2024-03-01 {end} +0000",
+    }
+
+
+def test_watch_wins_and_iphone_keeps_only_the_uncovered_part():
+    records = [
+        _steps("iPhone", "model:iPhone", "10:00:00", "10:10:00", 1000),
+        {"type": "resting_heart_rate", "value": "50", "start_date": "2024-03-01 07:00:00 +0000", "end_date": ""},
+        _steps("Apple Watch", "model:Watch", "10:00:00", "10:05:00", 600),
+        _steps("iPhone", "model:iPhone", "10:01:00", "10:04:00", 300),
+    ]
+    out = deduplicate(records)
+    steps = [r for r in out if r["type"] == "step_count"]
+    assert [(r["source_name"], r["value"]) for r in steps] == [("iPhone", "500.0"), ("Apple Watch", "600")]
+    assert any(r["type"] == "resting_heart_rate" for r in out)
+
+
+def test_interleaved_types_are_deduplicated_per_type():
+    distance = lambda source, device, value: {**_steps(source, device, "10:00:00", "10:05:00", value), "type": "distance_walking_running", "unit": "km"}
+    records = [
+        _steps("iPhone", "model:iPhone", "10:00:00", "10:05:00", 500),
+        distance("Apple Watch", "model:Watch", 0.4),
+        _steps("Apple Watch", "model:Watch", "10:00:00", "10:05:00", 600),
+        distance("iPhone", "model:iPhone", 0.5),
+    ]
+    out = deduplicate(records)
+    assert [(r["type"], r["source_name"]) for r in out] == [
+        ("step_count", "Apple Watch"), ("distance_walking_running", "Apple Watch"),
+    ]
@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import text
+
+from app.db import engine
+
+
+def _page_all(client, user, limit):
+    ids, cursor = [], None
+    for _ in range(20):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/diary/entries", params=params, headers={"X-User-Id": user}).json()
+        ids += [item["id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    return ids
+
+
+def test_cursor_pages_mix_server_and_client_timestamps(client):
+    user = "pages"
+    # rows stamped by the database default (SQLite CURRENT_TIMESTAMP) and by the app, in the same second
+    with engine.begin() as conn:
+        for i in range(3):
+            conn.execute(text("INSERT INTO diary_entries (user_id, note) VALUES (:u, :n)"), {"u": user, "n": f"sql {i}"})
+    for i in range(3):
+        client.post("/api/diary/entries", json={"note": f"api {i}"}, headers={"X-User-Id": user})
+    for limit in (1, 2, 4):
+        ids = _page_all(client, user, limit)
+        assert len(ids) == 6 and len(set(ids)) == 6
+
+
+def test_bulk_conflict_without_idempotency_key_is_409(client, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    async def conflict(self):
+        raise IntegrityError("INSERT", {}, Exception("conflict"))
+
+    monkeypatch.setattr(AsyncSession, "commit", conflict)
+    response = client.post("/api/diary/entries/bulk", json=[{"note": "x"}], headers={"X-User-Id": "conflict"})
+    assert response.status_code == 409
+
+
+def test_bulk_upload_and_list_as_msgpack(client):
+    msgpack = pytest.importorskip("msgpack")
+    headers = {"X-User-Id": "msgpack", "Content-Type": "application/msgpack", "Accept": "application/msgpack"}
+    body = msgpack.packb([{"note": "packed", "fatigue": 4}, {"note": "twice", "sleep_hours": 7.5}])
+    response = client.post("/api/diary/entries/bulk", content=body, headers=headers)
+    assert response.json()["count"] == 2
+    page = client.get("/api/diary/entries", headers=headers)
+    assert page.headers["content-type"] == "application/msgpack"
+    assert [item["note"] for item in msgpack.unpackb(page.content)["items"]] == ["twice", "packed"]
+
+
+def test_offset_timestamps_are_stored_as_utc(client):
+    headers = {"X-User-Id": "offsets"}
+    client.post("/api/diary/entries", json={"note": "madrid", "created_at": "2024-01-01T10:00:00+02:00"}, headers=headers)
+    client.post("/api/diary/entries/bulk", json=[{"note": "utc", "created_at": "2024-01-01T09:00:00Z"}], headers=headers)
+    client.post("/api/diary/entries", json={"note": "naive", "created_at": "2024-01-01T08:30:00"}, headers=headers)
+    items = client.get("/api/diary/entries", headers=headers).json()["items"]
+    assert [(i["note"], i["created_at"]) for i in items] == [
+        ("utc", "2024-01-01T09:00:00"), ("naive", "2024-01-01T08:30:00"), ("madrid", "2024-01-01T08:00:00"),
+    ]
@@ -0,0 +1,99 @@
+import math
+import random
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.heart_rate import MAX_GAP_MS, HeartRateWindow
+
+
+def _expected(hr_samples, rr_samples, window, last_ms):
+    cutoff = last_ms - window.window_ms
+    hr = [(t, v) for t, v in hr_samples if t > cutoff]
+    rr = [v for t, v in rr_samples if t > cutoff]
+    zones = [0] * 6
+    for (t0, v0), (t1, _) in zip(hr, hr[1:]):
+        zones[window.zone(v0)] += min(t1 - t0, MAX_GAP_MS)
+    diffs = [(b - a) ** 2 for a, b in zip(rr, rr[1:])]
+    return {
+        "mean_hr": round(sum(v for _, v in hr) / len(hr), 1) if hr else None,
+        "peak_hr": max((v for _, v in hr), default=None),
+        "zone_seconds": [round(ms / 1000, 1) for ms in zones],
+        "rmssd_ms": round(math.sqrt(sum(diffs) / len(diffs)), 1) if diffs else None,
+        "samples": len(hr),
+    }
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_running_aggregates_match_brute_force(seed):
+    rng = random.Random(seed)
+    window = HeartRateWindow(seconds=10, max_hr=190)
+    t, hr_samples, rr_samples = 1_000_000, [], []
+    for _ in range(500):
+        t += rng.choice([200, 500, 1000, 3000, 8000])
+        hr = rng.randint(40, 200)
+        assert window.add_hr(t, hr)
+        hr_samples.append((t, hr))
+        if rng.random() < 0.7:
+            rr = rng.randint(300, 1500)
+            assert window.add_rr(t, rr)
+            rr_samples.append((t, rr))
+        snapshot = window.snapshot()
+        expected = _expected(hr_samples, rr_samples, window, t)
+        assert {k: snapshot[k] for k in expected} == expected
+
+
+def test_out_of_order_and_stale_samples_are_rejected():
+    window = HeartRateWindow(seconds=10)
+    assert window.add_hr(100_000, 120)
+    assert not window.add_hr(99_000, 121)  # out of order
+    assert window.add_hr(100_000 + 20_000, 130)
+    assert not window.add_rr(105_000, 800)  # already outside the window
+    assert window.snapshot()["samples"] == 1
+
+
+def test_post_counts_only_kept_samples(client):
+    now = int(time.time() * 1000)
+    body = "\n".join([
+        '{"t": %d, "hr": 120}' % (now - 3_600_000),  # an hour old
+        '{"t": %d, "hr": 125}' % (now - 1000),
+        '{"t": %d, "hr": 130}' % now,
+    ])
+    response = client.post("/api/hr/samples", content=body, headers={"X-User-Id": "hr-post"})
+    assert response.json()["accepted"] == 2 and response.json()["samples"] == 2
+
+
+def test_a_user_id_is_required(client):
+    assert client.post("/api/hr/samples", content='{"hr": 120}').status_code == 400
+    assert client.get("/api/hr/live").status_code == 400
+    with client.websocket_connect("/ws/hr") as ws:
+        with pytest.raises(WebSocketDisconnect) as e:
+            ws.receive_text()
+    assert e.value.code == 1008
+
+
+def test_future_and_implausible_samples_are_rejected():
+    window = HeartRateWindow(seconds=10)
+    now = 1_700_000_000_000
+    assert window.ingest({"t": now + 3_600_000, "hr": 120}, now) == 0  # clock an hour ahead
+    assert window.ingest({"t": now, "hr": 0, "rr": [0, -800, "x", None, float("inf")]}, now) == 0
+    assert window.ingest({"t": now, "hr": 120.0, "rr": [800]}, now) == 2
+    assert window.last_ms == now and window.snapshot()["samples"] == 1
+
+
+def test_idle_sweep_uses_server_time(monkeypatch):
+    from app import heart_rate
+
+    monkeypatch.setattr(heart_rate, "_windows", {})
+    window = heart_rate.get_window("hr-sweep")
+    window.last_ms = 0
+    assert window.ingest_lines([b'{"t": 1000, "hr": 120}']) == 1  # client clock far behind the server
+    monkeypatch.setattr(heart_rate, "_last_sweep", 0.0)
+    assert heart_rate.get_window("hr-sweep") is window
+
+
+def test_binary_frames_are_accepted(client):
+    with client.websocket_connect("/ws/hr", headers={"X-User-Id": "hr-ws"}) as ws:
+        ws.send_bytes(b'{"hr": 120}\n\xff\xfe\n')
+        assert ws.receive_json()["samples"] == 1
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from app import models, plans
+from app.db import AsyncSessionLocal, init_db
+
+DAY = "2030-01-01"
+USERS = [f"plan-{i}" for i in range(5)]
+
+
+def test_batch_retries_and_resumes_where_it_stopped(monkeypatch):
+    calls = []
+    broken = {"plan-3"}
+    flaky = {"plan-1"}
+
+    async def complete(prompt):
+        user = next(u for u in USERS if f"note for {u}" in prompt)
+        calls.append(user)
+        if user in broken or (user in flaky and calls.count(user) == 1):
+            raise RuntimeError("LLM unavailable")
+        return f"plan for {user}"
+
+    monkeypatch.setattr(plans, "complete", complete)
+    monkeypatch.setattr(plans.coach_context, "prompt_snippet", lambda context: context["note"])
+
+    async def get_context(user_id, db=None):
+        return {"note": f"note for {user_id}"}
+
+    monkeypatch.setattr(plans.coach_context, "get_context", get_context)
+
+    async def main():
+        init_db()
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(models.UserPreferences))
+            for user in USERS:
+                db.add(models.UserPreferences(user_id=user, lat=40.4, lon=-3.7, sport="running", last_seen_at=datetime.utcnow()))
+            await db.commit()
+        first = await plans.run_batch(DAY, concurrency=2, retries=1)
+        broken.clear()
+        calls.clear()
+        second = await plans.run_batch(DAY, concurrency=2, retries=1)
+        async with AsyncSessionLocal() as db:
+            stored = (await db.scalars(select(models.DailyPlan.user_id).where(models.DailyPlan.day == DAY))).all()
+        return first, second, stored
+
+    first, second, stored = asyncio.run(main())
+    assert (first["generated"], first["failed"], first["retries"]) == (4, 1, 2)
+    # the second run only generates what the first one didn't store
+    assert (second["skipped"], second["generated"], second["failed"]) == (4, 1, 0)
+    assert calls == ["plan-3"]
+    assert sorted(stored) == USERS
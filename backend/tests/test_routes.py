@@ -0,0 +1,56 @@
+import numpy as np
+
+from app.apple_health.routes import METROS_POR_GRADO, Route, RouteIndex, distancia_a_ruta, simplificar
+
+
+def _route(path, lat, lon):
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    return Route(path, lat, lon, np.zeros(len(lat)), np.arange(len(lat), dtype=np.float64))
+
+
+def _track(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = 40.4 + np.cumsum(rng.normal(0, 2e-5, n))
+    lon = -3.7 + np.cumsum(rng.normal(0, 2e-5, n))
+    return lat, lon
+
+
+def test_simplificar_keeps_every_point_within_tolerance():
+    lat, lon = _track()
+    keep = simplificar(lat, lon, tolerancia_m=5.0)
+    assert keep[0] == 0 and keep[-1] == len(lat) - 1 and len(keep) < len(lat)
+    for i in range(len(lat)):
+        assert distancia_a_ruta(lat[keep], lon[keep], lat[i], lon[i]) <= 5.0 + 1e-6
+
+
+def test_simplificar_straight_line_keeps_endpoints():
+    lat = np.linspace(40.0, 40.018, 200)  # ~2 km north
+    lon = np.full(200, -3.7)
+    assert list(simplificar(lat, lon, 5.0)) == [0, 199]
+
+
+def test_midpoint_of_simplified_straight_track_is_found():
+    index = RouteIndex()
+    index.add(_route("straight", [40.0, 40.018], [-3.7, -3.7]))  # 2 km, two points
+    mid_lat = 40.009
+    offset = 80 / (METROS_POR_GRADO * np.cos(np.radians(mid_lat)))  # 80 m east of the line
+    found = index.near(mid_lat, -3.7 + offset, 100)
+    assert [path for path, _ in found] == ["straight"]
+    assert abs(found[0][1] - 80) < 1
+
+
+def test_index_matches_brute_force():
+    rng = np.random.default_rng(1)
+    routes = []
+    for k in range(30):
+        lat, lon = _track(200, seed=k)
+        lat, lon = lat + rng.uniform(-0.05, 0.05), lon + rng.uniform(-0.05, 0.05)
+        keep = simplificar(lat, lon, 20.0)
+        routes.append(_route(f"r{k}", lat[keep], lon[keep]))
+    index = RouteIndex()
+    for route in routes:
+        index.add(route)
+    for _ in range(50):
+        lat0, lon0, radio = 40.4 + rng.uniform(-0.06, 0.06), -3.7 + rng.uniform(-0.06, 0.06), rng.uniform(50, 3000)
+        expected = sorted(r.path for r in routes if distancia_a_ruta(r.lat, r.lon, lat0, lon0) <= radio)
+        assert sorted(path for path, _ in index.near(lat0, lon0, radio)) == expected
@@ -0,0 +1,90 @@
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+
+from app import models
+from app.analytics import training_load
+from app.db import AsyncSessionLocal
+
+
+def _entries(n=20):
+    start = datetime(2024, 3, 1, 8)
+    return [(start + timedelta(days=i), random.randint(1, 10), random.uniform(5, 9)) for i in range(n)]
+
+
+def test_wellness_means_do_not_depend_on_arrival_order():
+    entries = _entries()
+    in_order = training_load.new_state("a")
+    for created_at, fatigue, sleep in entries:
+        training_load.add_diary_entry(in_order, fatigue, sleep, created_at)
+    shuffled = training_load.new_state("b")
+    for created_at, fatigue, sleep in random.sample(entries, len(entries)):
+        training_load.add_diary_entry(shuffled, fatigue, sleep, created_at)
+    for name in ("fatigue_short", "fatigue_long", "sleep_short", "sleep_long"):
+        assert abs(getattr(in_order, name) - getattr(shuffled, name)) < 1e-9
+
+
+def test_backfilled_entry_weighs_less_than_todays():
+    state = training_load.new_state("a")
+    training_load.add_diary_entry(state, 2, None, date(2024, 3, 10))
+    training_load.add_diary_entry(state, 10, None, date(2024, 3, 1))
+    assert state.fatigue_short < 6
+
+
+HEALTH = {
+    "records": [
+        {"type": "resting_heart_rate", "value": "52", "start_date": "2024-03-01 07:00:00 +0000", "end_date": "2024-03-01 07:00:00 +0000"},
+        {"type": "resting_heart_rate", "value": "55", "start_date": "2024-03-02 07:00:00 +0000", "end_date": "2024-03-02 07:00:00 +0000"},
+    ],
+    "workouts": [
+        {"workout_activity_type": "HKWorkoutActivityTypeRunning", "duration": "40", "duration_unit": "min",
+         "start_date": "2024-03-02 18:00:00 +0000", "end_date": "2024-03-02 18:40:00 +0000"},
+    ],
+}
+
+
+def test_same_export_twice_is_applied_once():
+    state = training_load.new_state("a")
+    assert training_load.apply_health_data(state, HEALTH) == (3, 0)
+    acute, samples = state.acute_load, state.samples
+    assert training_load.apply_health_data(state, HEALTH) == (0, 0)
+    assert (state.acute_load, state.samples) == (acute, samples)
+
+
+def test_concurrent_first_writes_share_one_row():
+    async def write(user_id):
+        async with AsyncSessionLocal() as db:
+            state = await training_load.get_state(db, user_id)
+            training_load.add_load(state, date(2024, 3, 1).toordinal(), 100.0)
+            await db.commit()
+
+    async def main():
+        from app.db import init_db
+        init_db()
+        await asyncio.gather(*(write("race") for _ in range(4)))
+        async with AsyncSessionLocal() as db:
+            return await db.get(models.TrainingLoad, "race")
+
+    state = asyncio.run(main())
+    assert state.samples == 4
+
+
+def test_malformed_health_items_are_skipped_and_counted(client):
+    body = {
+        "records": [
+            {"type": "resting_heart_rate", "value": "50", "start_date": "garbage"},
+            {"type": "resting_heart_rate", "value": "nan", "start_date": "2024-03-01 07:00:00 +0000"},
+            5,
+        ],
+        "workouts": [
+            {"duration": {"x": 1}, "workout_activity_type": 3, "start_date": "2024-03-01 10:00:00 +0000"},
+            {"duration": "inf", "start_date": "2024-03-01 11:00:00 +0000"},
+            {"duration": "30", "start_date": "2024-03-01 12:00:00 +0000"},
+        ],
+    }
+    response = client.post("/api/analytics/health", json=body, headers={"X-User-Id": "malformed"})
+    assert response.status_code == 200
+    assert (response.json()["applied"], response.json()["malformed"]) == (4, 2)
+    assert response.json()["acute_load"] is not None
+    bad = client.post("/api/analytics/health", json={"records": "x"}, headers={"X-User-Id": "malformed"})
+    assert bad.status_code == 422
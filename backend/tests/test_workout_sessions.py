@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.workout_sessions import decode_features, encode_features, from_history, trend
+
+
+def _stream(n=600, c=5, seed=0):
+    rng = np.random.default_rng(seed)
+    t_ms = 1_700_000_000_000 + np.cumsum(rng.integers(20, 80, n))
+    features = (90 + np.cumsum(rng.normal(0, 3, (n, c)), axis=0)).astype(np.float32)
+    features[rng.random((n, c)) < 0.2] = np.nan  # frames without pose
+    features[:7, 1] = np.nan  # a column that starts missing
+    features[:, 4] = np.nan  # and one never seen
+    return t_ms, features
+
+
+def test_round_trip_keeps_gaps_and_tenths_of_a_degree():
+    t_ms, features = _stream()
+    decoded_t, decoded = decode_features(encode_features(t_ms, features))
+    assert np.array_equal(decoded_t, t_ms)
+    assert np.array_equal(np.isnan(decoded), np.isnan(features))
+    valid = ~np.isnan(features)
+    assert np.abs(decoded[valid] - features[valid]).max() <= 0.05 + 1e-4
+
+
+def test_extreme_values_are_clipped_not_wrapped():
+    t_ms = np.array([0, 33, 66], dtype=np.int64)
+    features = np.array([[-400.0], [400.0], [-299.9]], dtype=np.float32)
+    _, decoded = decode_features(encode_features(t_ms, features))
+    assert decoded[:, 0].tolist() == [-300.0, 300.0, np.float32(-299.9)]
+
+
+def test_smooth_motion_compresses_well():
+    t_ms = np.arange(1800, dtype=np.int64) * 33  # a minute at 30 fps
+    phase = t_ms[:, None] / 1000 * 2 * np.pi / 3 + np.arange(6)  # a rep every 3 s
+    features = (100 + 60 * np.sin(phase)).astype(np.float32)
+    blob = encode_features(t_ms, features)
+    assert len(blob) < (t_ms.nbytes + features.nbytes) / 4
+
+
+def test_from_history_orders_columns():
+    history = [
+        {"timestamp": 1.0, "angulos": {"b": 10.0, "ignored": 1.0}, "simetrias": {"a": 5.0}},
+        {"timestamp": 1.5, "angulos": {"b": None}, "simetrias": {}},
+    ]
+    t_ms, features = from_history(history, ["a", "b"])
+    assert t_ms.tolist() == [1000, 1500]
+    assert features[0].tolist() == [5.0, 10.0] and np.isnan(features[1]).all()
+
+
+def test_trend_is_slope_per_week():
+    start = datetime(2024, 3, 1)
+    points = [{"started_at": start + timedelta(weeks=w), "rom": 100 + 2 * w} for w in range(4)]
+    assert trend(points, "rom") == 2.0
+    assert trend(points[:1], "rom") is None